@@ -0,0 +1,88 @@
+# bpress asyncio front end. armand bouillet 2025
+
+import asyncio
+from concurrent.futures import Executor
+from typing import AsyncIterable, AsyncIterator, Iterator, Optional, Union
+
+from bpress_v1_0_0 import Compressor
+
+"""
+compresses a network byte stream without blocking the event loop. chunks are pulled from an
+asyncio.StreamReader (or any async iterator of bytes) and handed to an incremental Compressor
+on an executor, one at a time and in order, so tokenizing never runs on the loop itself.
+
+the input size is never needed: end of stream is whatever the source reports. the output is a
+streamed stream (see Compressor): once the delimiter is picked from the first sample_size bytes,
+every compressed piece is yielded as soon as update hands it out, in chunks of at most
+chunk_size, and flush only adds the unaligned tail and the flag byte. held memory stays at the
+sample plus an unaligned tail, whatever the length of the stream. sample_size=None scans the
+whole stream first, so the raw input is held and nothing is yielded until the source ends; use it
+for bounded inputs only.
+
+the encoder is stateful, so executor should be a thread pool (None uses the loop's default);
+a process pool cannot share it
+"""
+class AsyncBPressCompressor:
+
+    def __init__(
+            self,
+            source: Union[asyncio.StreamReader, AsyncIterable[bytes]],
+            delimiter_setting: str = "low",
+            sample_size: Optional[int] = 256 * 1024,
+            read_size: int = 64 * 1024,
+            chunk_size: int = 64 * 1024,
+            executor: Optional[Executor] = None
+    ):
+        self.source = source
+        self.read_size = read_size
+        self.chunk_size = chunk_size
+        self.executor = executor
+        self.compressor = Compressor(delimiter_setting, sample_size = sample_size)
+
+        #internal state tracking
+        self.bytes_read = 0
+        self.exp_size = None
+        self.compression_complete = False
+
+    def __repr__(self):
+        return_string = f"<BPRESS ASYNC COMPRESSION OBJECT>\n\nBytes read: {self.bytes_read}\nSelected Delimiter: {self.compressor.delimiter_bit}\nScan Statistics: {self.compressor.stats_mode}\nExport size: {self.exp_size}\n"
+        return return_string
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return self.stream()
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        async for chunk in self.read_chunks():
+            self.bytes_read += len(chunk)
+            compressed: bytes = await loop.run_in_executor(self.executor, self.compressor.update, chunk)
+            for piece in self.split(compressed):
+                yield piece
+
+        #end of stream: stuffing, padding and the flag byte are settled by flush
+        compressed = await loop.run_in_executor(self.executor, self.compressor.flush)
+        self.exp_size = self.compressor.bytes_out
+        self.compression_complete = True
+        for piece in self.split(compressed):
+            yield piece
+
+    def split(self, compressed: bytes) -> Iterator[bytes]:
+        view: memoryview = memoryview(compressed)
+        for offset in range(0, len(compressed), self.chunk_size):
+            yield bytes(view[offset:offset + self.chunk_size])
+
+    async def read_chunks(self) -> AsyncIterator[bytes]:
+        if isinstance(self.source, asyncio.StreamReader):
+            while True:
+                chunk: bytes = await self.source.read(self.read_size)
+                if not chunk:
+                    return
+                yield chunk
+        else:
+            async for chunk in self.source:
+                if chunk:
+                    yield chunk
+
+    #convenience: drain the stream into a single bytes object
+    async def compress(self) -> bytes:
+        return b"".join([chunk async for chunk in self])
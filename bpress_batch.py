@@ -0,0 +1,173 @@
+# bpress batch driver. armand bouillet 2025
+
+import argparse
+import glob
+import json
+import os
+from time import perf_counter
+from typing import Dict, List, Optional, TypedDict, Union
+
+from bpress_v1_0_0 import BPRESS_COMPRESS, ScannedData
+from utilities import make_executor
+
+class CompressionResult(TypedDict):
+    imp_path: str
+    exp_path: str
+    imp_size: Optional[int]
+    exp_size: Optional[int]
+    ratio: Optional[float]
+    seconds: float
+    delimiter_bit: Optional[int]
+    bit_stuffing: bool
+    scanned_data: Optional[ScannedData]
+    error: Optional[str]
+
+
+#worker side: compress one file and keep the scan statistics gathered on the way, any failure (the input
+#vanished or cannot be read) lands in error with imp_size None if it was not even sized
+def compress_file(
+        imp_path: str,
+        exp_path: str,
+        buffer: Union[int, str] = 4 * 1024,
+        delimiter_setting: str = "low",
+        scan_cache_dir: Optional[str] = None
+) -> CompressionResult:
+    result: CompressionResult = {
+        "imp_path": imp_path,
+        "exp_path": exp_path,
+        "imp_size": None,
+        "exp_size": None,
+        "ratio": None,
+        "seconds": 0.0,
+        "delimiter_bit": None,
+        "bit_stuffing": False,
+        "scanned_data": None,
+        "error": None,
+    }
+    time_start: float = perf_counter()
+    try:
+        result["imp_size"] = os.path.getsize(imp_path)
+        compressor = BPRESS_COMPRESS(imp_path, exp_path, buffer, delimiter_setting, scan_cache_dir = scan_cache_dir)
+        with compressor:
+            pass
+    except Exception as exc:
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    else:
+        result["exp_size"] = compressor.exp_size
+        result["delimiter_bit"] = compressor.delimiter_bit
+        result["bit_stuffing"] = bool(compressor.bit_stuffing)
+        result["scanned_data"] = compressor.scanned_data
+        if compressor.exp_size is not None and result["imp_size"]:
+            result["ratio"] = compressor.exp_size / result["imp_size"]
+    result["seconds"] = perf_counter() - time_start
+    return result
+
+
+#a directory expands to the regular files directly inside it, anything else is treated as a glob
+def collect_inputs(source: str) -> List[str]:
+    if os.path.isdir(source):
+        paths: List[str] = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        paths = glob.glob(source)
+    return sorted(path for path in paths if os.path.isfile(path))
+
+
+"""
+output path of every input: its name without the extension plus suffix. inputs sharing that stem
+(a.bin and a.txt) keep their whole name instead (a.bin.press, a.txt.press). inputs sharing their
+whole name come from different directories and would overwrite each other, that raises ValueError
+"""
+def output_paths(inputs: List[str], out_dir: str, suffix: str = ".press") -> Dict[str, str]:
+    stems: Dict[str, int] = {}
+    for imp_path in inputs:
+        stem: str = os.path.splitext(os.path.basename(imp_path))[0]
+        stems[stem] = stems.get(stem, 0) + 1
+
+    paths: Dict[str, str] = {}
+    owners: Dict[str, str] = {}
+    for imp_path in inputs:
+        name: str = os.path.basename(imp_path)
+        if stems[os.path.splitext(name)[0]] == 1:
+            name = os.path.splitext(name)[0]
+        exp_path: str = os.path.join(out_dir, name + suffix)
+        if exp_path in owners:
+            raise ValueError(f"{owners[exp_path]} and {imp_path} would both be written to {exp_path}")
+        owners[exp_path] = imp_path
+        paths[imp_path] = exp_path
+    return paths
+
+
+"""
+compresses every input on a worker pool. jobs are submitted largest first so a big file picked
+up last does not leave the other workers idle at the end of the run. results come back in
+input order, failures are recorded per file instead of aborting the batch. output names are
+settled by output_paths before anything is written. with scan_cache_dir
+the scans are kept in a scan index, so a rerun does not scan the inputs that did not change
+"""
+def batch_compress(
+        source: str,
+        out_dir: str,
+        workers: Optional[int] = None,
+        buffer: Union[int, str] = 4 * 1024,
+        delimiter_setting: str = "low",
+        suffix: str = ".press",
+        scan_cache_dir: Optional[str] = None
+) -> List[CompressionResult]:
+    inputs: List[str] = collect_inputs(source)
+    exp_paths: Dict[str, str] = output_paths(inputs, out_dir, suffix)
+    os.makedirs(out_dir, exist_ok = True)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    #an input that vanished since it was collected sorts last and fails in its own worker, not the whole batch
+    by_size: List[str] = sorted(inputs, key = lambda path: os.path.getsize(path) if os.path.exists(path) else 0, reverse = True)
+    results: Dict[str, CompressionResult] = {}
+    with make_executor(workers) as pool:
+        jobs = {
+            imp_path: pool.submit(
+                compress_file,
+                imp_path,
+                exp_paths[imp_path],
+                buffer,
+                delimiter_setting,
+                scan_cache_dir,
+            )
+            for imp_path in by_size
+        }
+        for imp_path, job in jobs.items():
+            results[imp_path] = job.result()
+
+    return [results[imp_path] for imp_path in inputs]
+
+
+#--buffer takes a size in bytes or "auto"
+def buffer_size(value: str) -> Union[int, str]:
+    return value if value == "auto" else int(value)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description = "compress a directory or glob of files with BPRESS")
+    parser.add_argument("source", help = "directory or glob pattern of input files")
+    parser.add_argument("out_dir", help = "directory for the compressed outputs")
+    parser.add_argument("-w", "--workers", type = int, default = None, help = "worker processes (default: cpu count)")
+    parser.add_argument("-b", "--buffer", type = buffer_size, default = 4 * 1024, help = "read buffer size in bytes, or auto")
+    parser.add_argument("-d", "--delimiter", default = "low", help = "delimiter setting: low, high or cost")
+    parser.add_argument("--scan-cache", default = None, help = "directory of the scan index, unchanged inputs are not scanned again")
+    parser.add_argument("--json", action = "store_true", help = "print results as json")
+    args = parser.parse_args(argv)
+
+    try:
+        results: List[CompressionResult] = batch_compress(args.source, args.out_dir, args.workers, args.buffer, args.delimiter, scan_cache_dir = args.scan_cache)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.json:
+        print(json.dumps(results, indent = 2))
+        return
+
+    for result in results:
+        if result["error"] is not None:
+            print(f"{result['imp_path']}: FAILED {result['error']}")
+            continue
+        print(f"{result['imp_path']}: {result['imp_size']} -> {result['exp_size']} bytes, ratio {result['ratio']:.4f}, {result['seconds']:.3f}s, delimiter {result['delimiter_bit']}, stuffing {result['bit_stuffing']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+# bpress benchmark suite. armand bouillet 2025
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tracemalloc
+from time import perf_counter, strftime
+from typing import Callable, Dict, List, Optional, Sequence, TypedDict
+
+try:
+    import resource
+except ImportError: #not available on windows, max_rss is left out there
+    resource = None #type: ignore
+
+from bpress_v1_0_0 import BPRESS_COMPRESS, BPRESS_DATA, BPRESS_DECOMPRESS
+from gen_syn_data import generate_structured_stream
+from gen_test_files import generate_random_file
+
+class PhaseResult(TypedDict):
+    seconds: float
+    mbps: float
+    peak_bytes: int
+
+class BenchResult(TypedDict):
+    corpus: str
+    size: int
+    buffer: int
+    exp_size: int
+    ratio: float
+    round_trip: bool
+    phases: Dict[str, PhaseResult]
+    max_rss: Optional[int]
+
+class BenchRun(TypedDict):
+    meta: Dict[str, Optional[str]]
+    results: List[BenchResult]
+    skipped: Dict[str, str]
+
+
+#corpus writers, one per fixture class. each fills path with size bytes
+def write_random(path: str, size: int):
+    generate_random_file(path, size)
+
+def write_structured(scrub_rate: str) -> Callable[[str, int], None]:
+    def write(path: str, size: int):
+        written: int = 0
+        trailing_bits = None
+        with open(path, "wb") as f:
+            while written < size:
+                stream, trailing_bits = generate_structured_stream(min(4 * 1024, size - written), scrub_rate, trailing_bits)
+                f.write(stream)
+                written += len(stream)
+    return write
+
+#gen_semi_strc_data.py writes its file on import, so its pattern is repeated here
+def write_semi_structured(path: str, size: int):
+    pattern: bytes = b"ABC123XYZ"
+    with open(path, "wb") as f:
+        f.write((pattern * (size // len(pattern) + 1))[:size])
+
+#AES-256-CBC over random plaintext as in gen_encrypted_file.py, needs the optional cryptography package
+def write_encrypted(path: str, size: int):
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    encryptor = Cipher(algorithms.AES(os.urandom(32)), modes.CBC(os.urandom(16))).encryptor()
+    plaintext: bytes = os.urandom(size + (-size) % 16)
+    with open(path, "wb") as f:
+        f.write((encryptor.update(plaintext) + encryptor.finalize())[:size])
+
+CORPORA: Dict[str, Callable[[str, int], None]] = {
+    "random": write_random,
+    "half_structured": write_structured("half"),
+    "full_structured": write_structured("full"),
+    "semi_structured": write_semi_structured,
+    "encrypted": write_encrypted,
+}
+
+
+#fixtures are written once per work directory and reused by later runs
+def corpus_file(work_dir: str, corpus: str, size: int) -> str:
+    path: str = os.path.join(work_dir, f"{corpus}_{size}.bin")
+    if not os.path.exists(path) or os.path.getsize(path) != size:
+        CORPORA[corpus](path, size)
+    return path
+
+"""
+times one phase: the best of repeats untraced runs gives the time, one more run under
+tracemalloc gives the peak of python and numpy allocations (kept apart so tracing does not
+distort the timing)
+"""
+def measure_phase(fn: Callable[[], None], size: int, repeats: int) -> PhaseResult:
+    best: float = float("inf")
+    for _ in range(repeats):
+        time_start: float = perf_counter()
+        fn()
+        best = min(best, perf_counter() - time_start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        peak_bytes: int = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {"seconds": best, "mbps": size / (1024 * 1024) / best if best > 0 else 0.0, "peak_bytes": peak_bytes}
+
+#process peak resident set size in bytes (ru_maxrss is kilobytes on linux, bytes on macos)
+def max_rss() -> Optional[int]:
+    if resource is None:
+        return None
+    rss: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+def run_case(path: str, corpus: str, size: int, buffer: int, repeats: int) -> BenchResult:
+    exp_path: str = f"{path}.{buffer}.press"
+    back_path: str = f"{path}.{buffer}.out"
+
+    def scan():
+        with BPRESS_DATA(path):
+            pass
+
+    def compress():
+        with BPRESS_COMPRESS(path, exp_path, buffer):
+            pass
+
+    def decompress():
+        with BPRESS_DECOMPRESS(exp_path, back_path, buffer):
+            pass
+
+    phases: Dict[str, PhaseResult] = {
+        "scan": measure_phase(scan, size, repeats),
+        "compress": measure_phase(compress, size, repeats),
+        "decompress": measure_phase(decompress, size, repeats),
+    }
+    exp_size: int = os.path.getsize(exp_path)
+    with open(path, "rb") as original, open(back_path, "rb") as restored:
+        round_trip: bool = original.read() == restored.read()
+    os.remove(exp_path)
+    os.remove(back_path)
+
+    return {
+        "corpus": corpus,
+        "size": size,
+        "buffer": buffer,
+        "exp_size": exp_size,
+        "ratio": exp_size / size,
+        "round_trip": round_trip,
+        "phases": phases,
+        "max_rss": max_rss(),
+    }
+
+
+def run_meta() -> Dict[str, Optional[str]]:
+    try:
+        commit: Optional[str] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output = True, text = True, check = True,
+            cwd = os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "platform": platform.platform(), "time": strftime("%Y-%m-%dT%H:%M:%S")}
+
+"""
+runs scan, compress and decompress over every corpus, size and buffer combination. a corpus
+whose writer cannot run here (the encrypted one without cryptography) is recorded in skipped
+instead of failing the run
+"""
+def run_benchmarks(
+        work_dir: str,
+        corpora: Optional[List[str]] = None,
+        sizes: Sequence[int] = (64 * 1024, 1024 * 1024),
+        buffers: Sequence[int] = (4 * 1024, 64 * 1024),
+        repeats: int = 3
+) -> BenchRun:
+    os.makedirs(work_dir, exist_ok = True)
+    run: BenchRun = {"meta": run_meta(), "results": [], "skipped": {}}
+    for corpus in corpora if corpora is not None else list(CORPORA):
+        if corpus not in CORPORA:
+            raise ValueError(f"Unknown corpus: {corpus}")
+        for size in sizes:
+            try:
+                path: str = corpus_file(work_dir, corpus, size)
+            except ImportError as exc:
+                run["skipped"][corpus] = f"{type(exc).__name__}: {exc}"
+                break
+            for buffer in buffers:
+                run["results"].append(run_case(path, corpus, size, buffer, repeats))
+    return run
+
+
+"""
+regression check between two runs: a phase that lost more than tolerance of its baseline
+throughput, a ratio that grew by more than ratio_tolerance or a broken round trip is reported.
+cases missing from either run are ignored
+"""
+def compare(baseline: BenchRun, current: BenchRun, tolerance: float = 0.10, ratio_tolerance: float = 0.001) -> List[str]:
+    previous: Dict[tuple, BenchResult] = {(r["corpus"], r["size"], r["buffer"]): r for r in baseline["results"]}
+    regressions: List[str] = []
+    for result in current["results"]:
+        case: str = f"{result['corpus']} {result['size']} bytes, buffer {result['buffer']}"
+        if not result["round_trip"]:
+            regressions.append(f"{case}: round trip failed")
+        old = previous.get((result["corpus"], result["size"], result["buffer"]))
+        if old is None:
+            continue
+        for phase, timing in result["phases"].items():
+            old_mbps: float = old["phases"].get(phase, {}).get("mbps", 0.0) #type: ignore
+            if old_mbps and timing["mbps"] < old_mbps * (1 - tolerance):
+                regressions.append(f"{case}: {phase} slowed from {old_mbps:.2f} to {timing['mbps']:.2f} MB/s")
+        if result["ratio"] > old["ratio"] + ratio_tolerance:
+            regressions.append(f"{case}: ratio grew from {old['ratio']:.4f} to {result['ratio']:.4f}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description = "benchmark BPRESS scan, compress and decompress over the generated corpora")
+    parser.add_argument("-o", "--output", default = None, help = "write the run as json to this path")
+    parser.add_argument("-w", "--work-dir", default = "./test_outputs/bench", help = "directory for the generated fixtures")
+    parser.add_argument("-c", "--corpora", nargs = "+", default = None, choices = list(CORPORA), help = "fixture classes (default: all)")
+    parser.add_argument("-s", "--sizes", nargs = "+", type = int, default = [64 * 1024, 1024 * 1024], help = "fixture sizes in bytes")
+    parser.add_argument("-b", "--buffers", nargs = "+", type = int, default = [4 * 1024, 64 * 1024], help = "buffer sizes in bytes")
+    parser.add_argument("-r", "--repeats", type = int, default = 3, help = "timed runs per phase, the best is kept")
+    parser.add_argument("--baseline", default = None, help = "earlier json run to check for regressions")
+    parser.add_argument("--tolerance", type = float, default = 0.10, help = "allowed throughput loss against the baseline")
+    args = parser.parse_args(argv)
+
+    run: BenchRun = run_benchmarks(args.work_dir, args.corpora, args.sizes, args.buffers, args.repeats)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(run, f, indent = 2)
+
+    for result in run["results"]:
+        speeds: str = ", ".join(f"{phase} {timing['mbps']:.2f} MB/s" for phase, timing in result["phases"].items())
+        print(f"{result['corpus']} {result['size']} bytes, buffer {result['buffer']}: ratio {result['ratio']:.4f}, {speeds}, peak {result['phases']['compress']['peak_bytes']} bytes")
+    for corpus, reason in run["skipped"].items():
+        print(f"{corpus}: skipped ({reason})")
+
+    if args.baseline is None:
+        return 0
+    with open(args.baseline) as f:
+        regressions: List[str] = compare(json.load(f), run, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
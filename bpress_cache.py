@@ -0,0 +1,238 @@
+# bpress compression cache. armand bouillet 2025
+
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, TypedDict, Union
+
+from bpress_v1_0_0 import (
+    ADAPTIVE_MAX_SYMBOL, BPRESS, BPRESS_COMPRESS, FORMAT_VERSION, MAGIC_BYTE, MIN_MAPPED_TOKEN_LEN,
+    STORED_THRESHOLD, STORED_TRAILER_FORMAT, SYMBOL_MODE_BITS
+)
+
+#store directories are named STORE_PREFIX + fingerprint and hold a STORE_MARKER file, only those are ever removed
+STORE_PREFIX: str = "bpress-"
+STORE_MARKER: str = ".bpress-store"
+
+class CacheResult(TypedDict):
+    imp_path: str
+    exp_path: str
+    exp_size: Optional[int]
+    key: Optional[str]
+    hit: Optional[str]
+
+
+"""
+fingerprint of everything that decides the bytes of a stream besides the input and the settings:
+the format revision, the digest table and the header constants. entries are filed under it, so
+changing any of them leaves the old entries unreachable and the next cache opened removes them
+"""
+def format_fingerprint() -> str:
+    parts: Tuple = (
+        FORMAT_VERSION, MAGIC_BYTE, MIN_MAPPED_TOKEN_LEN, ADAPTIVE_MAX_SYMBOL, STORED_TRAILER_FORMAT,
+        sorted(SYMBOL_MODE_BITS.items()), sorted(BPRESS.token_digest_table.items()),
+    )
+    return hashlib.blake2b(repr(parts).encode(), digest_size = 8).hexdigest()
+
+#blake2b of the file content read in 1 MB blocks, the size is folded in as well
+def content_hash(path: str, block_size: int = 1024 * 1024) -> str:
+    digest = hashlib.blake2b(digest_size = 16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return f"{digest.hexdigest()}{os.path.getsize(path):x}"
+
+
+"""
+content addressed cache in front of BPRESS_COMPRESS. an input is keyed by a hash of its bytes
+plus every setting that changes the output; buffer is left out since the output is identical for
+any buffer size. a hit hands back the stored .press (copied, or hardlinked with hardlink=True,
+in which case the output must be treated as read only) without scanning or compressing.
+
+two tiers: a bounded in-memory LRU of small outputs and an on-disk store under
+cache_dir/bpress-<format fingerprint>/, trimmed to max_bytes by evicting the least recently used entries
+(a hit refreshes an entry's mtime). entries are written to a temporary file and renamed into
+place, so processes sharing a cache_dir never see a partial entry
+"""
+class CompressionCache:
+
+    def __init__(
+            self,
+            cache_dir: str,
+            max_bytes: int = 1024 * 1024 * 1024,
+            memory_bytes: int = 64 * 1024 * 1024,
+            memory_entry_max: int = 4 * 1024 * 1024,
+            hardlink: bool = False
+    ):
+        if max_bytes < 0 or memory_bytes < 0:
+            raise ValueError("cache sizes must not be negative")
+
+        # store settings
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.memory_entry_max = min(memory_entry_max, memory_bytes)
+        self.hardlink = hardlink
+        self.fingerprint = format_fingerprint()
+        self.store_dir = os.path.join(cache_dir, STORE_PREFIX + self.fingerprint)
+
+        #internal state tracking
+        self.memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self.memory_size = 0
+        self.hits: Dict[str, int] = {"memory": 0, "disk": 0}
+        self.misses = 0
+
+        self.make_store()
+        self.remove_stale()
+
+    def __repr__(self):
+        return_string = f"<BPRESS COMPRESSION CACHE>\n\nStore: {self.store_dir}\nMemory entries: {len(self.memory)} ({self.memory_size} bytes)\nHits: {self.hits}\nMisses: {self.misses}\n"
+        return return_string
+
+    def make_store(self):
+        os.makedirs(self.store_dir, exist_ok = True)
+        open(os.path.join(self.store_dir, STORE_MARKER), "ab").close()
+
+    #stores filed under another fingerprint were written by a different format or digest table.
+    #cache_dir may be shared, so only directories carrying the prefix and the marker are removed
+    def remove_stale(self):
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_dir(follow_symlinks = False) or entry.path == self.store_dir or not entry.name.startswith(STORE_PREFIX):
+                continue
+            if os.path.isfile(os.path.join(entry.path, STORE_MARKER)):
+                shutil.rmtree(entry.path, ignore_errors = True)
+
+    def key(
+            self,
+            imp_path: str,
+            delimiter_setting: str = "low",
+            scan_mode: str = "full",
+            sample_size: int = 256 * 1024,
+            digest_mode: str = "fixed",
+            symbol_bits: int = 1,
+            stored_threshold: Optional[int] = STORED_THRESHOLD
+    ) -> str:
+        settings: str = repr((delimiter_setting, scan_mode, sample_size, digest_mode, symbol_bits, stored_threshold))
+        return content_hash(imp_path) + hashlib.blake2b(settings.encode(), digest_size = 8).hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.store_dir, key + ".press")
+
+    """
+    compresses imp_path into exp_path unless an equal input was compressed with the same settings
+    before. hit reports the tier that served it ("memory" or "disk"), None for a miss. empty
+    inputs are passed straight through, BPRESS_COMPRESS writes nothing for them
+    """
+    def compress(
+            self,
+            imp_path: str,
+            exp_path: str,
+            buffer: Union[int, str] = 4 * 1024,
+            delimiter_setting: str = "low",
+            scan_mode: str = "full",
+            sample_size: int = 256 * 1024,
+            digest_mode: str = "fixed",
+            symbol_bits: int = 1,
+            stored_threshold: Optional[int] = STORED_THRESHOLD
+    ) -> CacheResult:
+        result: CacheResult = {"imp_path": imp_path, "exp_path": exp_path, "exp_size": None, "key": None, "hit": None}
+        if not os.path.getsize(imp_path):
+            with BPRESS_COMPRESS(imp_path, exp_path, buffer, delimiter_setting, scan_mode = scan_mode, sample_size = sample_size, digest_mode = digest_mode, symbol_bits = symbol_bits, stored_threshold = stored_threshold):
+                pass
+            return result
+
+        key: str = self.key(imp_path, delimiter_setting, scan_mode, sample_size, digest_mode, symbol_bits, stored_threshold)
+        result["key"] = key
+        #an earlier hardlinked output (from this cache or any other one on the store) shares its inode with
+        #a store entry, writing through it would change the entry, so the output is always replaced
+        if os.path.lexists(exp_path):
+            os.remove(exp_path)
+        result["hit"] = self.fetch(key, exp_path)
+        if result["hit"] is None:
+            self.misses += 1
+            with BPRESS_COMPRESS(imp_path, exp_path, buffer, delimiter_setting, scan_mode = scan_mode, sample_size = sample_size, digest_mode = digest_mode, symbol_bits = symbol_bits, stored_threshold = stored_threshold):
+                pass
+            self.store(key, exp_path)
+        else:
+            self.hits[result["hit"]] += 1
+        result["exp_size"] = os.path.getsize(exp_path)
+        return result
+
+    #serve key into exp_path from the memory tier, then the disk tier. returns the tier or None
+    def fetch(self, key: str, exp_path: str) -> Optional[str]:
+        path: str = self.entry_path(key)
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            with open(exp_path, "wb") as f:
+                f.write(self.memory[key])
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+            return "memory"
+
+        try:
+            os.utime(path)
+            if self.hardlink:
+                try:
+                    os.link(path, exp_path)
+                except OSError: #another filesystem, or links are not supported there (a missing entry fails the copy too)
+                    shutil.copyfile(path, exp_path)
+            else:
+                shutil.copyfile(path, exp_path)
+        except FileNotFoundError: #never stored, or evicted by another process in between
+            return None
+        if os.path.getsize(path) <= self.memory_entry_max:
+            with open(path, "rb") as f:
+                self.remember(key, f.read())
+        return "disk"
+
+    def store(self, key: str, exp_path: str):
+        handle, temp_path = tempfile.mkstemp(dir = self.store_dir, suffix = ".tmp")
+        os.close(handle)
+        try:
+            shutil.copyfile(exp_path, temp_path)
+            os.replace(temp_path, self.entry_path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        if os.path.getsize(exp_path) <= self.memory_entry_max:
+            with open(exp_path, "rb") as f:
+                self.remember(key, f.read())
+        self.evict()
+
+    def remember(self, key: str, compressed: bytes):
+        if key in self.memory:
+            self.memory_size -= len(self.memory.pop(key))
+        self.memory[key] = compressed
+        self.memory_size += len(compressed)
+        while self.memory_size > self.memory_bytes:
+            self.memory_size -= len(self.memory.popitem(last = False)[1])
+
+    #least recently used entries go first until the store fits max_bytes again
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.store_dir):
+            if entry.name.endswith(".press"):
+                try:
+                    entry_stat: os.stat_result = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry_stat.st_mtime_ns, entry_stat.st_size, entry.path))
+        total: int = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        self.memory.clear()
+        self.memory_size = 0
+        shutil.rmtree(self.store_dir, ignore_errors = True)
+        self.make_store()
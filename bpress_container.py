@@ -0,0 +1,245 @@
+# bpress framed container. armand bouillet 2025
+
+import os
+import struct
+from concurrent.futures import Future
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple, TypedDict
+
+from bpress_estimate import estimate_bytes
+from bpress_v1_0_0 import compress_block, decompress_block
+from utilities import make_executor
+
+"""
+framed container layout (all integers little endian):
+
+header:
+    b"BPRC" | version (1 byte) | 3 reserved bytes | block size (4 bytes)
+blocks:
+    compressed length (4 bytes) | complete .press stream for one block of raw input
+index:
+    one entry per block: frame offset (8 bytes) | raw size (4 bytes) | compressed size (4 bytes) | block type (1 byte)
+footer:
+    index offset (8 bytes) | block count (4 bytes) | b"BPRI"
+
+every block is an independent .press stream with its own delimiter choice (or symbol mode),
+stuffing and padding flags, so blocks can be compressed and decompressed on separate cores and a
+reader can seek straight to any block through the index. a stored block (BLOCK_STORED) holds the
+raw bytes instead, for data that would not shrink. version 1 containers have no block type byte
+and only press blocks
+"""
+CONTAINER_MAGIC: bytes = b"BPRC"
+INDEX_MAGIC: bytes = b"BPRI"
+CONTAINER_VERSION: int = 2
+
+HEADER_FORMAT: str = "<4sB3xI"
+FRAME_FORMAT: str = "<I"
+INDEX_ENTRY_FORMATS: Dict[int, str] = {1: "<QII", 2: "<QIIB"}
+INDEX_ENTRY_FORMAT: str = INDEX_ENTRY_FORMATS[CONTAINER_VERSION]
+FOOTER_FORMAT: str = "<QI4s"
+
+HEADER_SIZE: int = struct.calcsize(HEADER_FORMAT)
+FRAME_SIZE: int = struct.calcsize(FRAME_FORMAT)
+INDEX_ENTRY_SIZE: int = struct.calcsize(INDEX_ENTRY_FORMAT)
+FOOTER_SIZE: int = struct.calcsize(FOOTER_FORMAT)
+
+BLOCK_PRESS: int = 0
+BLOCK_STORED: int = 1
+
+class BlockEntry(TypedDict):
+    offset: int
+    raw_size: int
+    comp_size: int
+    block_type: int
+
+
+"""
+worker side: each job opens the input itself so only offsets and results cross process boundaries.
+with store_raw, a block the estimator is confident will not shrink is stored without compressing
+it, and a compressed block that came out no smaller is stored as well
+"""
+def _compress_block_job(path: str, offset: int, size: int, delimiter_setting: str, symbol_bits: int = 1, store_raw: bool = False) -> Tuple[int, bytes]:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data: bytes = f.read(size)
+    if len(data) != size:
+        raise RuntimeError("input changed size during compression")
+    if store_raw and symbol_bits == 1 and estimate_bytes(data, delimiter_setting = delimiter_setting)["store_raw"]:
+        return BLOCK_STORED, data
+    block: bytes = compress_block(data, delimiter_setting, symbol_bits = symbol_bits)
+    if store_raw and len(block) >= len(data):
+        return BLOCK_STORED, data
+    return BLOCK_PRESS, block
+
+def _decompress_block_job(path: str, entry: BlockEntry) -> bytes:
+    return read_block(path, entry)
+
+
+def read_version(path: str) -> Tuple[int, int]:
+    with open(path, "rb") as f:
+        header: bytes = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        raise ValueError("container is too short")
+    magic, version, block_size = struct.unpack(HEADER_FORMAT, header)
+    if magic != CONTAINER_MAGIC:
+        raise ValueError("input is not a bpress container")
+    if version not in INDEX_ENTRY_FORMATS:
+        raise ValueError(f"unsupported container version: {version}")
+    return version, block_size
+
+def read_header(path: str) -> int:
+    return read_version(path)[1]
+
+def read_index(path: str) -> List[BlockEntry]:
+    version, _ = read_version(path)
+    entry_format: str = INDEX_ENTRY_FORMATS[version]
+    with open(path, "rb") as f:
+        f.seek(-FOOTER_SIZE, os.SEEK_END)
+        index_offset, block_count, magic = struct.unpack(FOOTER_FORMAT, f.read(FOOTER_SIZE))
+        if magic != INDEX_MAGIC:
+            raise ValueError("container index is missing or damaged")
+        f.seek(index_offset)
+        index_bytes: bytes = f.read(block_count * struct.calcsize(entry_format))
+
+    index: List[BlockEntry] = []
+    for fields in struct.iter_unpack(entry_format, index_bytes):
+        block_type: int = fields[3] if len(fields) > 3 else BLOCK_PRESS
+        if block_type not in (BLOCK_PRESS, BLOCK_STORED):
+            raise ValueError(f"unknown block type in container index: {block_type}")
+        index.append({"offset": fields[0], "raw_size": fields[1], "comp_size": fields[2], "block_type": block_type})
+    return index
+
+#random access: decode a single block straight from its index entry
+def read_block(path: str, entry: BlockEntry) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(entry["offset"])
+        frame: bytes = f.read(FRAME_SIZE + entry["comp_size"])
+    (comp_size,) = struct.unpack_from(FRAME_FORMAT, frame)
+    if comp_size != entry["comp_size"]:
+        raise ValueError("block frame does not match the container index")
+    if entry["block_type"] == BLOCK_STORED:
+        raw: bytes = frame[FRAME_SIZE:]
+    else:
+        raw = decompress_block(frame[FRAME_SIZE:])
+    if len(raw) != entry["raw_size"]:
+        raise RuntimeError("decoded block size does not match the container index")
+    return raw
+
+
+"""
+splits the input into block_size pieces and compresses them on a process pool. at most
+2 * workers blocks are in flight, results are written back in input order, so memory stays
+bounded by the in-flight window rather than the input size. store_raw lets incompressible
+blocks (encrypted or random data) be stored instead, usually without compressing them at all
+"""
+class BPRESS_CONTAINER_COMPRESS:
+
+    def __init__(
+            self,
+            imp_path: str,
+            exp_path: str,
+            block_size: int = 4 * 1024 * 1024,
+            workers: Optional[int] = None,
+            delimiter_setting: str = "low",
+            symbol_bits: int = 1,
+            store_raw: bool = True
+    ):
+        if not 0 < block_size < 2**32:
+            raise ValueError("block size must fit in 32 bits")
+
+        # file meta-data
+        self.imp_path = imp_path
+        self.exp_path = exp_path
+        self.imp_size = os.path.getsize(self.imp_path)
+        self.exp_size = None
+
+        # compressor settings
+        self.block_size = block_size
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.delimiter_setting = delimiter_setting
+        self.symbol_bits = symbol_bits
+        self.store_raw = store_raw
+
+        #internal state tracking
+        self.index: List[BlockEntry] = []
+        self.compression_complete = False
+
+    def __repr__(self):
+        stored: int = sum(entry["block_type"] == BLOCK_STORED for entry in self.index)
+        return_string = f"<BPRESS CONTAINER COMPRESSION OBJECT>\n\nBlocks: {len(self.index)} ({stored} stored)\nBlock size: {self.block_size}\nWorkers: {self.workers}\nSizes: {self.imp_size} -> {self.exp_size}\n"
+        return return_string
+
+    def __enter__(self):
+        offsets: List[int] = list(range(0, self.imp_size, self.block_size))
+        in_flight: Deque[Tuple[int, Future]] = deque()
+
+        with open(self.exp_path, "wb") as out, make_executor(self.workers) as pool:
+            out.write(struct.pack(HEADER_FORMAT, CONTAINER_MAGIC, CONTAINER_VERSION, self.block_size))
+
+            for offset in offsets:
+                size: int = min(self.block_size, self.imp_size - offset)
+                in_flight.append((size, pool.submit(_compress_block_job, self.imp_path, offset, size, self.delimiter_setting, self.symbol_bits, self.store_raw)))
+                if len(in_flight) >= 2 * self.workers:
+                    self.write_block(out, *in_flight.popleft())
+            while in_flight:
+                self.write_block(out, *in_flight.popleft())
+
+            #block index and footer close the container
+            index_offset: int = out.tell()
+            for entry in self.index:
+                out.write(struct.pack(INDEX_ENTRY_FORMAT, entry["offset"], entry["raw_size"], entry["comp_size"], entry["block_type"]))
+            out.write(struct.pack(FOOTER_FORMAT, index_offset, len(self.index), INDEX_MAGIC))
+
+        self.exp_size = os.path.getsize(self.exp_path)
+        self.compression_complete = True
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def write_block(self, out, raw_size: int, job: Future):
+        block_type, block = job.result()
+        self.index.append({"offset": out.tell(), "raw_size": raw_size, "comp_size": len(block), "block_type": block_type})
+        out.write(struct.pack(FRAME_FORMAT, len(block)))
+        out.write(block)
+
+
+"""
+decodes every block of a container on a process pool and writes the raw blocks back in order
+"""
+class BPRESS_CONTAINER_DECOMPRESS:
+
+    def __init__(self, imp_path: str, exp_path: str, workers: Optional[int] = None):
+        # file meta-data
+        self.imp_path = imp_path
+        self.exp_path = exp_path
+        self.imp_size = os.path.getsize(self.imp_path)
+        self.exp_size = None
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+
+        #internal state tracking
+        self.index: List[BlockEntry] = []
+        self.decompression_complete = False
+
+    def __repr__(self):
+        return_string = f"<BPRESS CONTAINER DECOMPRESSION OBJECT>\n\nBlocks: {len(self.index)}\nWorkers: {self.workers}\nSizes: {self.imp_size} -> {self.exp_size}\n"
+        return return_string
+
+    def __enter__(self):
+        self.index = read_index(self.imp_path)
+        in_flight: Deque[Future] = deque()
+
+        with open(self.exp_path, "wb") as out, make_executor(self.workers) as pool:
+            for entry in self.index:
+                in_flight.append(pool.submit(_decompress_block_job, self.imp_path, entry))
+                if len(in_flight) >= 2 * self.workers:
+                    out.write(in_flight.popleft().result())
+            while in_flight:
+                out.write(in_flight.popleft().result())
+
+        self.exp_size = os.path.getsize(self.exp_path)
+        self.decompression_complete = True
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
@@ -0,0 +1,144 @@
+# bpress ratio estimator. armand bouillet 2025
+
+import math
+import os
+import stat
+from time import perf_counter
+from typing import Dict, List, Optional, TypedDict, Union
+
+from bpress_tables import ByteProfile, profile_bytes
+from bpress_v1_0_0 import BPRESS, HEADER_BITS, TokenProfile
+
+#a sampled ratio only prices the tokens, the stream header is added on top in whole bytes
+HEADER_SIZE: int = -(-HEADER_BITS // 8)
+
+class CompressionEstimate(TypedDict):
+    imp_size: int
+    sampled_bytes: int
+    blocks: int
+    exact: bool
+    delimiter_bit: Optional[int]
+    estimated_size: int
+    ratio: float
+    ratio_low: float
+    ratio_high: float
+    store_raw: bool
+    byte_entropy: float
+    seconds: float
+
+
+"""
+predicts the .press size of an input without compressing it. blocks of sample_bytes // blocks
+bytes are taken at evenly strided offsets (the first at the start, the last at the end) and
+profiled for both delimiters, the same histograms the "cost" mode gathers during a full scan.
+each block prices its tokens with the digest code lengths, giving a compressed bits per raw bit
+ratio; the mean over blocks predicts the file and mean +- confidence * standard error bounds it.
+inputs no larger than sample_bytes are profiled whole and the estimate is exact.
+
+store_raw is set when even the optimistic bound does not shrink the input, the signal callers
+use to skip compression and store the data as is. byte_entropy is the mean shannon entropy of
+the sampled blocks' byte histograms (bits per byte), from the same structure profile the scan uses.
+only regular files have a size to extrapolate to, pipes and devices raise ValueError (checked
+before opening, a fifo without a writer would block); estimate_bytes takes data read from them
+"""
+def estimate(
+        path: str,
+        sample_bytes: int = 256 * 1024,
+        blocks: int = 16,
+        delimiter_setting: str = "low",
+        confidence: float = 1.96
+) -> CompressionEstimate:
+    if not stat.S_ISREG(os.stat(path).st_mode):
+        raise ValueError(f"cannot estimate {path}: not a regular file")
+    engine: BPRESS = BPRESS()
+    engine.use_mmap = True
+    engine.open_input(path)
+    try:
+        if engine.mapping is None:  # an empty file maps nothing
+            return estimate_bytes(b"", sample_bytes, blocks, delimiter_setting, confidence)
+        return estimate_bytes(engine.mapping, sample_bytes, blocks, delimiter_setting, confidence)
+    finally:
+        engine.close_input()
+
+def estimate_bytes(
+        data: Union[bytes, bytearray, memoryview],
+        sample_bytes: int = 256 * 1024,
+        blocks: int = 16,
+        delimiter_setting: str = "low",
+        confidence: float = 1.96
+) -> CompressionEstimate:
+    time_start: float = perf_counter()
+    view: memoryview = memoryview(data).cast("B")
+    imp_size: int = len(view)
+    engine: BPRESS = BPRESS()
+
+    #whole input when it fits the sample, otherwise evenly strided blocks
+    exact: bool = imp_size <= sample_bytes
+    if exact:
+        block_len: int = imp_size
+        offsets: List[int] = [0] if imp_size else []
+    else:
+        blocks = max(1, min(blocks, sample_bytes))
+        block_len = max(1, sample_bytes // blocks)
+        stride: float = (imp_size - block_len) / max(blocks - 1, 1)
+        offsets = [int(round(index * stride)) for index in range(blocks)]
+
+    block_profiles: List[Dict[int, TokenProfile]] = []
+    entropy: float = 0.0
+    for offset in offsets:
+        with view[offset:offset + block_len] as block:
+            structure: ByteProfile = profile_bytes(block)
+            engine.merge_scanned_data(structure) #type: ignore
+            entropy += structure["byte_entropy"]
+            profiles: Dict[int, TokenProfile] = engine.new_token_profiles()
+            engine.profile_tokens(block, profiles)
+        block_profiles.append(profiles)
+
+    if not offsets:
+        return {
+            "imp_size": 0, "sampled_bytes": 0, "blocks": 0, "exact": True, "delimiter_bit": None,
+            "estimated_size": 0, "ratio": 1.0, "ratio_low": 1.0, "ratio_high": 1.0, "store_raw": True,
+            "byte_entropy": 0.0, "seconds": perf_counter() - time_start,
+        }
+
+    #pick the delimiter the compressor would pick from the sampled statistics
+    engine.scanned_data["estimated_sizes"] = {
+        delimiter: sum(engine.estimate_size(profiles[delimiter]) for profiles in block_profiles) for delimiter in (0, 1)
+    }
+    delimiter_bit: int = engine.config_delimiter(engine.scanned_data, mode = delimiter_setting)
+
+    if exact:
+        estimated_size: int = engine.estimate_size(block_profiles[0][delimiter_bit])
+        ratio: float = estimated_size / imp_size
+        ratio_low = ratio_high = ratio
+    else:
+        ratios: List[float] = [block_bits(engine, profiles[delimiter_bit]) / (8 * block_len) for profiles in block_profiles]
+        ratio = sum(ratios) / len(ratios)
+        spread: float = 0.0
+        if len(ratios) > 1:
+            variance: float = sum((r - ratio) ** 2 for r in ratios) / (len(ratios) - 1)
+            spread = confidence * math.sqrt(variance / len(ratios))
+        ratio_low, ratio_high = ratio - spread, ratio + spread
+        estimated_size = math.ceil(ratio * imp_size) + HEADER_SIZE
+
+    return {
+        "imp_size": imp_size,
+        "sampled_bytes": block_len * len(offsets),
+        "blocks": len(offsets),
+        "exact": exact,
+        "delimiter_bit": delimiter_bit,
+        "estimated_size": estimated_size,
+        "ratio": ratio,
+        "ratio_low": ratio_low,
+        "ratio_high": ratio_high,
+        "store_raw": ratio_low >= 1.0,
+        "byte_entropy": entropy / len(offsets),
+        "seconds": perf_counter() - time_start,
+    }
+
+#compressed bits for one sampled block. the block sits inside the file, so its first token is priced as a digest too
+def block_bits(engine: BPRESS, profile: TokenProfile) -> int:
+    first, counts = engine.profile_counts(profile)
+    if first:
+        counts[first] = counts.get(first, 0) + 1
+    return sum(count * engine.codebook.code_length(length) for length, count in counts.items())
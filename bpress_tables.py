@@ -0,0 +1,147 @@
+# bpress byte classification tables. armand bouillet 2025
+
+from typing import Dict, List, Optional, Tuple, TypedDict, Union
+
+import numpy as np
+
+"""
+the per byte analysis of byte_analysis_nb.ipynb as read only lookup tables. bit 0 is the most
+significant bit (bitarray's default endianness), a transition is a pair of neighbouring bits
+that differ and a flip-flop is a 3 bit window that alternates (010 or 101).
+
+BYTE_* tables have 256 entries, PAIR_* tables 65536 entries indexed by (first << 8) | second
+and cover the whole 16 bit window, EDGE_* tables 16 entries for the 4 bit window spanning two
+bytes (last 2 bits of one + first 2 of the next), which is all a scan needs on top of the byte
+tables. the byte tables come from one unpack of the 256 byte values and the pair tables are
+composed from them, so building everything at import takes a few milliseconds
+"""
+def _unpack(values: np.ndarray, width: int) -> np.ndarray:
+    shifts: np.ndarray = np.arange(width - 1, -1, -1)
+    return ((values[:, None] >> shifts) & 1).astype(np.int8)
+
+def _transitions(bits: np.ndarray) -> np.ndarray:
+    return (bits[:, :-1] != bits[:, 1:]).sum(axis=1)
+
+def _flip_flops(bits: np.ndarray) -> np.ndarray:
+    return ((bits[:, :-2] != bits[:, 1:-1]) & (bits[:, :-2] == bits[:, 2:])).sum(axis=1)
+
+#lengths of the leading run, the trailing run and the longest run of equal bits
+def _runs(bits: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    width: int = bits.shape[1]
+    same: np.ndarray = bits[:, 1:] == bits[:, :-1]
+    leading: np.ndarray = 1 + np.cumprod(same, axis=1).sum(axis=1)
+    trailing: np.ndarray = 1 + np.cumprod(same[:, ::-1], axis=1).sum(axis=1)
+    current: np.ndarray = np.ones(len(bits), dtype=np.int64)
+    longest: np.ndarray = current.copy()
+    for i in range(width - 1):
+        current = np.where(same[:, i], current + 1, 1)
+        np.maximum(longest, current, out=longest)
+    return leading, trailing, longest
+
+def _table(values: np.ndarray) -> np.ndarray:
+    table: np.ndarray = np.ascontiguousarray(values, dtype=np.int64)
+    table.setflags(write=False)
+    return table
+
+_byte_bits: np.ndarray = _unpack(np.arange(256), 8)
+_edge_bits: np.ndarray = _unpack(np.arange(16), 4)
+
+BYTE_ONES: np.ndarray = _table(_byte_bits.sum(axis=1))
+BYTE_TRANSITIONS: np.ndarray = _table(_transitions(_byte_bits))
+BYTE_FLIP_FLOPS: np.ndarray = _table(_flip_flops(_byte_bits))
+BYTE_LEADING_RUN, BYTE_TRAILING_RUN, BYTE_LONGEST_RUN = (_table(runs) for runs in _runs(_byte_bits))
+
+EDGE_TRANSITIONS: np.ndarray = _table(_transitions(_edge_bits[:, 1:3]))
+EDGE_FLIP_FLOPS: np.ndarray = _table(_flip_flops(_edge_bits))
+
+#a pair is its two bytes plus the seam between them: the edge window and the run joining across it
+_first, _second = np.divmod(np.arange(65536), 256)
+_seam: np.ndarray = ((_first & 0x03) << 2) | (_second >> 6)
+PAIR_TRANSITIONS: np.ndarray = _table(BYTE_TRANSITIONS[_first] + BYTE_TRANSITIONS[_second] + EDGE_TRANSITIONS[_seam])
+PAIR_FLIP_FLOPS: np.ndarray = _table(BYTE_FLIP_FLOPS[_first] + BYTE_FLIP_FLOPS[_second] + EDGE_FLIP_FLOPS[_seam])
+PAIR_LONGEST_RUN: np.ndarray = _table(np.maximum.reduce((
+    BYTE_LONGEST_RUN[_first],
+    BYTE_LONGEST_RUN[_second],
+    np.where((_first & 1) == (_second >> 7), BYTE_TRAILING_RUN[_first] + BYTE_LEADING_RUN[_second], 0),
+)))
+del _byte_bits, _edge_bits, _first, _second, _seam
+
+#the notebook's buckets: byte values grouped by in-byte flip-flop and transition count
+FLIP_FLOP_BUCKETS: Dict[int, Tuple[int, ...]] = {
+    count: tuple(np.flatnonzero(BYTE_FLIP_FLOPS == count).tolist()) for count in range(int(BYTE_FLIP_FLOPS.max()) + 1)
+}
+TRANSITION_BUCKETS: Dict[int, Tuple[int, ...]] = {
+    count: tuple(np.flatnonzero(BYTE_TRANSITIONS == count).tolist()) for count in range(int(BYTE_TRANSITIONS.max()) + 1)
+}
+
+#per byte (transition, flip-flop) density, the notebook's first and second order fingerprint
+BYTE_FINGERPRINT: np.ndarray = np.stack((BYTE_TRANSITIONS / 8, BYTE_FLIP_FLOPS / 8), axis=1)
+BYTE_FINGERPRINT.setflags(write=False)
+
+
+class ByteProfile(TypedDict):
+    bytes: int
+    bit_freqs: Dict[int, int]
+    transitions: int
+    flip_flops: int
+    transition_density: float
+    flip_flop_density: float
+    byte_entropy: float
+    flip_flop_buckets: List[int]
+
+
+"""
+bit frequencies, transitions and flip-flops of a buffer from its byte histogram and a histogram
+of the 4 bit edge windows between neighbouring bytes, both built COUNT_SLICE bytes at a time so
+the temporaries (bincount works in 8 byte integers) stay small for large buffers. prev_byte carries the edge across buffer boundaries.
+returns the byte histogram as well so callers can derive more from it
+"""
+COUNT_SLICE: int = 256 * 1024
+
+def count_bytes(byte_vals: np.ndarray, prev_byte: Optional[int] = None) -> Tuple[np.ndarray, int, int, int]:
+    byte_hist: np.ndarray = np.zeros(256, dtype=np.int64)
+    edge_hist: np.ndarray = np.zeros(16, dtype=np.int64)
+    for start in range(0, len(byte_vals), COUNT_SLICE):
+        window: np.ndarray = byte_vals[start:start + COUNT_SLICE + 1]
+        byte_hist += np.bincount(window[:COUNT_SLICE], minlength=256)
+        edge_hist += np.bincount(((window[:-1] & 0x03) << 2) | (window[1:] >> 6), minlength=16)
+    ones: int = int(byte_hist @ BYTE_ONES)
+    transitions: int = int(byte_hist @ BYTE_TRANSITIONS)
+    flip_flops: int = int(byte_hist @ BYTE_FLIP_FLOPS)
+
+    if prev_byte is not None and len(byte_vals):
+        edge_hist[((prev_byte & 0x03) << 2) | (int(byte_vals[0]) >> 6)] += 1
+    transitions += int(edge_hist @ EDGE_TRANSITIONS)
+    flip_flops += int(edge_hist @ EDGE_FLIP_FLOPS)
+    return byte_hist, ones, transitions, flip_flops
+
+"""
+structure profile of one buffer: the scan counts, their densities per bit boundary and per 3 bit
+window, the shannon entropy of the byte histogram (bits per byte, 8.0 for uniform bytes) and how
+many bytes fall in each in-byte flip-flop bucket
+"""
+def profile_bytes(data: Union[bytes, bytearray, memoryview], prev_byte: Optional[int] = None) -> ByteProfile:
+    byte_vals: np.ndarray = np.frombuffer(data, dtype=np.uint8)
+    byte_hist, ones, transitions, flip_flops = count_bytes(byte_vals, prev_byte)
+    bit_len: int = len(byte_vals) * 8
+    carried: int = 1 if prev_byte is not None and len(byte_vals) else 0
+
+    entropy: float = 0.0
+    if len(byte_vals):
+        probabilities: np.ndarray = byte_hist[byte_hist > 0] / len(byte_vals)
+        entropy = max(0.0, float(-(probabilities * np.log2(probabilities)).sum()))
+
+    return {
+        "bytes": len(byte_vals),
+        "bit_freqs": {0: bit_len - ones, 1: ones},
+        "transitions": transitions,
+        "flip_flops": flip_flops,
+        "transition_density": transitions / max(bit_len - 1 + carried, 1),
+        "flip_flop_density": flip_flops / max(bit_len - 2 + 2 * carried, 1),
+        "byte_entropy": entropy,
+        "flip_flop_buckets": np.bincount(BYTE_FLIP_FLOPS, weights=byte_hist, minlength=len(FLIP_FLOP_BUCKETS)).astype(np.int64).tolist(),
+    }
+
+#pair values of neighbouring bytes, the index into the PAIR_* tables
+def byte_pairs(byte_vals: np.ndarray) -> np.ndarray:
+    return (byte_vals[:-1].astype(np.uint16) << 8) | byte_vals[1:]
@@ -1,16 +1,152 @@
 # bpress version 1.0.0. armand bouillet 2025
 
+import bisect
+import hashlib
+import heapq
+import json
+import mmap
 import os
+import stat
+import struct
+import tempfile
 from typing import (
-    Any, Callable, Dict, List, Optional, Tuple, Union, TypedDict, Iterable, BinaryIO
+    Any, Callable, Dict, List, Optional, Tuple, Union, TypedDict, Iterable, Iterator, BinaryIO, NotRequired
 )
 from pathlib import Path
-from bitarray import bitarray  # type: ignore
+from functools import lru_cache
+from time import perf_counter, perf_counter_ns
+from bitarray import bitarray, frozenbitarray  # type: ignore
+import numpy as np
+
+from bpress_tables import count_bytes
 
 class ScannedData(TypedDict):
     bit_freqs: Dict[int, int]
     transitions: int
     flip_flops: int
+    estimated_sizes: NotRequired[Dict[int, int]]
+
+#token length histogram for one candidate delimiter, first token (the preamble) and trailing run kept apart
+class TokenProfile(TypedDict):
+    counts: Dict[int, int]
+    first: int
+    carry: int
+
+#symbol mode run statistics: runs per symbol and per run length, the open trailing run kept apart
+class SymbolProfile(TypedDict):
+    symbols: Dict[int, int]
+    runs: Dict[int, int]
+    last: int
+    carry: int
+
+#a persisted full scan: the identity of the input it was taken of, its statistics and the carry state at its end
+class ScanRecord(TypedDict):
+    version: int
+    path: str
+    size: int
+    mtime_ns: int
+    inode: int
+    edge_hash: str
+    content_hash: Optional[str]
+    last_byte: int
+    scanned_data: ScannedData
+    token_profiles: Optional[Dict[int, TokenProfile]]
+    symbol_bits: int
+    symbol_profile: Optional[SymbolProfile]
+
+"""
+closed form of the bucketized digest for token lengths beyond the precomputed table.
+a flag stem of k ones (k >= 5) closes with a 0 and selects the bucket of lengths
+[2**(k-1) + 2, 2**k + 2), the tail stem is the zero padded index into that bucket (k-1 bits wide)
+"""
+MIN_MAPPED_TOKEN_LEN: int = 18
+
+#first byte of every .press stream ("b") and the width of the decoder lookup window in bits
+MAGIC_BYTE: int = 0x62
+DECODE_WINDOW: int = 16
+
+#bits ahead of the preamble in a bit mode stream with the fixed digest code: magic byte, flag byte, delimiter bit
+HEADER_BITS: int = 17
+
+#first byte of a streamed stream (Compressor output handed out as it is encoded). its header byte 1 goes
+#out before the stuffing, stored and padding flags are known, so they are left clear there and the final
+#flag byte follows the stream instead, after the stored trailer if there is one
+STREAMED_MAGIC_BYTE: int = 0x63
+
+#revision of the .press layout, bumped whenever the same input and settings would give different bytes
+FORMAT_VERSION: int = 1
+
+#inputs at least this large are memory mapped instead of read buffer by buffer
+MMAP_THRESHOLD: int = 256 * 1024
+
+#adaptive digests: token lengths up to this get their own code, longer ones are escaped
+ADAPTIVE_MAX_SYMBOL: int = 255
+ADAPTIVE_FLAG_BIT: int = 9
+
+#symbol mode: header byte 1 bits 2-3 hold the symbol width code (0 is the classic bit mode)
+SYMBOL_MODE_BITS: Dict[int, int] = {1: 0, 4: 1, 8: 2}
+SYMBOL_MODE_OFFSET: int = 10
+
+#stored streams: header byte 1 bit 4 marks a stream whose encoded section is followed by the rest of
+#the input copied through, the stream ends in the byte offset of that raw section. the compressor
+#switches once its output (header aside) runs STORED_THRESHOLD bytes past the input it has consumed
+STORED_FLAG_BIT: int = 12
+STORED_TRAILER_FORMAT: str = "<Q"
+STORED_TRAILER_SIZE: int = struct.calcsize(STORED_TRAILER_FORMAT)
+STREAMED_TRAILER_SIZE: int = STORED_TRAILER_SIZE + 1
+STORED_THRESHOLD: int = 1024
+
+#large buffers are worked in SLICE_SIZE pieces (DECODE_SLICE compressed bytes when decoding): the per
+#bit temporaries of tokenizing and decoding run to tens of bytes per input byte, slicing keeps them
+#constant while the output does not change (every stage carries its state across calls).
+#buffer="auto" picks the I/O size
+SLICE_SIZE: int = 64 * 1024
+DECODE_SLICE: int = 16 * 1024
+AUTO_BUFFER_MIN: int = 64 * 1024
+AUTO_BUFFER_MAX: int = 8 * 1024 * 1024
+
+#random access: the compressor can record a checkpoint every checkpoint_interval input bytes into a
+#sidecar index (the output path plus CHECKPOINT_SUFFIX) that read_range decodes from
+CHECKPOINT_MAGIC: bytes = b"BPRX"
+CHECKPOINT_VERSION: int = 1
+CHECKPOINT_HEADER_FORMAT: str = "<4sB3xIQQ"
+CHECKPOINT_ENTRY_FORMAT: str = "<QQ"
+CHECKPOINT_HEADER_SIZE: int = struct.calcsize(CHECKPOINT_HEADER_FORMAT)
+CHECKPOINT_SUFFIX: str = ".idx"
+CHECKPOINT_INTERVAL: int = SLICE_SIZE
+
+#scan index: a full scan can be kept as a small json record per input under a scan_cache_dir, keyed by
+#the input's path and checked against its size, mtime and inode. the first and last SCAN_EDGE_SIZE
+#bytes of the scanned range are hashed into the record as well
+SCAN_INDEX_VERSION: int = 1
+SCAN_EDGE_SIZE: int = 4 * 1024
+
+"""
+buffer size for buffer="auto": a 256th of the input within [AUTO_BUFFER_MIN, AUTO_BUFFER_MAX],
+and no more than a 64th of the available memory (two buffers, the compressed bits and the output
+block are held at once). available_memory defaults to what the os reports, where it reports it
+"""
+def auto_buffer_size(imp_size: int, available_memory: Optional[int] = None) -> int:
+    if available_memory is None:
+        try:
+            available_memory = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+        except (AttributeError, ValueError, OSError): #not available on windows
+            available_memory = None
+    size: int = min(max(imp_size // 256, AUTO_BUFFER_MIN), AUTO_BUFFER_MAX)
+    if available_memory is not None:
+        size = min(size, max(available_memory // 64, AUTO_BUFFER_MIN))
+    #whole slices keep every slice but the last at full size
+    return max(size // SLICE_SIZE, 1) * SLICE_SIZE
+
+def digest_stem(token_len: int) -> str:
+    if token_len < MIN_MAPPED_TOKEN_LEN:
+        raise ValueError("token length falls inside the precomputed digest table")
+    flag_len: int = (token_len - 2).bit_length()
+    tail_len: int = flag_len - 1
+    flag_stem: str = "1" * flag_len + "0"
+    tail_stem: str = format(token_len - (2**tail_len + 2), f"0{tail_len}b")
+    return flag_stem + tail_stem
+
 
 class BPRESS:
     
@@ -50,14 +186,22 @@ class BPRESS:
                 # declare attributes that other methods touch; initialize safely
         self.file_in: Optional[int] = None
         self.file_out: Optional[int] = None
+        self.mapping: Optional[memoryview] = None
+        self.released: int = 0
+        self.use_mmap: Optional[bool] = None
         self.buffer: int = 4 * 1024
         self.imp_size: int = 0
 
         self.bytes_read_pass_one: int = 0
         self.bytes_read_pass_two: int = 0
         self.bytes_compressed: int = 0
+        self.reads: int = 0
 
         self.scan_complete: bool = False
+        self.scan_cache_dir: Optional[str] = None
+        self.scan_hash: bool = False
+        self.scan_digest: Optional[Any] = None
+        self.scan_resumed: int = 0
         self.protocol_complete: bool = False
         self.compression_complete: bool = False
         self.protocol_update_complete: bool = False
@@ -69,55 +213,19 @@ class BPRESS:
         self.bit_stuffing: bool = False
         self.padding: Optional[str] = None
         self.end_bits: Optional[bitarray] = None
+        self.token_profiles: Optional[Dict[int, TokenProfile]] = None
+        self.adaptive_codebook: Optional["AdaptiveCodebook"] = None
+        self.symbol_bits: int = 1
+        self.symbol_profile: Optional[SymbolProfile] = None
+        self.symbol_codebook: Optional["SymbolCodebook"] = None
 
     def map_token_digest(self, token_len: int, output_dict: Dict[int, str] = token_digest_table) -> bitarray:
                 
         if token_len in output_dict:
             raise ValueError("token length map already exists")
 
-        #set in proceeding steps
-        tail_len: Optional[int] = None
-        bucket_values: Optional[List[int]] = None
-
-        #these values are set based on the next possible value in our token digest map
-        min_token_len: int = 18
-        min_tail_len: int = 4
-
-        #synthesize possible token length range based on tail bucketization
-        def get_input_len_range() -> Tuple[int, int]:
-            range_max: int = 5
-            n: int = min_tail_len - 2
-            while n >= 0:
-                range_max += 2**(min_tail_len - n)
-                n -= 1
-            return (min_token_len, range_max)
-
-        #find appriopriate tail bucketization length for input. Store value
-        while True:
-            token_len_range_t: Tuple[int, int] = get_input_len_range()
-            token_len_range_l: List[int] = list(range(token_len_range_t[0], token_len_range_t[1] + 1))
-
-            if token_len in token_len_range_l:
-                tail_len = min_tail_len
-                bucket_values = token_len_range_l
-                break
-
-            min_token_len = (token_len_range_t[1] + 1)
-            min_tail_len += 1
-
-        #synthesize full bin stem
-        flag_stem: str = "".join([str(1) for _ in range(0, tail_len + 1)] + ["0"])
-
-        #find the index and tail value for token
-        token_bucket_index: int = bucket_values.index(token_len)
-        bin_typing: str = f"{tail_len}b"
-        if tail_len < 10:
-            bin_typing: str = f"0{tail_len}b"
-
-        tail_stem: str = format(token_bucket_index, bin_typing)
-
         #assemble final stem and update digest table
-        token_bin_stem: str = flag_stem + tail_stem
+        token_bin_stem: str = digest_stem(token_len)
         output_dict[token_len] = token_bin_stem
 
         return bitarray(token_bin_stem)
@@ -137,6 +245,10 @@ class BPRESS:
             digest_map: Optional[Dict[int,str]] = None, 
     ) -> bitarray:
         
+        #default digests are served straight from the shared codebook
+        if digest_gen is None and digest_map is None:
+            return self.codebook.encode(token_length)
+
         if digest_gen is None:
             digest_gen = self.map_token_digest
         if digest_map is None:
@@ -149,6 +261,15 @@ class BPRESS:
         
         return bitarray(digest_map[token_length])
     
+    #process wide digest codebook built from token_digest_table, unless the stream carries its own
+    @property
+    def codebook(self) -> Union["DigestCodebook", "SymbolCodebook"]:
+        if self.symbol_codebook is not None:
+            return self.symbol_codebook
+        if self.adaptive_codebook is not None:
+            return self.adaptive_codebook
+        return digest_codebook()
+
     """
     pulls out the next token length and also returns the new bit_stream for reassignment
     """
@@ -159,6 +280,19 @@ class BPRESS:
                 return token_length, bit_stream[token_length:]
         raise ValueError("Delimiter not found")
 
+    """
+    vectorized replacement for repeated pull_token calls. every delimiter position in the
+    stream is located in a single pass and the token lengths (complement run + closing delimiter)
+    are returned as an integer array. bits trailing the final delimiter do not form a token,
+    the caller can recover them as bit_stream[tokens.sum():]
+    """
+    def tokenize(self, bit_stream: bitarray, delimiter: int) -> np.ndarray:
+        if not bit_stream:
+            return np.empty(0, dtype=np.int64)
+        bits = np.unpackbits(np.frombuffer(bit_stream, dtype=np.uint8), count=len(bit_stream))
+        positions = np.flatnonzero(bits == delimiter)
+        return np.diff(positions, prepend=-1)
+
     """
     small utilities that are used to scan the compression target on initial pass.
     utilities will be used to create a dictionary of data that can be used to dynamically
@@ -173,21 +307,168 @@ class BPRESS:
     
     #@test_status("level_1")   
     def count_transitions(self, bit_stream: bitarray) -> int:
-        transitions = 0
-        if len(bit_stream) <= 1:
-            return transitions
-        for i in range(0,len(bit_stream)-1):
-            if bit_stream[i] != bit_stream[i+1]:
-                transitions += 1
-        return transitions
+        return self.scan_bits(bit_stream)["transitions"]
     
     #@test_status("level_1")   
     def count_flip_flops(self, bit_stream: bitarray) -> int:
-        if len(bit_stream) < 3:
+        return self.scan_bits(bit_stream)["flip_flops"]
+
+    """
+    fused scan engine: bit frequencies, transitions and flip-flops in one vectorized pass.
+    a byte histogram is dotted against the 256 entry in-byte tables of bpress_tables, then the
+    1-2 bit edges between neighbouring bytes are resolved from a histogram of 4 bit edge windows
+    (last 2 bits of a byte + first 2 bits of the next). prev_byte carries the edge across
+    buffer boundaries
+    """
+    def scan_bytes(self, data: Union[bytes, bytearray, memoryview], prev_byte: Optional[int] = None) -> ScannedData:
+        byte_vals: np.ndarray = np.frombuffer(data, dtype=np.uint8)
+        if not len(byte_vals):
+            return {"bit_freqs": {0: 0, 1: 0}, "transitions": 0, "flip_flops": 0}
+
+        _, ones, transitions, flip_flops = count_bytes(byte_vals, prev_byte)
+        return {
+            "bit_freqs": {0: len(byte_vals) * 8 - ones, 1: ones},
+            "transitions": transitions,
+            "flip_flops": flip_flops,
+        }
+
+    #scan engine for arbitrary bit lengths, the sub-byte tail is finished bit by bit
+    def scan_bits(self, bit_stream: bitarray) -> ScannedData:
+        whole_bytes: int = len(bit_stream) // 8
+        scan: ScannedData = self.scan_bytes(bit_stream[:whole_bytes * 8].tobytes())
+        if len(bit_stream) % 8:
+            tail: bitarray = bit_stream[max(whole_bytes * 8 - 2, 0):]
+            lead: int = min(whole_bytes * 8, 2)
+            scan["bit_freqs"][0] += tail[lead:].count(0)
+            scan["bit_freqs"][1] += tail[lead:].count(1)
+            scan["transitions"] += sum(1 for i in range(max(lead - 1, 0), len(tail) - 1) if tail[i] != tail[i+1])
+            scan["flip_flops"] += sum(1 for i in range(0, len(tail) - 2) if tail[i] != tail[i+1] and tail[i] == tail[i+2])
+        return scan
+
+    """
+    cost model scan: token length histograms for both candidate delimiters, built from one
+    unpack of the buffer. a delimiter's runs carry across buffers the same way raw_carryover
+    does during compression, so the histograms match the tokens the encoder will produce
+    """
+    def new_token_profiles(self) -> Dict[int, TokenProfile]:
+        return {delimiter: {"counts": {}, "first": 0, "carry": 0} for delimiter in (0, 1)}
+
+    def profile_tokens(self, data: Union[bytes, bytearray, memoryview], profiles: Dict[int, TokenProfile]):
+        byte_vals: np.ndarray = np.frombuffer(data, dtype=np.uint8)
+        if not len(byte_vals):
+            return
+        bits: np.ndarray = np.unpackbits(byte_vals)
+        for delimiter, profile in profiles.items():
+            positions: np.ndarray = np.flatnonzero(bits == delimiter)
+            if not len(positions):
+                profile["carry"] += len(bits)
+                continue
+            tokens: np.ndarray = np.diff(positions, prepend=-1)
+            tokens[0] += profile["carry"]
+            profile["carry"] = len(bits) - 1 - int(positions[-1])
+            if not profile["first"]:
+                profile["first"] = int(tokens[0])
+                tokens = tokens[1:]
+            lengths, counts = np.unique(tokens, return_counts=True)
+            for length, count in zip(lengths.tolist(), counts.tolist()):
+                profile["counts"][length] = profile["counts"].get(length, 0) + count
+
+    #feed one buffer, slice by slice, to whichever profiles the current settings asked for
+    def profile_buffer(self, data: Union[bytes, bytearray, memoryview]):
+        with memoryview(data) as view:
+            for start in range(0, len(view), SLICE_SIZE):
+                if self.token_profiles is not None:
+                    self.profile_tokens(view[start:start + SLICE_SIZE], self.token_profiles)
+                if self.symbol_profile is not None:
+                    self.profile_symbols(view[start:start + SLICE_SIZE], self.symbol_profile)
+
+    """
+    symbol mode tokenization: the stream is read as symbol_bits wide symbols (nibbles or bytes,
+    most significant first) and every maximal run of one symbol is a token. symbol_runs returns
+    the run symbols and lengths, the symbol profile keeps the run still open at the end of a
+    buffer as last/carry so runs crossing buffers are counted once
+    """
+    def symbol_values(self, data: Union[bytes, bytearray, memoryview, bitarray]) -> np.ndarray:
+        byte_vals: np.ndarray = np.frombuffer(data, dtype=np.uint8)
+        if self.symbol_bits == 8:
+            return byte_vals
+        return np.stack((byte_vals >> 4, byte_vals & 0x0F), axis=1).ravel()
+
+    def symbol_runs(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        starts: np.ndarray = np.flatnonzero(np.diff(values)) + 1
+        starts = np.concatenate(([0], starts))
+        lengths: np.ndarray = np.diff(np.append(starts, len(values)))
+        return values[starts].astype(np.int64), lengths
+
+    def new_symbol_profile(self) -> SymbolProfile:
+        return {"symbols": {}, "runs": {}, "last": -1, "carry": 0}
+
+    def profile_symbols(self, data: Union[bytes, bytearray, memoryview], profile: SymbolProfile):
+        values: np.ndarray = self.symbol_values(data)
+        if not len(values):
+            return
+        symbols, lengths = self.symbol_runs(values)
+        if symbols[0] == profile["last"]:
+            lengths[0] += profile["carry"]
+        elif profile["carry"]:
+            self.count_symbol_runs(profile, np.array([profile["last"]]), np.array([profile["carry"]]))
+        profile["last"], profile["carry"] = int(symbols[-1]), int(lengths[-1])
+        self.count_symbol_runs(profile, symbols[:-1], lengths[:-1])
+
+    def count_symbol_runs(self, profile: SymbolProfile, symbols: np.ndarray, lengths: np.ndarray):
+        for field, values in (("symbols", symbols), ("runs", lengths)):
+            keys, counts = np.unique(values, return_counts=True)
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                profile[field][key] = profile[field].get(key, 0) + count #type: ignore
+
+    #run histogram keyed like SymbolCodebook symbols (run length << symbol_bits | symbol), the open run closed
+    def symbol_counts(self, profile: SymbolProfile) -> Tuple[Dict[int, int], Dict[int, int]]:
+        symbols: Dict[int, int] = dict(profile["symbols"])
+        runs: Dict[int, int] = dict(profile["runs"])
+        if profile["carry"]:
+            symbols[profile["last"]] = symbols.get(profile["last"], 0) + 1
+            runs[profile["carry"]] = runs.get(profile["carry"], 0) + 1
+        return symbols, runs
+
+    #exact symbol mode size: 16 header bits, the symbol code description, one symbol code and run digest per run
+    def estimate_symbol_size(self, profile: SymbolProfile, codebook: "SymbolCodebook") -> int:
+        symbols, runs = self.symbol_counts(profile)
+        if not symbols:
             return 0
-        flip_flops = sum(1 for i in range(0,len(bit_stream)-2) if bit_stream[i] != bit_stream[i+1] and bit_stream[i] == bit_stream[i+2])
-        return flip_flops
+        size_bits: int = 16 + len(codebook.describe())
+        size_bits += sum(count * codebook.symbol_length(symbol) for symbol, count in symbols.items())
+        size_bits += sum(count * codebook.base.code_length(run) for run, count in runs.items())
+        return -(-size_bits // 8)
+
+    #preamble length and digest histogram of a profile, the stuffed closing token of a trailing run included
+    def profile_counts(self, profile: TokenProfile) -> Tuple[int, Dict[int, int]]:
+        first: int = profile["first"]
+        counts: Dict[int, int] = dict(profile["counts"])
+        if profile["carry"]:
+            if first:
+                counts[profile["carry"] + 1] = counts.get(profile["carry"] + 1, 0) + 1
+            else:
+                first = profile["carry"] + 1
+        return first, counts
 
+    """
+    exact .press size in bytes for a profile: header and delimiter (HEADER_BITS) plus any code
+    description the codebook adds, the raw preamble, one digest per remaining token, padded to
+    a byte boundary. codebook defaults to the fixed digest code
+    """
+    def estimate_size(self, profile: TokenProfile, codebook: Optional["DigestCodebook"] = None) -> int:
+        if codebook is None:
+            codebook = digest_codebook()
+        first, counts = self.profile_counts(profile)
+        if not first:
+            return 0
+        size_bits: int = HEADER_BITS + len(codebook.describe()) + first + sum(count * codebook.code_length(length) for length, count in counts.items())
+        return -(-size_bits // 8)
+
+    #publish per delimiter size estimates (fixed digest code) into scanned_data for the "cost" delimiter mode
+    def estimate_sizes(self):
+        if self.token_profiles is not None:
+            self.scanned_data["estimated_sizes"] = {delimiter: self.estimate_size(profile) for delimiter, profile in self.token_profiles.items()}
 
     """
     Flexible modular delimiter setup allowing for future customization:
@@ -221,59 +502,622 @@ class BPRESS:
         if mode == "low":
             return min(bf, key=bf.get) #type: ignore
 
+        #smallest estimated output, ties fall back to the low frequency delimiter
+        if mode == "cost":
+            if "estimated_sizes" not in data:
+                raise ValueError("Cost mode requires estimated sizes from a profiled scan")
+            sizes: Dict[int, int] = data["estimated_sizes"]
+            if sizes[0] == sizes[1]:
+                return min(bf, key=bf.get) #type: ignore
+            return min(sizes, key=sizes.get) #type: ignore
+
         raise ValueError(f"Unknown mode: {mode}")
 
     
         # method toolkit to aid with context manager control flow
     def update_scanned_data (self, bit_stream: bitarray):
-        scan_bits: List[int] = self.count_bits(bit_stream)
-        self.scanned_data["bit_freqs"][0] += scan_bits[0]
-        self.scanned_data["bit_freqs"][1] += scan_bits[1]
-        self.scanned_data["transitions"] += self.count_transitions(bit_stream)
-        self.scanned_data["flip_flops"] += self.count_flip_flops (bit_stream)
-
-    def scan_stream(self):
-        last: bitarray = bitarray()
-        while True:
-            #generate bitarray stream
-            buffer = os.read(self.file_in, self.buffer) #type: ignore
+        self.merge_scanned_data(self.scan_bits(bit_stream))
+
+    def merge_scanned_data (self, scan: ScannedData):
+        self.scanned_data["bit_freqs"][0] += scan["bit_freqs"][0]
+        self.scanned_data["bit_freqs"][1] += scan["bit_freqs"][1]
+        self.scanned_data["transitions"] += scan["transitions"]
+        self.scanned_data["flip_flops"] += scan["flip_flops"]
+
+    """
+    full scan of the open input. with a scan_cache_dir and a regular input at path, the scan starts
+    from the input's scan record (see resume_scan) and only the bytes it does not cover are read;
+    a scan that read anything leaves an updated record behind
+    """
+    def scan_stream(self, path: Optional[str] = None):
+        last: Optional[int] = None
+        start: int = 0
+        record_path: Optional[str] = None
+        file_stat: Optional[os.stat_result] = None
+        if self.scan_cache_dir is not None and path is not None:
+            file_stat = os.fstat(self.file_in) #type: ignore
+            if stat.S_ISREG(file_stat.st_mode):
+                record_path = scan_record_path(self.scan_cache_dir, path)
+                start, last = self.resume_scan(load_scan_record(record_path), path, file_stat)
+
+        for buffer in self.iter_buffers(start = start):
+            #gather and update data, edges against the previous buffer are fixed up by the scan engine
             self.bytes_read_pass_one += len(buffer)
-            stream: bitarray = bitarray()
-            stream.frombytes(buffer)
-            first = stream[:2]
-  
+            self.merge_scanned_data(self.scan_bytes(buffer, last))
+            self.profile_buffer(buffer)
+            if self.scan_digest is not None:
+                self.scan_digest.update(buffer)
+            last = buffer[-1]
 
-            #gather and update data
-            self.update_scanned_data(stream)
+        #check for end of file
+        if self.bytes_read_pass_one == self.imp_size:
+            self.scan_complete = True
 
-            if last and buffer:
-                if last[-1] != stream[0]:
-                    self.scanned_data["transitions"] += 1
-                
-                edge_bits = last + stream[:2]
-                flip_flops: int = self.count_flip_flops(edge_bits)
+            #the record takes the identity from before the scan, an input changed meanwhile will not match it
+            if record_path is not None and start < self.bytes_read_pass_one == file_stat.st_size: #type: ignore
+                save_scan_record(record_path, self.scan_record(path, file_stat, last)) #type: ignore
 
-                if flip_flops > 0:
-                    self.scanned_data["flip_flops"] += flip_flops
+    """
+    restores the scan state from a record of the input and returns the bytes it covers and the last
+    of them, (0, None) when it is unusable. a record covers the whole input while size, mtime and
+    inode are unchanged, and the old size when the input has only grown (same inode, larger), so
+    an appended input scans just its tail. either way the hash of the edges of the covered range
+    must still match, with scan_hash the content hash of the whole range too (read, not scanned).
+    a record lacking a profile the current settings need is unusable
+    """
+    def resume_scan(self, record: Optional[ScanRecord], path: str, file_stat: os.stat_result) -> Tuple[int, Optional[int]]:
+        self.scan_digest = hashlib.blake2b(digest_size = 16) if self.scan_hash else None
+        if record is None or record["path"] != os.path.realpath(path) or record["inode"] != file_stat.st_ino:
+            return 0, None
+        if record["size"] > file_stat.st_size or (record["size"] == file_stat.st_size and record["mtime_ns"] != file_stat.st_mtime_ns):
+            return 0, None
+        if self.token_profiles is not None and record["token_profiles"] is None:
+            return 0, None
+        if self.symbol_profile is not None and (record["symbol_profile"] is None or record["symbol_bits"] != self.symbol_bits):
+            return 0, None
+        if edge_hash(self.file_in, record["size"]) != record["edge_hash"]: #type: ignore
+            return 0, None
+        if self.scan_digest is not None:
+            if record["content_hash"] is None or hash_range(self.file_in, record["size"], self.scan_digest) != record["content_hash"]: #type: ignore
+                self.scan_digest = hashlib.blake2b(digest_size = 16)
+                return 0, None
+
+        self.merge_scanned_data(record["scanned_data"])
+        if self.token_profiles is not None:
+            self.token_profiles = record["token_profiles"]
+        if self.symbol_profile is not None:
+            self.symbol_profile = record["symbol_profile"]
+        self.bytes_read_pass_one += record["size"]
+        self.scan_resumed = record["size"]
+        return record["size"], record["last_byte"]
+
+    def scan_record(self, path: str, file_stat: os.stat_result, last_byte: int) -> ScanRecord:
+        return {
+            "version": SCAN_INDEX_VERSION,
+            "path": os.path.realpath(path),
+            "size": file_stat.st_size,
+            "mtime_ns": file_stat.st_mtime_ns,
+            "inode": file_stat.st_ino,
+            "edge_hash": edge_hash(self.file_in, file_stat.st_size), #type: ignore
+            "content_hash": self.scan_digest.hexdigest() if self.scan_digest is not None else None,
+            "last_byte": int(last_byte),
+            "scanned_data": {
+                "bit_freqs": dict(self.scanned_data["bit_freqs"]),
+                "transitions": self.scanned_data["transitions"],
+                "flip_flops": self.scanned_data["flip_flops"],
+            },
+            "token_profiles": self.token_profiles,
+            "symbol_bits": self.symbol_bits,
+            "symbol_profile": self.symbol_profile,
+        }
 
-            last = stream[-2:]
+    """
+    input backend shared by the scanner and the compressor. regular files of at least
+    MMAP_THRESHOLD bytes are memory mapped and handed out as memoryview windows over the
+    mapping, so buffer is a logical chunk size rather than a read size and nothing is copied.
+    small or non-regular inputs (pipes) fall back to os.read. use_mmap forces either path
+    """
+    def open_input(self, path: str):
+        self.file_in = os.open(path, os.O_RDONLY)
+        self.mapping = None
+        if self.use_mmap is False:
+            return
+        file_stat: os.stat_result = os.fstat(self.file_in)
+        if stat.S_ISREG(file_stat.st_mode) and file_stat.st_size > 0:
+            if self.use_mmap or file_stat.st_size >= MMAP_THRESHOLD:
+                self.mapping = memoryview(mmap.mmap(self.file_in, 0, access = mmap.ACCESS_READ))
+
+    def close_input(self):
+        if self.mapping is not None:
+            mapped: mmap.mmap = self.mapping.obj #type: ignore
+            self.mapping.release()
+            self.mapping = None
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # a window is still referenced (e.g. from a traceback), the map closes when it is collected
+        if self.file_in is not None:
+            os.close(self.file_in)
+            self.file_in = None
 
-            #check for end of file and close if so
-            if len(buffer) < self.buffer and self.bytes_read_pass_one == self.imp_size:
-                self.scan_complete = True
-                break
-            elif len(buffer) < self.buffer:
+    """
+    drops the mapped pages below end from the process once they are consumed, so resident memory
+    does not grow with the input. the pages stay in the page cache and fault back in if touched
+    again (the second pass, a window still referenced). platforms without MADV_DONTNEED keep them
+    """
+    def release_mapped(self, end: int):
+        if self.mapping is None or not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        end = min(end, len(self.mapping)) // mmap.PAGESIZE * mmap.PAGESIZE
+        if end > self.released:
+            self.mapping.obj.madvise(mmap.MADV_DONTNEED, self.released, end - self.released) #type: ignore
+            self.released = end
+
+    #logical buffers over the input, any already read prefix (a scan sample) is handed out first.
+    #start skips that many bytes of the input (a resumed scan), a read input is positioned there
+    def iter_buffers(self, prefix: Union[bytes, memoryview] = b"", start: int = 0) -> Iterator[Union[bytes, memoryview]]:
+        prefix_view: memoryview = memoryview(prefix)
+        for offset in range(0, len(prefix_view), self.buffer):
+            yield prefix_view[offset:offset + self.buffer]
+
+        if self.mapping is not None:
+            self.released = 0
+            for offset in range(start + len(prefix_view), len(self.mapping), self.buffer):
+                yield self.mapping[offset:offset + self.buffer]
+                self.release_mapped(offset + self.buffer)
+            return
+
+        if start:
+            os.lseek(self.file_in, start, os.SEEK_SET) #type: ignore
+
+        while True:
+            buffer: bytes = self.read_buffer(self.buffer)
+            if not buffer:
+                return
+            yield buffer
+
+    """
+    reads up to size bytes, short reads (pipes, sockets) are retried so that a
+    short buffer always means the input is exhausted
+    """
+    def read_buffer(self, size: int) -> bytes:
+        buffer = os.read(self.file_in, size) #type: ignore
+        self.reads += 1
+        while buffer and len(buffer) < size:
+            more = os.read(self.file_in, size - len(buffer)) #type: ignore
+            self.reads += 1
+            if not more:
                 break
+            buffer += more
+        return buffer
+
+
 
+"""
+array backed view of the digest mapping. every code up to max_len is built once from
+token_digest_table (the source of truth) and the closed form digest_stem for longer lengths,
+stored as an immutable bitarray so encoding a token is a direct index. lengths beyond max_len
+fall back to the closed form and are memoized in code_map.
+
+encode_batch takes an integer array of token lengths (as returned by BPRESS.tokenize) and
+emits the concatenated codes through bitarray's C level prefix encoder in a single call
+"""
+class DigestCodebook:
+
+    def __init__(self, max_len: int = 1024, digest_map: Optional[Dict[int, str]] = None):
+        if max_len < 1:
+            raise ValueError("codebook must cover at least token length 1")
+        if digest_map is None:
+            digest_map = BPRESS.token_digest_table
+
+        self.max_len: int = max_len
+        self.digest_map: Dict[int, str] = digest_map
+        self.codes: List[frozenbitarray] = [frozenbitarray()]
+        for token_len in range(1, max_len + 1):
+            self.codes.append(self._build(token_len))
+
+        #code lengths in bits indexed by token length, index 0 is unused
+        self.code_lengths: np.ndarray = np.array([len(code) for code in self.codes], dtype=np.int64)
+        #most a digest can exceed its token length by, past max_len digests are far shorter than their tokens
+        self.max_excess: int = max(0, int((self.code_lengths[1:] - np.arange(1, max_len + 1)).max()))
+        self.code_map: Dict[int, frozenbitarray] = {token_len: self.codes[token_len] for token_len in range(1, max_len + 1)}
+        self._decode_table: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def __repr__(self):
+        return f"<DigestCodebook max_len={self.max_len}>"
+
+    #the fixed code is implied by the format, nothing is stored in the header
+    def describe(self) -> bitarray:
+        return bitarray()
+
+    def _build(self, token_len: int) -> frozenbitarray:
+        if token_len in self.digest_map:
+            return frozenbitarray(self.digest_map[token_len])
+        return frozenbitarray(digest_stem(token_len))
+
+    def encode(self, token_len: int) -> frozenbitarray:
+        if token_len < 1:
+            raise ValueError("token length must be positive")
+        if token_len <= self.max_len:
+            return self.codes[token_len]
+        code = self.code_map.get(token_len)
+        if code is None:
+            code = self.code_map[token_len] = self._build(token_len)
+        return code
+
+    def code_length(self, token_len: int) -> int:
+        if 0 < token_len <= self.max_len:
+            return int(self.code_lengths[token_len])
+        return len(self.encode(token_len))
+
+    #code length of every token in an array, the rare lengths past max_len take the scalar path
+    def batch_code_lengths(self, token_lens: np.ndarray) -> np.ndarray:
+        if token_lens.max() <= self.max_len:
+            return self.code_lengths[token_lens]
+        lengths: np.ndarray = self.code_lengths[np.minimum(token_lens, self.max_len)]
+        long_tokens: np.ndarray = token_lens > self.max_len
+        if long_tokens.any():
+            lengths[long_tokens] = [self.code_length(token_len) for token_len in token_lens[long_tokens].tolist()]
+        return lengths
+
+    def encode_batch(self, token_lens: np.ndarray, out: Optional[bitarray] = None) -> bitarray:
+        if out is None:
+            out = bitarray()
+        if len(token_lens) == 0:
+            return out
+
+        #memoize any long lengths so the C encoder only sees known symbols
+        if token_lens.min() < 1:
+            raise ValueError("token length must be positive")
+        if token_lens.max() > self.max_len:
+            for token_len in np.unique(token_lens[token_lens > self.max_len]).tolist():
+                self.encode(token_len)
+
+        out.encode(self.code_map, token_lens.tolist())
+        return out
+
+    """
+    decoding side of the codebook: a DECODE_WINDOW bit lookup table indexed by the next
+    window of the compressed stream, holding the code length (0 if the code is longer than
+    the window) and the token length it maps to
+    """
+    def decode_table(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._decode_table is None:
+            table_len: np.ndarray = np.zeros(1 << DECODE_WINDOW, dtype=np.int64)
+            table_sym: np.ndarray = np.zeros(1 << DECODE_WINDOW, dtype=np.int64)
+            for token_len, code in self.code_map.items():
+                if len(code) > DECODE_WINDOW:
+                    continue
+                shift: int = DECODE_WINDOW - len(code)
+                first: int = int(code.to01(), 2) << shift
+                table_len[first:first + (1 << shift)] = len(code)
+                table_sym[first:first + (1 << shift)] = token_len
+            self._decode_table = (table_len, table_sym)
+        return self._decode_table
+
+    #slow path for codes longer than the lookup window, returns (token length, code length) or None if truncated
+    def decode_long(self, bit_stream: bitarray, pos: int, end: int) -> Optional[Tuple[int, int]]:
+        try:
+            flag_len: int = bit_stream.index(0, pos, end) - pos
+        except ValueError:
+            return None
+        if flag_len < 5:
+            raise ValueError("invalid digest in compressed stream")
+        tail_len: int = flag_len - 1
+        code_len: int = flag_len + 1 + tail_len
+        if pos + code_len > end:
+            return None
+        tail: int = int(bit_stream[pos + flag_len + 1:pos + code_len].to01(), 2)
+        return (2**tail_len + 2 + tail, code_len)
+
+
+@lru_cache(maxsize=None)
+def digest_codebook(max_len: int = 1024) -> DigestCodebook:
+    return DigestCodebook(max_len)
+
+
+"""
+data adaptive digests: a canonical prefix code over token lengths, built from the run length
+histogram the scan already gathers. lengths up to ADAPTIVE_MAX_SYMBOL that occur get their own
+code, symbol 0 is an escape followed by the fixed digest for anything else, so every length
+stays encodable. codes are limited to DECODE_WINDOW bits, so the decoder's lookup table
+resolves every symbol and only escaped long digests take the slow path.
+
+header description, right after byte 1 (whose bit 1 flags it): the largest symbol K in 8
+bits, then a 5 bit code length for each symbol 0..K (0 for symbols without a code)
+"""
+def huffman_code_lengths(counts: Dict[int, int], limit: int = DECODE_WINDOW) -> Dict[int, int]:
+    if len(counts) == 1:
+        return {symbol: 1 for symbol in counts}
+    lengths: Dict[int, int] = {symbol: 0 for symbol in counts}
+    heap: List[Tuple[int, int, List[int]]] = [(count, symbol, [symbol]) for symbol, count in counts.items()]
+    heapq.heapify(heap)
+    while len(heap) > 1:
+        weight_a, order, symbols_a = heapq.heappop(heap)
+        weight_b, _, symbols_b = heapq.heappop(heap)
+        for symbol in symbols_a + symbols_b:
+            lengths[symbol] += 1
+        heapq.heappush(heap, (weight_a + weight_b, order, symbols_a + symbols_b))
+
+    #length limit: clamp, then lengthen the deepest short codes (least frequent first) until the kraft sum fits
+    lengths = {symbol: min(length, limit) for symbol, length in lengths.items()}
+    kraft: int = sum(1 << (limit - length) for length in lengths.values())
+    while kraft > 1 << limit:
+        symbol = max((s for s in lengths if lengths[s] < limit), key = lambda s: (lengths[s], -counts[s]))
+        kraft -= 1 << (limit - lengths[symbol] - 1)
+        lengths[symbol] += 1
+    return lengths
+
+def canonical_codes(lengths: Dict[int, int]) -> Dict[int, frozenbitarray]:
+    if any(not 0 < length <= DECODE_WINDOW for length in lengths.values()):
+        raise ValueError("adaptive code length out of range")
+    if sum(1 << (DECODE_WINDOW - length) for length in lengths.values()) > 1 << DECODE_WINDOW:
+        raise ValueError("adaptive code lengths do not form a prefix code")
+    codes: Dict[int, frozenbitarray] = {}
+    code: int = 0
+    prev_len: int = 0
+    for symbol, length in sorted(lengths.items(), key = lambda item: (item[1], item[0])):
+        code <<= length - prev_len
+        codes[symbol] = frozenbitarray(format(code, f"0{length}b"))
+        code += 1
+        prev_len = length
+    return codes
+
+
+class AdaptiveCodebook(DigestCodebook):
+
+    def __init__(self, lengths: Dict[int, int], max_len: int = 1024):
+        if 0 not in lengths:
+            raise ValueError("adaptive code has no escape symbol")
+        if max(lengths) > ADAPTIVE_MAX_SYMBOL:
+            raise ValueError("adaptive code symbol out of range")
+        self.lengths: Dict[int, int] = dict(lengths)
+        self.symbol_codes: Dict[int, frozenbitarray] = canonical_codes(self.lengths)
+        self.escape: frozenbitarray = self.symbol_codes[0]
+        self.base: DigestCodebook = digest_codebook()
+        DigestCodebook.__init__(self, max_len, {symbol: code.to01() for symbol, code in self.symbol_codes.items() if symbol})
+
+    def __repr__(self):
+        return f"<AdaptiveCodebook symbols={len(self.lengths) - 1} escape={self.escape.to01()}>"
+
+    #histogram of token lengths -> code; the escape always gets a code, even if nothing needs it yet
+    @classmethod
+    def from_counts(cls, counts: Dict[int, int]) -> "AdaptiveCodebook":
+        weights: Dict[int, int] = {0: 0}
+        for token_len, count in counts.items():
+            if token_len <= ADAPTIVE_MAX_SYMBOL:
+                weights[token_len] = count
+            else:
+                weights[0] += count
+        weights[0] = max(weights[0], 1)
+        return cls(huffman_code_lengths(weights))
+
+    @classmethod
+    def from_description(cls, description: bitarray) -> "AdaptiveCodebook":
+        max_symbol: int = int(description[:8].to01(), 2)
+        lengths: Dict[int, int] = {}
+        for symbol in range(max_symbol + 1):
+            length: int = int(description[8 + 5 * symbol:13 + 5 * symbol].to01(), 2)
+            if length:
+                lengths[symbol] = length
+        return cls(lengths)
+
+    #description size in bits for a given largest symbol
+    @staticmethod
+    def description_length(max_symbol: int) -> int:
+        return 8 + 5 * (max_symbol + 1)
+
+    def describe(self) -> bitarray:
+        max_symbol: int = max(self.lengths)
+        description: bitarray = bitarray(format(max_symbol, "08b"))
+        for symbol in range(max_symbol + 1):
+            description.extend(format(self.lengths.get(symbol, 0), "05b"))
+        return description
+
+    def _build(self, token_len: int) -> frozenbitarray:
+        if token_len in self.digest_map:
+            return frozenbitarray(self.digest_map[token_len])
+        return frozenbitarray(self.escape + self.base.encode(token_len))
+
+    #escaped digests too long for the lookup window: match the escape, then decode the fixed digest behind it
+    def decode_long(self, bit_stream: bitarray, pos: int, end: int) -> Optional[Tuple[int, int]]:
+        escape_len: int = len(self.escape)
+        if pos + escape_len > end:
+            return None
+        if bit_stream[pos:pos + escape_len] != self.escape:
+            raise ValueError("invalid digest in compressed stream")
+        inner: int = pos + escape_len
+        window: bitarray = bit_stream[inner:min(inner + DECODE_WINDOW, end)]
+        index: int = int(window.to01() or "0", 2) << (DECODE_WINDOW - len(window))
+        table_len, table_sym = self.base.decode_table()
+        code_len: int = int(table_len[index])
+        if code_len:
+            if inner + code_len > end:
+                return None
+            return (int(table_sym[index]), escape_len + code_len)
+        decoded = self.base.decode_long(bit_stream, inner, end)
+        if decoded is None:
+            return None
+        return (decoded[0], escape_len + decoded[1])
+
+
+"""
+symbol mode codebook. a token is one run of a k bit symbol, coded as a canonical prefix code
+for the symbol followed by the fixed digest of the run length. the pair of codes is itself a
+prefix code, so tokens are keyed as run length << symbol_bits | symbol and go through the same
+batched encode and DECODE_WINDOW lookup table as plain digests; pairs too long for the window
+are decoded in two steps. symbols missing from the code (a sampled scan) are escaped and
+written raw.
+
+header description, right after byte 1: the number of coded symbols m in 9 bits, m pairs of
+symbol (k bits) and code length (5 bits) in symbol order, then the escape code length (5 bits)
+"""
+class SymbolCodebook:
+
+    def __init__(self, symbol_bits: int, lengths: Dict[int, int], max_run: int = 16):
+        if symbol_bits not in SYMBOL_MODE_BITS or symbol_bits == 1:
+            raise ValueError(f"Unsupported symbol width: {symbol_bits}")
+        self.symbol_bits: int = symbol_bits
+        self.escape_symbol: int = 1 << symbol_bits
+        if self.escape_symbol not in lengths:
+            raise ValueError("symbol code has no escape symbol")
+        self.lengths: Dict[int, int] = dict(lengths)
+        self.symbol_codes: Dict[int, frozenbitarray] = canonical_codes(self.lengths)
+        self.escape: frozenbitarray = self.symbol_codes[self.escape_symbol]
+        self.base: DigestCodebook = digest_codebook()
+
+        #pair codes for every coded symbol and short run, longer runs are added on first use
+        self.code_map: Dict[int, frozenbitarray] = {}
+        for symbol in self.symbol_codes:
+            if symbol != self.escape_symbol:
+                for run in range(1, max_run + 1):
+                    self.encode(run << symbol_bits | symbol)
+        self._decode_table: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._symbol_table: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        #bound on a pair code's length past the raw bits of its run: longest symbol code plus the digest bound
+        self.max_excess: int = max(len(self.escape) + symbol_bits, max(self.lengths.values())) + self.base.max_excess
+
+    def __repr__(self):
+        return f"<SymbolCodebook symbol_bits={self.symbol_bits} symbols={len(self.lengths) - 1}>"
+
+    #run symbol histogram -> code, the escape always gets a code
+    @classmethod
+    def from_counts(cls, symbol_bits: int, counts: Dict[int, int]) -> "SymbolCodebook":
+        weights: Dict[int, int] = dict(counts)
+        weights[1 << symbol_bits] = 1
+        return cls(symbol_bits, huffman_code_lengths(weights))
+
+    @classmethod
+    def from_description(cls, symbol_bits: int, description: bitarray) -> "SymbolCodebook":
+        count: int = int(description[:9].to01(), 2)
+        entry_len: int = symbol_bits + 5
+        lengths: Dict[int, int] = {}
+        for index in range(count):
+            entry: bitarray = description[9 + entry_len * index:9 + entry_len * (index + 1)]
+            lengths[int(entry[:symbol_bits].to01(), 2)] = int(entry[symbol_bits:].to01(), 2)
+        lengths[1 << symbol_bits] = int(description[9 + entry_len * count:14 + entry_len * count].to01(), 2)
+        return cls(symbol_bits, lengths)
+
+    #description size in bits from its leading 9 bit symbol count
+    @staticmethod
+    def description_length(symbol_bits: int, count: int) -> int:
+        return 9 + (symbol_bits + 5) * count + 5
+
+    def describe(self) -> bitarray:
+        symbols: List[int] = sorted(symbol for symbol in self.lengths if symbol != self.escape_symbol)
+        description: bitarray = bitarray(format(len(symbols), "09b"))
+        for symbol in symbols:
+            description.extend(format(symbol, f"0{self.symbol_bits}b") + format(self.lengths[symbol], "05b"))
+        description.extend(format(self.lengths[self.escape_symbol], "05b"))
+        return description
+
+    def symbol_code(self, symbol: int) -> bitarray:
+        code = self.symbol_codes.get(symbol)
+        if code is None:
+            return self.escape + bitarray(format(symbol, f"0{self.symbol_bits}b"))
+        return bitarray(code)
+
+    def symbol_length(self, symbol: int) -> int:
+        if symbol in self.symbol_codes:
+            return self.lengths[symbol]
+        return len(self.escape) + self.symbol_bits
+
+    def encode(self, key: int) -> frozenbitarray:
+        code = self.code_map.get(key)
+        if code is None:
+            run: int = key >> self.symbol_bits
+            code = self.code_map[key] = frozenbitarray(self.symbol_code(key & (self.escape_symbol - 1)) + self.base.encode(run))
+        return code
+
+    def code_length(self, key: int) -> int:
+        return len(self.encode(key))
+
+    def batch_code_lengths(self, keys: np.ndarray) -> np.ndarray:
+        unique, inverse = np.unique(keys, return_inverse = True)
+        return np.array([self.code_length(key) for key in unique.tolist()], dtype=np.int64)[inverse]
+
+    def encode_batch(self, keys: np.ndarray, out: Optional[bitarray] = None) -> bitarray:
+        if out is None:
+            out = bitarray()
+        if len(keys) == 0:
+            return out
+        for key in np.unique(keys).tolist():
+            if key not in self.code_map:
+                self.encode(key)
+        out.encode(self.code_map, keys.tolist())
+        return out
+
+    #DECODE_WINDOW lookup tables, one for whole pair codes and one for symbol codes alone
+    def decode_table(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._decode_table is None:
+            self._decode_table = self.window_table(self.code_map)
+        return self._decode_table
+
+    def window_table(self, code_map: Dict[int, frozenbitarray]) -> Tuple[np.ndarray, np.ndarray]:
+        table_len: np.ndarray = np.zeros(1 << DECODE_WINDOW, dtype=np.int64)
+        table_sym: np.ndarray = np.zeros(1 << DECODE_WINDOW, dtype=np.int64)
+        for key, code in code_map.items():
+            if len(code) > DECODE_WINDOW:
+                continue
+            shift: int = DECODE_WINDOW - len(code)
+            first: int = int(code.to01(), 2) << shift
+            table_len[first:first + (1 << shift)] = len(code)
+            table_sym[first:first + (1 << shift)] = key
+        return table_len, table_sym
+
+    #pairs longer than the lookup window: decode the symbol (raw after an escape), then the run digest
+    def decode_long(self, bit_stream: bitarray, pos: int, end: int) -> Optional[Tuple[int, int]]:
+        if self._symbol_table is None:
+            self._symbol_table = self.window_table(self.symbol_codes)
+        window: bitarray = bit_stream[pos:min(pos + DECODE_WINDOW, end)]
+        index: int = int(window.to01() or "0", 2) << (DECODE_WINDOW - len(window))
+        symbol_len: int = int(self._symbol_table[0][index])
+        if not symbol_len:
+            raise ValueError("invalid symbol code in compressed stream")
+        if pos + symbol_len > end:
+            return None
+        symbol: int = int(self._symbol_table[1][index])
+        if symbol == self.escape_symbol:
+            if pos + symbol_len + self.symbol_bits > end:
+                return None
+            symbol = int(bit_stream[pos + symbol_len:pos + symbol_len + self.symbol_bits].to01(), 2)
+            symbol_len += self.symbol_bits
+
+        inner: int = pos + symbol_len
+        window = bit_stream[inner:min(inner + DECODE_WINDOW, end)]
+        index = int(window.to01() or "0", 2) << (DECODE_WINDOW - len(window))
+        table_len, table_sym = self.base.decode_table()
+        run_len: int = int(table_len[index])
+        if run_len:
+            if inner + run_len > end:
+                return None
+            return (int(table_sym[index]) << self.symbol_bits | symbol, symbol_len + run_len)
+        decoded = self.base.decode_long(bit_stream, inner, end)
+        if decoded is None:
+            return None
+        return (decoded[0] << self.symbol_bits | symbol, symbol_len + decoded[1])
 
 
 class BPRESS_DATA(BPRESS):
-    def __init__ (self, file_path):
+    def __init__ (self, file_path, use_mmap: Optional[bool] = None, scan_cache_dir: Optional[str] = None, scan_hash: bool = False):
         self.file_path = file_path
         self.buffer = 4 * 1024
+        self.file_in = None
+        self.mapping = None
+        self.use_mmap = use_mmap
         self.basename = os.path.basename(self.file_path)
         self.imp_size = os.path.getsize(self.file_path)
         self.bytes_read_pass_one = 0
+        self.reads = 0
+        self.token_profiles = None
+        self.adaptive_codebook = None
+        self.symbol_bits = 1
+        self.symbol_profile = None
+        self.symbol_codebook = None
+        self.scan_cache_dir = scan_cache_dir
+        self.scan_hash = scan_hash
+        self.scan_digest = None
+        self.scan_resumed = 0
 
         self.scanned_data = {
         "bit_freqs" : {0: 0, 1: 0},
@@ -286,274 +1130,1579 @@ class BPRESS_DATA(BPRESS):
         return return_string
     
     def __enter__ (self):
-        self.file_in = os.open(self.file_path, os.O_RDONLY)
-        self.scan_stream()
+        self.open_input(self.file_path)
+        self.scan_stream(self.file_path)
         return self
 
     def __exit__ (self, exc_type, exc_val, exc_tb):
-        os.close(self.file_in) #type: ignore
+        self.close_input()
+
+
 
+"""
+bit level staging shared by the encoder and the decoder. one bitarray lives as long as the
+stream: bits are appended at its end and whole bytes leave from its front through a memoryview
+window over it, so the open tail (the unaligned compressed bits, a held back raw bit) is carried
+in place instead of being sliced into a new bitarray and concatenated onto the next buffer.
+the window handed to write is only valid during the call, write has to copy what it keeps
+"""
+class BitAccumulator:
+
+    def __init__(self):
+        self.bits: bitarray = bitarray()
+
+    def __len__(self) -> int:
+        return len(self.bits)
+
+    def frombytes(self, data: Union[bytes, bytearray, memoryview]):
+        self.bits.frombytes(data)
+
+    #drop bits from the front, the reading side's counterpart of drain
+    def consume(self, n_bits: int):
+        del self.bits[:n_bits]
+
+    #hand every whole byte (keeping the last hold bits back) to write, returns the bytes written
+    def drain(self, write: Callable[[memoryview], Any], hold: int = 0) -> int:
+        aligned_bytes: int = max(len(self.bits) - hold, 0) // 8
+        if aligned_bytes:
+            with memoryview(self.bits) as view, view[:aligned_bytes] as window:
+                write(window)
+            del self.bits[:aligned_bytes * 8]
+        return aligned_bytes
+
+    #the same whole bytes as a copy, for callers that keep them
+    def take(self, hold: int = 0) -> bytes:
+        taken: List[bytes] = []
+        self.drain(lambda window: taken.append(window.tobytes()), hold)
+        return taken[0] if taken else b""
+
+    #pad the tail with pad_bit up to a byte boundary, returns the padding added
+    def align(self, pad_bit: int) -> bitarray:
+        padding_bits: bitarray = bitarray(-len(self.bits) % 8)
+        padding_bits.setall(pad_bit)
+        self.bits.extend(padding_bits)
+        return padding_bits
+
+
+"""
+output pipeline shared by the compressor and decompressor. bytes collect in one reusable
+bytearray and go out in flush_size aligned blocks, so the target sees a few large writes
+instead of one per buffer. the target is either an open descriptor or any binary stream.
+
+patch rewrites bytes that were already emitted (the header flag byte): still buffered bytes
+are patched in memory, flushed ones through os.pwrite on the open descriptor or a seek on
+the stream. non-seekable streams are held in memory until close so the header can be patched
+"""
+class BufferedOutput:
+
+    def __init__(self, target: Union[int, BinaryIO], flush_size: int = 1024 * 1024):
+        self.target = target
+        self.flush_size = flush_size
+        self.buffer: bytearray = bytearray()
+        self.bytes_flushed: int = 0
+        self.bytes_written: int = 0
+        self.writes: int = 0
+        self.hold = not isinstance(target, int) and not target.seekable()
+        self.stream_start: int = 0 if isinstance(target, int) or self.hold else target.tell()
+
+    def write(self, data: Union[bytes, bytearray, memoryview, bitarray]):
+        with memoryview(data) as view:
+            self.buffer += view
+            self.bytes_written += view.nbytes
+        if len(self.buffer) >= self.flush_size and not self.hold:
+            aligned_len: int = len(self.buffer) - len(self.buffer) % self.flush_size
+            with memoryview(self.buffer) as view:
+                self.emit(view[:aligned_len])
+            del self.buffer[:aligned_len]
+
+    def patch(self, offset: int, data: bytes):
+        if offset >= self.bytes_flushed:
+            start: int = offset - self.bytes_flushed
+            self.buffer[start:start + len(data)] = data
+        elif isinstance(self.target, int):
+            os.pwrite(self.target, data, offset)
+            self.writes += 1
+        else:
+            position: int = self.target.tell()
+            self.target.seek(self.stream_start + offset)
+            self.target.write(data)
+            self.target.seek(position)
+
+    def flush(self):
+        if self.buffer:
+            with memoryview(self.buffer) as view:
+                self.emit(view)
+            self.buffer.clear()
+        if not isinstance(self.target, int):
+            self.target.flush()
+
+    def emit(self, data: memoryview):
+        with data:
+            if isinstance(self.target, int):
+                written: int = 0
+                while written < len(data):
+                    written += os.write(self.target, data[written:])
+                    self.writes += 1
+            else:
+                self.target.write(data)
+                self.writes += 1
+            self.bytes_flushed += len(data)
+
+
+class MetricsReport(TypedDict):
+    phase_ns: Dict[str, int]
+    buffers: int
+    buffer_ns_total: int
+    buffer_ns_max: int
+    buffer_ns: List[int]
+    buffer_tokens: List[int]
+    buffer_bytes: List[int]
+    buffer_out: List[int]
+    tokens: int
+    max_token_len: int
+    token_bit_lengths: Dict[int, int]
+    token_tail: Dict[str, int]
+    reads: int
+    writes: int
+    bytes_read: int
+    bytes_written: int
+    mapped: bool
+
+"""
+instrumentation for BPRESS_COMPRESS, passed as metrics=. the compressor only touches it behind
+"is not None" checks, once per phase and once per buffer, so leaving it off costs nothing.
+
+phase times are perf_counter_ns deltas keyed by phase name (open, scan, select, compress,
+finish, write, check). every buffer records its time, raw and compressed bytes and token count
+(keep_buffers=False keeps only totals for very long inputs). token lengths are binned by bit
+length, which is enough to read off how long the distribution's tail is. read and write counts
+are syscalls (os.read, os.write, os.pwrite; a mapped input does no reads). callback, if given,
+is called with (phase, ns) as each phase ends; subclasses can override any recorder
+"""
+class CompressionMetrics:
+
+    def __init__(self, keep_buffers: bool = True, callback: Optional[Callable[[str, int], None]] = None):
+        self.keep_buffers = keep_buffers
+        self.callback = callback
+        self.phase_ns: Dict[str, int] = {}
+        self.buffers: int = 0
+        self.buffer_ns_total: int = 0
+        self.buffer_ns_max: int = 0
+        self.buffer_ns: List[int] = []
+        self.buffer_tokens: List[int] = []
+        self.buffer_bytes: List[int] = []
+        self.buffer_out: List[int] = []
+        self.tokens: int = 0
+        self.max_token_len: int = 0
+        self.token_bits: np.ndarray = np.zeros(65, dtype=np.int64)
+        self.reads: int = 0
+        self.writes: int = 0
+        self.bytes_read: int = 0
+        self.bytes_written: int = 0
+        self.mapped: bool = False
+
+    def __repr__(self):
+        phases: str = ", ".join(f"{name} {ns / 1e6:.3f} ms" for name, ns in self.phase_ns.items())
+        return f"<CompressionMetrics buffers={self.buffers} tokens={self.tokens} max_token_len={self.max_token_len} phases: {phases}>"
+
+    #close the phase started at start_ns, returns now so the next phase can start from it
+    def phase(self, name: str, start_ns: int) -> int:
+        now: int = perf_counter_ns()
+        self.phase_ns[name] = self.phase_ns.get(name, 0) + now - start_ns
+        if self.callback is not None:
+            self.callback(name, now - start_ns)
+        return now
+
+    def buffer(self, raw_bytes: int, out_bytes: int, tokens: int, ns: int):
+        self.buffers += 1
+        self.buffer_ns_total += ns
+        self.buffer_ns_max = max(self.buffer_ns_max, ns)
+        if self.keep_buffers:
+            self.buffer_ns.append(ns)
+            self.buffer_tokens.append(tokens)
+            self.buffer_bytes.append(raw_bytes)
+            self.buffer_out.append(out_bytes)
+
+    #bit length histogram of the encoded token lengths (run lengths in symbol mode)
+    def token_lengths(self, tokens: np.ndarray):
+        if not len(tokens):
+            return
+        self.tokens += len(tokens)
+        self.max_token_len = max(self.max_token_len, int(tokens.max()))
+        self.token_bits += np.bincount(np.frexp(tokens.astype(np.float64))[1], minlength = 65)[:65]
+
+    def io(self, reads: int, writes: int, bytes_read: int, bytes_written: int, mapped: bool):
+        self.reads, self.writes, self.mapped = reads, writes, mapped
+        self.bytes_read, self.bytes_written = bytes_read, bytes_written
+
+    #upper bound (2**k - 1) on the token length below which quantile of the tokens fall
+    def token_quantile(self, quantile: float) -> int:
+        if not self.tokens:
+            return 0
+        bits: int = int(np.searchsorted(np.cumsum(self.token_bits), quantile * self.tokens))
+        return min(2 ** bits - 1, self.max_token_len)
+
+    def report(self) -> MetricsReport:
+        return {
+            "phase_ns": dict(self.phase_ns),
+            "buffers": self.buffers,
+            "buffer_ns_total": self.buffer_ns_total,
+            "buffer_ns_max": self.buffer_ns_max,
+            "buffer_ns": list(self.buffer_ns),
+            "buffer_tokens": list(self.buffer_tokens),
+            "buffer_bytes": list(self.buffer_bytes),
+            "buffer_out": list(self.buffer_out),
+            "tokens": self.tokens,
+            "max_token_len": self.max_token_len,
+            "token_bit_lengths": {bits: int(count) for bits, count in enumerate(self.token_bits.tolist()) if count},
+            "token_tail": {"p50": self.token_quantile(0.5), "p99": self.token_quantile(0.99), "p999": self.token_quantile(0.999), "max": self.max_token_len},
+            "reads": self.reads,
+            "writes": self.writes,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "mapped": self.mapped,
+        }
 
 
-class BPRESS_COMPRESS(BPRESS):
+"""
+buffer level encoding state shared by every compression front end. raw buffers go in through
+compress_buffer, byte aligned compressed bits come out, and finish_stream closes the stream
+(bit stuffing + padding). the caller picks the delimiter and owns all I/O; once the stream is
+finished, padding_flag gives the value for byte 1 of the header
+"""
+class BPRESS_ENCODER(BPRESS):
+
+    def __init__(self, delimiter_bit: Optional[int] = None):
+        self.delimiter_bit = delimiter_bit
+        self.protocol_complete = False
+        self.protocol_header = None
+        self.bit_stuffing = False
+        self.padding = None
+        self.end_bits = None
+        self.raw_carryover = 0
+        self.comp_carryover = BitAccumulator()
+        self.bytes_compressed = 0
+        self.tokens_compressed = 0
+        self.token_profiles = None
+        self.adaptive_codebook = None
+        self.symbol_bits = 1
+        self.symbol_profile = None
+        self.symbol_codebook = None
+        self.carry_symbol = -1
+        self.stored_threshold = None
+        self.stored_offset = None
+        self.bytes_emitted = 0
+        self.header_bits = 16
+        self.reads = 0
+        self.metrics = None
+        self.checkpoint_interval = None
+        self.checkpoints: List[Tuple[int, int]] = []
+        self.checkpoint_due = 0
+        self.magic_byte = MAGIC_BYTE
+
+    """
+    compresses one raw buffer and hands the byte aligned part of the compressed stream to write,
+    returning how many bytes that was. the buffer is viewed in place as a bitarray, never copied.
+    bits after the last delimiter are all anti-delimiter bits, so raw_carryover only has to hold
+    their count and the first token of the next buffer absorbs it. the unaligned compressed tail
+    stays in comp_carryover until the next buffer (or finish_stream) appends to it
+    """
+    def compress_buffer(self, buffer: Union[bytes, memoryview], write: Callable[[Union[bytes, memoryview]], Any]) -> int:
+        emitted: int = self.bytes_emitted
+        with memoryview(buffer) as view:
+            for start in range(0, len(view), SLICE_SIZE):
+                self.compress_slice(view[start:start + SLICE_SIZE], write)
+        return self.bytes_emitted - emitted
+
+    def compress_slice(self, buffer: memoryview, write: Callable[[Union[bytes, memoryview]], Any]):
+        self.bytes_compressed += len(buffer)
+
+        #stored stream: the rest of the input is copied through as is
+        if self.stored_offset is not None:
+            self.bytes_emitted += len(buffer)
+            write(buffer)
+            return
+
+        cut: Optional[int] = self.encode_stream(bitarray(buffer = buffer), self.comp_carryover.bits, check_stored = True)
+
+        #the encoded section closed at byte cut of this buffer, the rest of it opens the raw section
+        if cut is not None:
+            self.store_stream(write)
+            self.bytes_emitted += len(buffer) - cut
+            write(buffer[cut:])
+            return
+
+        #whole bytes go out, the unaligned tail is carried in place
+        self.bytes_emitted += self.comp_carryover.drain(write)
+        if self.checkpoint_interval is not None:
+            self.mark_checkpoint()
+
+    """
+    random access checkpoint at the end of a slice, which is a digest boundary, once
+    checkpoint_interval input bytes have been read since the last one. it pairs the compressed
+    bit offset (bytes written plus the unaligned tail) with the raw bit offset where the next
+    token starts (bytes read minus the open token in raw_carryover). the preamble and a stored
+    section are never checkpointed
+    """
+    def mark_checkpoint(self):
+        if not self.protocol_complete or self.stored_offset is not None or self.bytes_compressed < self.checkpoint_due:
+            return
+        self.checkpoints.append((self.bytes_emitted * 8 + len(self.comp_carryover), self.bytes_compressed * 8 - self.raw_carryover * self.symbol_bits))
+        self.checkpoint_due = self.bytes_compressed + self.checkpoint_interval #type: ignore
+
+    """
+    end of file logic:
+
+    raw bits carried past the last delimiter are closed with a stuffed delimiter, so the
+    decoder knows to drop one trailing bit. the remaining compressed bits are padded with
+    anti-delimiter bits up to a byte boundary and handed to write, returning the bytes written
+    """
+    def finish_stream(self, write: Callable[[Union[bytes, memoryview]], Any]) -> int:
+        #a stored stream was closed when it switched, only the raw section offset is left to write
+        if self.stored_offset is not None:
+            trailer: bytes = struct.pack(STORED_TRAILER_FORMAT, self.stored_offset)
+            write(trailer)
+            return len(trailer)
+
+        compressed_stream: bitarray = self.comp_carryover.bits
+
+        #symbol mode: the open run is closed as is and zero bits pad the stream
+        if self.symbol_bits > 1:
+            if self.raw_carryover:
+                self.codebook.encode_batch(np.array([self.raw_carryover << self.symbol_bits | self.carry_symbol]), compressed_stream)
+                self.tokens_compressed += 1
+                self.raw_carryover = 0
+            if len(compressed_stream) % 8:
+                self.padding = self.comp_carryover.align(0).to01()
+            return self.comp_carryover.drain(write)
+
+        if self.raw_carryover:
+            if self.bit_stuffing:
+                raise ValueError("Delimiter stuffing occured before end of compression")
+            self.bit_stuffing = True
+            self.encode_stream(bitarray([self.delimiter_bit]), compressed_stream)
+
+        # byte align compressed carryover before writing
+        if len(compressed_stream) % 8:
+            self.padding = self.comp_carryover.align(self.delimiter_bit ^ 1).to01() #type: ignore
+
+        return self.comp_carryover.drain(write)
+
+    #magic byte, flag byte placeholder (adaptive and symbol mode bits are known up front) and the stream's code description
+    def stream_header(self) -> bitarray:
+        protocol_header: bitarray = bitarray()
+        protocol_header.frombytes(bytes([self.magic_byte, 0]))
+        protocol_header[8:16] = self.padding_flag()
+        protocol_header.extend(self.codebook.describe())
+        self.header_bits = len(protocol_header)
+        return protocol_header
+
+    """
+    tokenize a raw stream and append its digests, emitting the protocol header ahead of the first token.
+    with check_stored (a buffer from compress_buffer) the running size check may cut the buffer short,
+    the byte offset into the buffer where the raw section starts is returned then
+    """
+    def encode_stream(self, stream: bitarray, compressed_stream: bitarray, check_stored: bool = False) -> Optional[int]:
+        if self.symbol_bits > 1:
+            return self.encode_symbols(stream, compressed_stream, check_stored)
+
+        #locate every token in one pass, end bits after the last delimiter are carried over as a count
+        carried: int = self.raw_carryover
+        tokens: np.ndarray = self.tokenize(stream, self.delimiter_bit)
+        if not len(tokens):
+            self.raw_carryover = carried + len(stream)
+            return None
+        tokens[0] += carried
+        self.raw_carryover = carried + len(stream) - int(tokens.sum())
+        raw_start: int = self.bytes_compressed - len(stream) // 8
+        token_start: int = raw_start * 8 - carried
+
+        #generate preamble and delimiter ahead of the first token
+        if not self.protocol_complete:
+            #magic byte, tail padding placeholder and the adaptive code description (if any):
+            protocol_header: bitarray = self.stream_header()
+            protocol_header.append(self.delimiter_bit)
+
+            #add preamble, the raw first token
+            protocol_header.extend(bitarray([self.delimiter_bit ^ 1]) * (int(tokens[0]) - 1)) #type: ignore
+            protocol_header.append(self.delimiter_bit)
+
+            #queue protocol for writing
+            compressed_stream.extend(protocol_header)
+            self.protocol_header = protocol_header #leaving it as a bitarray for now
+            self.protocol_complete = True
+            token_start += int(tokens[0])
+            tokens = tokens[1:]
+
+        #encode every token length in one batch
+        mark: int = len(compressed_stream)
+        self.codebook.encode_batch(tokens, compressed_stream)
+        if check_stored and self.stored_threshold is not None:
+            cut = self.stored_cut(tokens, tokens, token_start, compressed_stream, mark, raw_start)
+            if cut is not None:
+                cut_byte, kept = cut
+                self.raw_carryover = cut_byte * 8 - token_start - int(tokens[:kept].sum())
+                self.tokens_compressed += kept
+                if self.metrics is not None:
+                    self.metrics.token_lengths(tokens[:kept])
+                return cut_byte - raw_start
+        self.tokens_compressed += len(tokens)
+        if self.metrics is not None:
+            self.metrics.token_lengths(tokens)
+        return None
+
+    """
+    symbol mode counterpart of the token path: runs of symbol_bits wide symbols are keyed for the
+    symbol codebook, the run still open at the end of the buffer waits in raw_carryover (length)
+    and carry_symbol. there is no delimiter and no preamble, the header is followed by tokens
+    """
+    def encode_symbols(self, stream: bitarray, compressed_stream: bitarray, check_stored: bool = False) -> Optional[int]:
+        symbols, lengths = self.symbol_runs(self.symbol_values(stream))
+        if not len(symbols):
+            return None
+        raw_start: int = self.bytes_compressed - len(stream) // 8
+        token_start: int = raw_start * 8 - self.raw_carryover * self.symbol_bits
+        if self.raw_carryover:
+            if symbols[0] == self.carry_symbol:
+                lengths[0] += self.raw_carryover
+            else:
+                symbols = np.concatenate(([self.carry_symbol], symbols))
+                lengths = np.concatenate(([self.raw_carryover], lengths))
+        self.carry_symbol, self.raw_carryover = int(symbols[-1]), int(lengths[-1])
+
+        if not self.protocol_complete:
+            self.protocol_header = self.stream_header()
+            compressed_stream.extend(self.protocol_header)
+            self.protocol_complete = True
+
+        keys: np.ndarray = lengths[:-1] << self.symbol_bits | symbols[:-1]
+        mark: int = len(compressed_stream)
+        self.codebook.encode_batch(keys, compressed_stream)
+        if check_stored and self.stored_threshold is not None:
+            cut = self.stored_cut(keys, lengths[:-1] * self.symbol_bits, token_start, compressed_stream, mark, raw_start)
+            if cut is not None:
+                cut_byte, kept = cut
+                self.carry_symbol, self.raw_carryover = int(symbols[kept]), (cut_byte * 8 - token_start) // self.symbol_bits - int(lengths[:kept].sum())
+                self.tokens_compressed += kept
+                if self.metrics is not None:
+                    self.metrics.token_lengths(lengths[:kept])
+                return cut_byte - raw_start
+        self.tokens_compressed += len(keys)
+        if self.metrics is not None:
+            self.metrics.token_lengths(lengths[:-1])
+        return None
+
+    """
+    running size check behind stored_threshold. tokens were just encoded into compressed_stream
+    from mark on, token_bits holds the raw bits each of them covers from token_start on. the first
+    token after which the output, magic, flags and code description aside, has run past the input
+    (rounded up to a byte) by more than the threshold picks the cut byte: tokens closed by then stay encoded, later ones are dropped again.
+    returns (cut byte, tokens kept) or None. the per token pass is skipped when the buffer cannot
+    cross the allowance: its whole output stays under the allowance at its start, or the slack
+    outlasts the codebook's max_excess bits per token
+    """
+    def stored_cut(self, tokens: np.ndarray, token_bits: np.ndarray, token_start: int, compressed_stream: bitarray, mark: int, raw_start: int) -> Optional[Tuple[int, int]]:
+        emitted_bits: int = self.bytes_emitted * 8 - self.header_bits
+        if not len(tokens) or emitted_bits + len(compressed_stream) <= (raw_start + self.stored_threshold) * 8: #type: ignore
+            return None
+        if emitted_bits + mark - token_start + self.codebook.max_excess * len(tokens) <= self.stored_threshold * 8: #type: ignore
+            return None
+
+        #output minus raw bits after every token, it has to pass the threshold before the byte rounding matters
+        base: int = emitted_bits + mark - token_start
+        excess: np.ndarray = base + np.cumsum(self.codebook.batch_code_lengths(tokens) - token_bits)
+        if excess.max() <= self.stored_threshold * 8: #type: ignore
+            return None
+        ends: np.ndarray = token_start + np.cumsum(token_bits)
+        over: np.ndarray = np.flatnonzero(ends + excess > ((ends + 7) // 8 + self.stored_threshold) * 8)
+        if not len(over):
+            return None
+        cut_byte: int = (int(ends[over[0]]) + 7) // 8
+        kept: int = int(np.searchsorted(ends, cut_byte * 8, side = "right"))
+        del compressed_stream[mark:]
+        self.codebook.encode_batch(tokens[:kept], compressed_stream)
+        return cut_byte, kept
+
+    """
+    switch to a stored stream: the encoded section is closed exactly like the end of the input
+    (stuffing and padding) and every later buffer is copied through. called before any input,
+    the stream is stored whole and the encoded section is only the magic and flag bytes
+    """
+    def store_stream(self, write: Callable[[Union[bytes, memoryview]], Any]):
+        if self.protocol_complete or self.raw_carryover:
+            self.bytes_emitted += self.finish_stream(write)
+        else:
+            write(bytes([self.magic_byte, 0]))
+            self.bytes_emitted += 2
+            self.protocol_complete = True
+        self.stored_offset = self.bytes_emitted
+
+    #predicted output size from the scan profiles of the chosen settings, None without profiles
+    def predicted_size(self) -> Optional[int]:
+        if self.symbol_bits > 1:
+            return self.estimate_symbol_size(self.symbol_profile, self.codebook) #type: ignore
+        if self.token_profiles is not None:
+            return self.estimate_size(self.token_profiles[self.delimiter_bit], self.codebook) #type: ignore
+        return None
+
+    #whole input decision: exact statistics already show the encoded stream would run past the threshold
+    def store_whole(self, raw_size: int, estimated_size: Optional[int]) -> bool:
+        return self.stored_threshold is not None and estimated_size is not None and estimated_size > raw_size + self.stored_threshold
+
+    #header byte 1: stuffing flag, adaptive digest flag, 2 bit symbol width code, stored flag, 3 bit padding length
+    def padding_flag(self) -> bitarray:
+        adaptive: bool = self.adaptive_codebook is not None
+        flags: bitarray = bitarray([self.bit_stuffing, adaptive]) + bitarray(format(SYMBOL_MODE_BITS[self.symbol_bits], "02b")) + bitarray([self.stored_offset is not None])
+        if self.padding is not None:
+            return flags + (bitarray(format(len(self.padding), "03b")))
+        return flags + bitarray("000")
+
+    """
+    adaptive digest mode: build a canonical code from the chosen delimiter's token histogram and
+    keep it only if it beats the fixed code once its header description is paid for. must run
+    after the delimiter is picked and before the first buffer is encoded
+    """
+    def select_codebook(self):
+        if self.token_profiles is None:
+            raise ValueError("Adaptive digests require a profiled scan")
+        profile: TokenProfile = self.token_profiles[self.delimiter_bit] #type: ignore
+        adaptive: AdaptiveCodebook = AdaptiveCodebook.from_counts(self.profile_counts(profile)[1])
+        if self.estimate_size(profile, adaptive) < self.estimate_size(profile):
+            self.adaptive_codebook = adaptive
+
+    #symbol mode: the symbol code is built from the run symbols the scan counted
+    def select_symbol_codebook(self):
+        if self.symbol_profile is None:
+            raise ValueError("Symbol mode requires a profiled scan")
+        self.symbol_codebook = SymbolCodebook.from_counts(self.symbol_bits, self.symbol_counts(self.symbol_profile)[0])
+
+
+class BPRESS_COMPRESS(BPRESS_ENCODER):
 
     #bpress compress object instantiated
     def __init__(
             self, imp_path: str, 
-            exp_path: str, 
-            buffer: int = 4 * 1024, 
+            exp_path: Union[str, BinaryIO], 
+            buffer: Union[int, str] = 4 * 1024, 
             delimiter_setting: str = "low",
-            delimiter_fn: Optional[Callable] = None
+            delimiter_fn: Optional[Callable] = None,
+            scan_mode: str = "full",
+            sample_size: int = 256 * 1024,
+            use_mmap: Optional[bool] = None,
+            flush_size: int = 1024 * 1024,
+            digest_mode: str = "fixed",
+            symbol_bits: int = 1,
+            stored_threshold: Optional[int] = STORED_THRESHOLD,
+            metrics: Optional[CompressionMetrics] = None,
+            checkpoint_interval: Optional[int] = None,
+            index_path: Optional[str] = None,
+            scan_cache_dir: Optional[str] = None,
+            scan_hash: bool = False
     ):
+        BPRESS_ENCODER.__init__(self)
+
         # file meta-data
         self.imp_path = imp_path
         self.exp_path = exp_path
         self.imp_basename = os.path.basename(self.imp_path)
-        self.exp_basename = os.path.basename(self.exp_path)
-        self.imp_size = os.path.getsize(self.imp_path)
+        self.exp_basename = os.path.basename(self.exp_path) if isinstance(self.exp_path, str) else str(getattr(self.exp_path, "name", "<stream>"))
+        self.imp_regular = stat.S_ISREG(os.stat(self.imp_path).st_mode)
+        self.imp_size = os.path.getsize(self.imp_path) if self.imp_regular else 0
         self.exp_size = None
-        self.tokens_compressed = 0
+        self.file_in = None
+        self.file_out = None
+        self.output = None
+        self.mapping = None
 
         # compressor settings
-        self.buffer = buffer
+        #scan_mode "full" scans the whole input before compressing (two reads, seekable input only),
+        #"sample" picks the delimiter from the first sample_size bytes and compresses in a single read
+        #buffer "auto" sizes it from the input size and free memory
+        self.buffer = auto_buffer_size(self.imp_size) if buffer == "auto" else buffer
         self.delimiter_setting = delimiter_setting
         self.delimiter_fn = delimiter_fn
+        self.scan_mode = scan_mode
+        self.sample_size = sample_size
+        self.use_mmap = use_mmap
+        self.flush_size = flush_size
+        self.digest_mode = digest_mode
+        self.symbol_bits = symbol_bits
+        self.stored_threshold = stored_threshold
+        self.metrics = metrics
         self.strict_io = False
 
+        #checkpoint_interval writes a random access index for read_range, by default next to the output
+        self.checkpoint_interval = checkpoint_interval
+        self.index_path = index_path
+        if self.checkpoint_interval is not None:
+            if self.checkpoint_interval <= 0:
+                raise ValueError("checkpoint interval must be positive")
+            if self.index_path is None:
+                if not isinstance(self.exp_path, str):
+                    raise ValueError("an output stream needs an explicit index path for its checkpoints")
+                self.index_path = self.exp_path + CHECKPOINT_SUFFIX
+
+        #scan_cache_dir keeps the full scan of the input in a scan index record, an unchanged input is not scanned
+        #again and a grown one only scans its new tail. scan_hash also checks the record against a content hash
+        self.scan_cache_dir = scan_cache_dir
+        self.scan_hash = scan_hash
+        self.scan_digest = None
+        self.scan_resumed = 0
+
         #internal state tracking
         self.scan_complete = False
-        self.protocol_complete = False
         self.compression_complete = False
         self.protocol_update_complete = False
         self.writing_complete = False
         self.check_complete = False
 
-        #file data
+        #file data, stats_mode reports whether scanned_data covers the whole input ("exact") or a prefix ("sampled")
         self.scanned_data = {
             "bit_freqs" : {0: 0, 1: 0},
             "transitions" : 0,
             "flip_flops" : 0
         }
-        self.delimiter_bit = None
-        self.protocol_header = None
-        self.bit_stuffing = False
-        self.padding = None
-        self.end_bits = None
+        self.stats_mode = None
+
+        #"cost" delimiter setting: token histograms for both delimiters are gathered during the scan and
+        #estimated_size holds the predicted output size for the chosen delimiter before compression starts.
+        #digest_mode "adaptive" builds a canonical digest code from the same histograms
+        self.estimated_size = None
+        if self.digest_mode not in ("fixed", "adaptive"):
+            raise ValueError(f"Unknown digest mode: {self.digest_mode}")
+        if self.delimiter_setting == "cost" or self.digest_mode == "adaptive":
+            self.token_profiles = self.new_token_profiles()
+
+        #symbol_bits 4 or 8 tokenizes nibble or byte runs instead of bit runs, the run symbols are counted during the scan
+        if self.symbol_bits not in SYMBOL_MODE_BITS:
+            raise ValueError(f"Unsupported symbol width: {self.symbol_bits}")
+        if self.symbol_bits > 1:
+            if self.digest_mode == "adaptive":
+                raise ValueError("Adaptive digests apply to bit mode only")
+            self.token_profiles = None
+            self.symbol_profile = self.new_symbol_profile()
+
+        #stored_threshold caps the output at the input size plus the threshold and a few header bytes, None always encodes
+        if self.stored_threshold is not None and self.stored_threshold < 0:
+            raise ValueError("stored threshold must not be negative")
 
         if self.delimiter_fn == None:
             self.delimiter_fn = self.config_delimiter
 
 
     def __repr__(self):
-        return_string = f"<BPRESS COMPRESSION OBJECT>\n\n<Internal State Data:>\nScanned Data: {self.scanned_data}\nSelected Delimiter: {self.delimiter_bit}\nProtocol header: {self.protocol_header.to01()}\nBit stuffing: {bool(self.bit_stuffing)}\nPadding tail: {self.padding}\n\n<metadata>\n" #type: ignore
+        return_string = f"<BPRESS COMPRESSION OBJECT>\n\n<Internal State Data:>\nScanned Data: {self.scanned_data}\nScan Statistics: {self.stats_mode}\nSelected Delimiter: {self.delimiter_bit}\nDigest code: {self.codebook}\nEstimated size: {self.estimated_size}\nProtocol header: {self.protocol_header.to01()}\nBit stuffing: {bool(self.bit_stuffing)}\nPadding tail: {self.padding}\nStored from: {self.stored_offset}\n\n<metadata>\n" #type: ignore
         return return_string
 
 
     def __enter__(self):
-        #exit empty file
-        if self.imp_size <= 0:
+        #exit empty file (non-regular inputs such as pipes report no size and are read until exhausted)
+        if self.imp_size <= 0 and self.imp_regular:
             return
+        metrics: Optional[CompressionMetrics] = self.metrics
+        phase_start: int = perf_counter_ns() if metrics is not None else 0
         
         #create descriptors, data endpoint      
-        self.file_in = os.open(self.imp_path, os.O_RDONLY)
-        if os.path.exists(self.exp_path):
+        self.open_input(self.imp_path)
+        if isinstance(self.exp_path, str):
             self.file_out = os.open(self.exp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
-        else:
-            self.file_out = os.open(self.exp_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self.output = BufferedOutput(self.file_out if self.file_out is not None else self.exp_path, self.flush_size) #type: ignore
 
         self.bytes_read_pass_one = 0
         self.bytes_read_pass_two = 0
-        self.bytes_compressed = 0
-        self.raw_carryover = bitarray()
-        self.comp_carryover = bitarray()
-
-        #first read through file
-        self.scan_stream()
-
-        #verify that scanning process has properly terminated
-        if not self.scan_complete:
-            raise RuntimeError("An error occured during scanning")
+        sample: Union[bytes, memoryview] = b""
+        if metrics is not None:
+            phase_start = metrics.phase("open", phase_start)
+
+        if self.scan_mode == "full":
+            #first read through file
+            self.scan_stream(self.imp_path)
+
+            #verify that scanning process has properly terminated
+            if not self.scan_complete:
+                raise RuntimeError("An error occured during scanning")
+            self.stats_mode = "exact"
+
+            #reset position in file descriptor, a mapped input is simply walked again
+            if self.mapping is None:
+                os.lseek(self.file_in, 0, os.SEEK_SET) #type: ignore
+
+        elif self.scan_mode == "sample":
+            #single pass: scan a bounded prefix and keep it queued for compression
+            sample = self.mapping[:self.sample_size] if self.mapping is not None else self.read_buffer(self.sample_size)
+            self.bytes_read_pass_one = len(sample)
+            self.merge_scanned_data(self.scan_bytes(sample))
+            self.profile_buffer(sample)
+            self.scan_complete = len(sample) < self.sample_size
+            self.stats_mode = "exact" if self.scan_complete else "sampled"
 
-        #delimite decision is made
-        self.delimiter_bit = self.delimiter_fn(self.scanned_data, mode = self.delimiter_setting) #type: ignore
-        
-        #reset position in file descriptor
-        os.lseek(self.file_in, 0, os.SEEK_SET)
+        else:
+            raise ValueError(f"Unknown scan mode: {self.scan_mode}")
+        if metrics is not None:
+            phase_start = metrics.phase("scan", phase_start)
 
-        #Outer -> buffer/write loop
-        while True:
-            #generate bitarray stream
-            buffer = os.read(self.file_in, self.buffer)
+        #delimite decision is made (symbol mode needs none, only its symbol code), a sampled estimate only covers the sample
+        if self.symbol_bits > 1:
+            self.select_symbol_codebook()
+        else:
+            self.estimate_sizes()
+            self.delimiter_bit = self.delimiter_fn(self.scanned_data, mode = self.delimiter_setting) #type: ignore
+            if self.digest_mode == "adaptive":
+                self.select_codebook()
+        self.estimated_size = self.predicted_size()
+
+        #an exact estimate past the threshold stores the whole input, otherwise the running check in compress_buffer decides
+        if self.stats_mode == "exact" and self.store_whole(self.bytes_read_pass_one, self.estimated_size):
+            self.store_stream(self.output.write)
+        if metrics is not None:
+            phase_start = metrics.phase("select", phase_start)
+
+        #Outer -> buffer/write loop, the sample (if any) is compressed first
+        for buffer in self.iter_buffers(sample):
             self.bytes_read_pass_two += len(buffer)
-            stream: bitarray = bitarray()
-            stream.frombytes(buffer)
- 
-            #check if we have exhausted the file
-            """
-            note:
-                end of file logic:
-
-                check raw carryover: if there are raw bits carried over and the buffer is empty
-                file must have been size n * buffer. this means we expected more stream but hit the end -> must perform 
-                bit stuffing logic here. check if a bit has been stuffed already as an extra precaution and raise error
-                if it seems like a second stuffing is occuring
-
-                once bit stuffing logic is complete: either compress remainder or move to tail generation
-
-                generate tail as needed and append to comp carryover
-
-                proceed to writing and exiting loop.
-            """
-            if not buffer:
-                
-                # perfect edge
-                if not self.raw_carryover and not self.comp_carryover:
-                    break
-
-                # check for edge case where file length is a multiple of buffer size and handle bit stuffing
-                if self.raw_carryover:
-                    if self.bit_stuffing:
-                        raise ValueError("Delimiter stuffing occured before end of compression")
-                    
-                    if self.raw_carryover[-1] != self.delimiter_bit:
-                        self.raw_carryover.append(self.delimiter_bit)
-                        self.bit_stuffing = True
-                    
-                    while True:
-                        if not self.raw_carryover:
-                            break
-                        token_length, self.raw_carryover = self.pull_token(self.raw_carryover, self.delimiter_bit)
-                        self.comp_carryover.extend(self.compress_token(token_length))
-                        
-                # byte align compressed carryover before writing
-                padding_length = len(self.comp_carryover)%8
-
-                if padding_length > 0:
-                    anti_delimiter = self.delimiter_bit ^ 1
-                    padding_bits = bitarray([anti_delimiter] * (8 - padding_length))
-                    self.comp_carryover.extend(padding_bits)
-                    self.padding = padding_bits.to01()
-
-                os.write(self.file_out, self.comp_carryover.tobytes())
-                self.compression_complete = True
-                break
-   
-
-            #make bit stuffing decision
-            """
-            if we didnt exit on an empty buffer, check buffer size for potential EOF signal.
-            if buffer size is less than planned, we have loaded the final file
-            """
-            if len(buffer) < self.buffer:
-                if stream[-1] != self.delimiter_bit:
-                    stream.append(self.delimiter_bit)
-                    self.bit_stuffing = True
-    
-
-            #initialize both raw and compressed streams
-            if self.raw_carryover:
-                stream = self.raw_carryover + stream
-                self.raw_carryover = bitarray()
-
-            compressed_stream: bitarray = self.comp_carryover if self.comp_carryover else bitarray()
-
-            #generate & write preamble and delimiter on first pass
-            if not self.protocol_complete:
-                if self.delimiter_bit not in stream:
-                    raise ValueError("Delimiter was not found in file")
-                
-                #write magic byte and tail padding placeholder:
-                protocol_header: bitarray = bitarray("0110001000000000")
-                protocol_header.append(self.delimiter_bit)
-
-                #add preamble
-                delim_index = stream.index(self.delimiter_bit)
-                protocol_header.extend(stream[:delim_index + 1])
-                stream = stream[delim_index + 1:]
-                
-                #queue protocol for writing
-                compressed_stream.extend(protocol_header)
-                self.protocol_header = protocol_header #leaving it as a bitarray for now
-                self.protocol_complete = True
-                
-
-            #strip end bits off raw input stream
-            if not self.bit_stuffing:
-                if stream[-1] == self.delimiter_bit:
-                    pass
-                else:
-                    for i in range(len(stream) - 2, -1, -1):
-                        if stream[i] == self.delimiter_bit:
-                            self.raw_carryover = stream[i+1:]
-                            stream = stream[:i+1]
-                            break
-
-            #inner loop: pull token, compress, reassign raw bit stream
-            while True:
-                if not stream:
-                    self.bytes_compressed += len(buffer)
-                    break
-                token_length, stream = self.pull_token(stream, self.delimiter_bit)
-                comp_token: bitarray = self.compress_token(token_length)
-                compressed_stream.extend(comp_token)
-
-            #byte align compressed stream before completing I/O phase
-            self.comp_carryover = compressed_stream[len(compressed_stream) - len(compressed_stream)%8:]
-            compressed_stream = compressed_stream[:len(compressed_stream) - len(compressed_stream)%8]
 
             # write the compressed segment to the file
-            os.write(self.file_out, compressed_stream.tobytes())
-        
+            if metrics is None:
+                self.compress_buffer(buffer, self.output.write)
+                continue
+            buffer_start: int = perf_counter_ns()
+            tokens_before: int = self.tokens_compressed
+            out_bytes: int = self.compress_buffer(buffer, self.output.write)
+            metrics.buffer(len(buffer), out_bytes, self.tokens_compressed - tokens_before, perf_counter_ns() - buffer_start)
+        if metrics is not None:
+            phase_start = metrics.phase("compress", phase_start)
+
+        #input exhausted: stuff, pad and write the tail
+        self.finish_stream(self.output.write)
+        self.compression_complete = True
+        if metrics is not None:
+            phase_start = metrics.phase("finish", phase_start)
+
+        #nothing was read from a non-regular input, leave the output empty
+        if not self.bytes_read_pass_two:
+            self.output.flush()
+            self.exp_size = 0
+            return self
+
         # create padding flag
-        if self.padding is not None:
-            padding_flag = bitarray([self.bit_stuffing, 0, 0, 0, 0]) + (bitarray(format(len(self.padding), "03b")))
-        else:
-            padding_flag = bitarray([self.bit_stuffing, 0, 0, 0, 0, 0, 0, 0])
+        padding_flag: bitarray = self.padding_flag()
 
         #update metadata
         if self.protocol_header is not None:
             self.protocol_header = self.protocol_header[:8] + padding_flag + self.protocol_header[16:]
         self.protocol_update_complete = True
 
-        #write padding flag to file
-        patch_padding = os.open(self.exp_path, os.O_WRONLY)
-        os.lseek(patch_padding, 1, os.SEEK_SET)
-        os.write(patch_padding, padding_flag.tobytes())
-        os.close(patch_padding)
+        #write padding flag into the header through the open output
+        self.output.patch(1, padding_flag.tobytes())
+        self.output.flush()
         self.writing_complete = True
+        if metrics is not None:
+            phase_start = metrics.phase("write", phase_start)
 
         #update export size metadata:
-        self.exp_size = os.path.getsize(self.exp_path)
+        self.exp_size = self.output.bytes_written
 
         # lightweight error checking
-        if self.bytes_read_pass_one != self.bytes_read_pass_two:
+        if self.scan_mode == "full" and self.bytes_read_pass_one != self.bytes_read_pass_two:
             raise RuntimeError("read sizes did not match across reads")
         if self.bytes_read_pass_two != self.bytes_compressed:
             raise RuntimeError("data compressed did not match data read")
         if self.protocol_header is not None:
             if len(self.protocol_header) < 18:
                 raise RuntimeError("protocol header was too short")
-            if self.protocol_header[16] != self.delimiter_bit:
+            if self.symbol_bits == 1 and self.protocol_header[16 + len(self.codebook.describe())] != self.delimiter_bit:
                 raise RuntimeError("protcol header contains wrong delimiter")
             if self.protocol_header[8] != self.bit_stuffing:
                 raise RuntimeError("bit sutffing failed")
         if self.padding and self.padding[-1] == self.delimiter_bit:
             raise RuntimeError("padding does not match protocol expectations")
-        
+        if self.stored_offset is not None:
+            if self.exp_size != self.bytes_emitted + STORED_TRAILER_SIZE:
+                raise RuntimeError("stored stream size does not match the data written")
+        elif self.stats_mode == "exact" and self.estimated_size is not None and self.estimated_size != self.exp_size:
+            raise RuntimeError("output size does not match the cost model estimate")
+        self.check_complete = True
+
+        if self.checkpoint_interval is not None:
+            write_checkpoints(self.index_path, self.checkpoint_interval, self.bytes_compressed, self.exp_size, self.checkpoints) #type: ignore
+
+        if metrics is not None:
+            metrics.phase("check", phase_start)
+            metrics.io(self.reads, self.output.writes, self.bytes_read_pass_one + self.bytes_read_pass_two - len(sample), self.exp_size, self.mapping is not None)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        os.close(self.file_in) #type: ignore
-        os.close(self.file_out) #type: ignore
+        self.close_input()
+        if self.file_out is not None:
+            os.close(self.file_out)
 
 
+"""
+buffer level decoding state shared by every decompression front end. compressed bytes go in
+through feed and whole raw bytes come out; the final call must say the input is exhausted so
+the padding bits and a stuffed delimiter can be dropped.
 
+digests are decoded with a DECODE_WINDOW bit lookup table: the window starting at every bit
+position of the buffer is built in one vectorized step, so walking the stream is a single table
+entry per token. codes longer than the window take the codebook's closed form slow path
+"""
+class BPRESS_DECODER(BPRESS):
 
+    def __init__(self):
+        #internal state tracking
+        self.protocol_complete = False
+        self.preamble_complete = False
+        self.decompression_complete = False
 
+        #stream data
+        self.delimiter_bit = None
+        self.bit_stuffing = False
+        self.padding_length = 0
+        self.preamble_length = 0
+        self.tokens_decompressed = 0
+        self.pending = BitAccumulator()
+        self.raw_stream = BitAccumulator()
+        self.adaptive_codebook = None
+        self.symbol_bits = 1
+        self.symbol_codebook = None
+        self.stored_offset = None
+        self.stored_end = None
+        self.bytes_fed = 0
+        self.streamed = None
+        self.held = b""
+
+    def feed(self, data: bytes, final: bool = False) -> bytes:
+        if len(data) > DECODE_SLICE:
+            with memoryview(data) as view:
+                return b"".join([
+                    self.feed(view[start:start + DECODE_SLICE], final and start + DECODE_SLICE >= len(view)) #type: ignore
+                    for start in range(0, len(view), DECODE_SLICE)
+                ])
+        if self.streamed is None and len(data):
+            self.streamed = data[0] == STREAMED_MAGIC_BYTE
+        if self.stored_offset is not None:
+            return self.feed_stored(data, final)
+        if self.streamed:
+            self.hold_flags(data, final)
+        else:
+            self.pending.frombytes(data)
+        self.decompress_buffer(final)
+        return self.take_raw(final)
 
+    """
+    the last byte of a streamed stream is its flag byte and the padding sits in the byte before it,
+    so the last two bytes seen are held back until the input ends and the input can end with an
+    empty final feed
+    """
+    def hold_flags(self, data: bytes, final: bool):
+        if len(data):
+            held: bytes = self.held + bytes(data[-2:])
+            self.pending.frombytes(held[:-2])
+            with memoryview(data) as view:
+                self.pending.frombytes(view[:-2])
+            self.held = held[-2:]
+        if final:
+            if not self.held:
+                raise ValueError("compressed stream is too short")
+            if self.read_flags(self.held[-1:])[STORED_FLAG_BIT - 8]:
+                raise ValueError("a stored streamed stream can only be decoded with its trailer, see read_stored")
+            self.pending.frombytes(self.held[:-1])
+
+    #stuffing and padding from the flag byte at the end of a streamed stream, returned as the 8 flag bits
+    def read_flags(self, flag_byte: bytes) -> bitarray:
+        flags: bitarray = bitarray()
+        flags.frombytes(bytes(flag_byte))
+        self.bit_stuffing = bool(flags[0])
+        self.padding_length = int(flags[5:8].to01(), 2)
+        return flags
+
+    """
+    a stored stream can only be split once its trailer is known, so front ends that know the
+    stream size pass its first two and last STREAMED_TRAILER_SIZE bytes (fewer for a shorter
+    stream) here before feeding it. a streamed stream takes its flags from its last byte.
+    streams without the stored flag are left to the plain decoding path
+    """
+    def read_stored(self, header: bytes, trailer: bytes, stream_size: int):
+        if len(header) < 2 or header[0] not in (MAGIC_BYTE, STREAMED_MAGIC_BYTE):
+            raise ValueError("input is not a bpress stream")
+        flags: bitarray = bitarray()
+        flags.frombytes(bytes(header[:2]))
+        self.streamed = header[0] == STREAMED_MAGIC_BYTE
+        if self.streamed:
+            if not len(trailer):
+                raise ValueError("compressed stream is too short")
+            flags[8:] = self.read_flags(trailer[-1:])
+            trailer, stream_size = trailer[:-1], stream_size - 1
+        if not flags[STORED_FLAG_BIT]:
+            return
+        (stored_offset,) = struct.unpack(STORED_TRAILER_FORMAT, trailer[-STORED_TRAILER_SIZE:])
+        if not 2 <= stored_offset <= stream_size - STORED_TRAILER_SIZE:
+            raise ValueError("stored stream trailer is damaged")
+        self.stored_offset = stored_offset
+        self.stored_end = stream_size - STORED_TRAILER_SIZE
+
+    #encoded section up to stored_offset goes through the decoder, the raw section after it is copied through
+    def feed_stored(self, data: bytes, final: bool) -> bytes:
+        start: int = self.bytes_fed
+        self.bytes_fed += len(data)
+        view: memoryview = memoryview(data)
+        raw: bytes = b""
+
+        encoded_end: int = min(len(view), max(self.stored_offset - start, 0)) #type: ignore
+        if encoded_end and self.stored_offset > 2: #type: ignore
+            section_final: bool = start + encoded_end == self.stored_offset
+            self.pending.frombytes(view[:encoded_end])
+            self.decompress_buffer(section_final)
+            raw = self.take_raw(section_final)
+        elif start + encoded_end == self.stored_offset:
+            #stored whole: the encoded section is only the magic and flag bytes
+            self.decompression_complete = True
+
+        copy_start: int = max(self.stored_offset - start, 0) #type: ignore
+        copy_end: int = min(self.stored_end - start, len(view)) #type: ignore
+        if copy_end > copy_start:
+            raw += bytes(view[copy_start:copy_end])
+        if final and self.bytes_fed != self.stored_end + STORED_TRAILER_SIZE + self.streamed: #type: ignore
+            raise ValueError("stored stream does not match its trailer")
+        return raw
+
+    """
+    header length in bits, None until enough is buffered to tell: 17 for a bit mode stream (plus
+    the code description of an adaptive one, the delimiter bit included), 16 plus the symbol code
+    description for a symbol mode stream
+    """
+    def protocol_length(self) -> Optional[int]:
+        if len(self.pending) >= 8 and self.pending.bits[:8].tobytes()[0] not in (MAGIC_BYTE, STREAMED_MAGIC_BYTE):
+            raise ValueError("input is not a bpress stream")
+        if len(self.pending) < 16:
+            return None
+        symbol_bits: int = self.read_symbol_bits()
+        if symbol_bits > 1:
+            if len(self.pending) < 25:
+                return None
+            return 16 + SymbolCodebook.description_length(symbol_bits, int(self.pending.bits[16:25].to01(), 2))
+        if not self.pending.bits[ADAPTIVE_FLAG_BIT]:
+            return HEADER_BITS
+        if len(self.pending) < 24:
+            return None
+        return HEADER_BITS + AdaptiveCodebook.description_length(int(self.pending.bits[16:24].to01(), 2))
+
+    def read_symbol_bits(self) -> int:
+        mode: int = int(self.pending.bits[SYMBOL_MODE_OFFSET:SYMBOL_MODE_OFFSET + 2].to01(), 2)
+        for symbol_bits, mode_bits in SYMBOL_MODE_BITS.items():
+            if mode_bits == mode:
+                return symbol_bits
+        raise ValueError(f"unknown symbol mode in header: {mode}")
+
+    #parse the protocol header, loading the stream's own digest or symbol code if it carries one
+    def read_protocol(self):
+        header_len: int = self.protocol_length() #type: ignore
+        #a streamed stream leaves these clear in its header, they come from its flag byte
+        if not self.streamed:
+            self.bit_stuffing = bool(self.pending.bits[8])
+            self.padding_length = int(self.pending.bits[13:16].to01(), 2)
+        self.symbol_bits = self.read_symbol_bits()
+        if self.symbol_bits > 1:
+            #no delimiter and no preamble, tokens start right after the description
+            self.symbol_codebook = SymbolCodebook.from_description(self.symbol_bits, self.pending.bits[16:header_len])
+            self.preamble_complete = True
+            self.pending.consume(header_len)
+            self.protocol_complete = True
+            return
+        header_len -= 1
+        if self.pending.bits[ADAPTIVE_FLAG_BIT]:
+            self.adaptive_codebook = AdaptiveCodebook.from_description(self.pending.bits[16:header_len])
+        self.delimiter_bit = self.pending.bits[header_len]
+        self.pending.consume(header_len + 1)
+        self.protocol_complete = True
+
+    #copy the raw preamble through up to and including the first delimiter
+    def read_preamble(self, end: int) -> int:
+        try:
+            preamble_end: int = self.pending.bits.index(self.delimiter_bit, 0, end) + 1
+        except ValueError:
+            preamble_end = end
+        else:
+            self.preamble_complete = True
+        self.raw_stream.bits.extend(self.pending.bits[:preamble_end])
+        self.preamble_length += preamble_end
+        return preamble_end
+
+    def decompress_buffer(self, final: bool):
+        #everything past the padding is data once the input is exhausted
+        end: int = len(self.pending) - self.padding_length if final else len(self.pending)
+        if not self.protocol_complete:
+            header_len: Optional[int] = self.protocol_length()
+            if header_len is None or len(self.pending) < header_len:
+                if final:
+                    raise ValueError("compressed stream is too short")
+                return
+            self.read_protocol()
+            end = len(self.pending) - self.padding_length if final else len(self.pending)
+
+        start: int = 0
+        if not self.preamble_complete:
+            start = self.read_preamble(end)
+
+        if self.preamble_complete:
+            tokens, start = self.decode_tokens(self.pending.bits, start, end)
+            self.expand_tokens(tokens, self.raw_stream.bits)
+            self.tokens_decompressed += len(tokens)
+
+        self.pending.consume(start)
+        if final:
+            if len(self.pending) != self.padding_length:
+                raise ValueError("compressed stream ends inside a digest")
+            if self.bit_stuffing:
+                del self.raw_stream.bits[-1:]
+            self.decompression_complete = True
+
+    #parse the protocol header at the start of the stream and nothing after it, for decoding from a checkpoint
+    def read_header(self, file_in: int):
+        position: int = 0
+        while not self.protocol_complete:
+            data: bytes = os.pread(file_in, 64, position)
+            if not data:
+                raise ValueError("compressed stream is too short")
+            position += len(data)
+            self.pending.frombytes(data)
+            header_len: Optional[int] = self.protocol_length()
+            if header_len is not None and len(self.pending) >= header_len:
+                self.read_protocol()
+        self.preamble_complete = True
+        self.pending.consume(len(self.pending))
+
+    """
+    random access: raw bytes [start, end) of the encoded section (which ends at byte encoded_end of
+    the stream), decoded from the last checkpoint at or before start or from the stream start when
+    there is none. only the header is read ahead of the checkpoint, raw bits before start are
+    dropped as they are decoded. bits decoded past end (the padding) are never looked at
+    """
+    def decode_range(self, file_in: int, encoded_end: int, checkpoints: List[Tuple[int, int]], start: int, end: int) -> bytes:
+        comp_bit, raw_bit = 0, 0
+        at: int = bisect.bisect_right(checkpoints, start * 8, key = lambda checkpoint: checkpoint[1])
+        if at:
+            comp_bit, raw_bit = checkpoints[at - 1]
+            self.read_header(file_in)
+
+        position: int = comp_bit // 8
+        skip: int = comp_bit % 8
+        while raw_bit + len(self.raw_stream) < end * 8 and position < encoded_end:
+            data: bytes = os.pread(file_in, min(DECODE_SLICE, encoded_end - position), position)
+            if not data:
+                break
+            position += len(data)
+            self.pending.frombytes(data)
+            self.pending.consume(skip)
+            skip = 0
+            self.decompress_buffer(False)
+            dropped: int = min(max(start * 8 - raw_bit, 0), len(self.raw_stream))
+            self.raw_stream.consume(dropped)
+            raw_bit += dropped
+
+        if raw_bit != start * 8 or raw_bit + len(self.raw_stream) < end * 8:
+            raise RuntimeError("compressed stream ended before the range was decoded")
+        return self.raw_stream.bits[:(end - start) * 8].tobytes()
+
+    """
+    decodes every complete digest in bit_stream[start:end], returning the token lengths and the
+    position after the last decoded digest
+    """
+    def decode_tokens(self, bit_stream: bitarray, start: int, end: int) -> Tuple[np.ndarray, int]:
+        n_bits: int = end - start
+        if n_bits <= 0:
+            return np.empty(0, dtype=np.int64), start
+
+        windows: np.ndarray = self.bit_windows(bit_stream, start, end)
+        table_len, table_sym = self.codebook.decode_table()
+        code_lens: List[int] = table_len[windows].tolist()
+
+        positions: List[int] = []
+        long_tokens: Dict[int, int] = {}
+        pos: int = 0
+        while pos < n_bits:
+            code_len: int = code_lens[pos]
+            if code_len == 0:
+                decoded = self.codebook.decode_long(bit_stream, start + pos, end)
+                if decoded is None:
+                    break
+                long_tokens[len(positions)], code_len = decoded
+            if pos + code_len > n_bits:
+                break
+            positions.append(pos)
+            pos += code_len
+
+        tokens: np.ndarray = table_sym[windows[positions]]
+        for index, token_len in long_tokens.items():
+            tokens[index] = token_len
+        return tokens, start + pos
+
+    """
+    DECODE_WINDOW bit value of the window starting at every bit position in [start, end). the
+    covering bytes are read straight out of bit_stream, windows running past end are zero filled
+    """
+    def bit_windows(self, bit_stream: bitarray, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+        end = len(bit_stream) if end is None else end
+        first, last = start // 8, (end + 7) // 8
+        byte_vals: np.ndarray = np.zeros(last - first + 2, dtype=np.uint32)
+        with memoryview(bit_stream) as view:
+            byte_vals[:last - first] = np.frombuffer(view, dtype=np.uint8, count=last - first, offset=first)
+        if end % 8:
+            byte_vals[last - first - 1] &= 0xFF << (8 - end % 8) & 0xFF
+        spans: np.ndarray = (byte_vals[:-2] << 16) | (byte_vals[1:-1] << 8) | byte_vals[2:]
+        shifts: np.ndarray = np.arange(8, 0, -1, dtype=np.uint32)
+        windows: np.ndarray = ((spans[:, None] >> shifts) & 0xFFFF).ravel()
+        return windows[start - first * 8:end - first * 8]
+
+    #rebuild raw bits from token lengths onto the end of out: each token is a run of anti-delimiter bits closed by a delimiter
+    def expand_tokens(self, tokens: np.ndarray, out: Optional[bitarray] = None) -> bitarray:
+        raw: bitarray = bitarray() if out is None else out
+        if not len(tokens):
+            return raw
+        if self.symbol_bits > 1:
+            return self.expand_symbols(tokens, raw)
+        ends: np.ndarray = np.cumsum(tokens)
+        raw_bits: np.ndarray = np.full(int(ends[-1]), self.delimiter_bit ^ 1, dtype=np.uint8) #type: ignore
+        raw_bits[ends - 1] = self.delimiter_bit
+        raw_len: int = len(raw) + int(ends[-1])
+        raw.frombytes(np.packbits(raw_bits))
+        del raw[raw_len:]
+        return raw
+
+    #symbol mode: each key is a run length and a symbol, repeated and unpacked to symbol_bits wide bit groups
+    def expand_symbols(self, keys: np.ndarray, out: Optional[bitarray] = None) -> bitarray:
+        raw: bitarray = bitarray() if out is None else out
+        values: np.ndarray = np.repeat((keys & ((1 << self.symbol_bits) - 1)).astype(np.uint8), keys >> self.symbol_bits)
+        bits: np.ndarray = np.unpackbits(values[:, None], axis=1)[:, 8 - self.symbol_bits:].ravel()
+        raw_len: int = len(raw) + len(bits)
+        raw.frombytes(np.packbits(bits))
+        del raw[raw_len:]
+        return raw
+
+    #whole decoded bytes, holding back the last bit until the end in case it is a stuffed delimiter
+    def take_raw(self, final: bool) -> bytes:
+        if final and len(self.raw_stream) % 8:
+            raise ValueError("decoded stream is not byte aligned")
+        return self.raw_stream.take(hold = 0 if final else 1)
+
+
+"""
+streaming inverse of BPRESS_COMPRESS. the compressed file is fed to the decoder one buffer at a
+time so memory stays bounded by the buffer size, reading one buffer ahead so the final buffer is
+decoded knowing the input is exhausted
+"""
+class BPRESS_DECOMPRESS(BPRESS_DECODER):
+
+    def __init__(self, imp_path: str, exp_path: Union[str, BinaryIO], buffer: Union[int, str] = 4 * 1024, flush_size: int = 1024 * 1024):
+        BPRESS_DECODER.__init__(self)
+
+        # file meta-data
+        self.imp_path = imp_path
+        self.exp_path = exp_path
+        self.imp_basename = os.path.basename(self.imp_path)
+        self.exp_basename = os.path.basename(self.exp_path) if isinstance(self.exp_path, str) else str(getattr(self.exp_path, "name", "<stream>"))
+        self.imp_size = os.path.getsize(self.imp_path)
+        self.exp_size = None
+        self.file_in = None
+        self.file_out = None
+        self.output = None
+        self.buffer = auto_buffer_size(self.imp_size) if buffer == "auto" else buffer
+        self.flush_size = flush_size
+
+        #throughput data
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.decode_time = 0.0
+        self.decode_mbps = 0.0
 
+    def __repr__(self):
+        return_string = f"<BPRESS DECOMPRESSION OBJECT>\n\n<Internal State Data:>\nSelected Delimiter: {self.delimiter_bit}\nBit stuffing: {bool(self.bit_stuffing)}\nPadding length: {self.padding_length}\nTokens: {self.tokens_decompressed}\nDecode speed: {self.decode_mbps:.2f} MB/s\n"
+        return return_string
 
+    def __enter__(self):
+        #exit empty file
+        if self.imp_size <= 0:
+            return
 
+        self.file_in = os.open(self.imp_path, os.O_RDONLY)
+        self.read_stored(os.pread(self.file_in, 2, 0), os.pread(self.file_in, STREAMED_TRAILER_SIZE, max(self.imp_size - STREAMED_TRAILER_SIZE, 0)), self.imp_size)
+        if isinstance(self.exp_path, str):
+            self.file_out = os.open(self.exp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        self.output = BufferedOutput(self.file_out if self.file_out is not None else self.exp_path, self.flush_size) #type: ignore
+
+        time_start: float = perf_counter()
+        buffer: bytes = os.read(self.file_in, self.buffer)
+        while buffer:
+            self.bytes_read += len(buffer)
+            next_buffer: bytes = os.read(self.file_in, self.buffer)
+            raw: bytes = self.feed(buffer, final = not next_buffer)
+            if raw:
+                self.output.write(raw)
+                self.bytes_written += len(raw)
+            buffer = next_buffer
+        self.output.flush()
+
+        self.decode_time = perf_counter() - time_start
+        if self.decode_time > 0:
+            self.decode_mbps = self.bytes_written / (1024 * 1024) / self.decode_time
+        self.exp_size = self.bytes_written
+
+        if not self.decompression_complete:
+            raise RuntimeError("compressed stream ended before it was fully decoded")
+        return self
 
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.file_in is not None:
+            os.close(self.file_in)
+        if self.file_out is not None:
+            os.close(self.file_out)
+
+
+"""
+incremental in-memory compressor, used like zlib.compressobj: feed chunks through update and
+collect the stream from what update returns plus flush. nothing touches the filesystem and every
+chunk is scanned once, as it arrives.
+
+until the delimiter is decided the raw chunks are held: by default it is picked from the first
+sample_size bytes, sample_size=None scans the whole input first (exact statistics, the stream
+comes out of flush). with delimiter_bit given, or once it is picked, chunks are encoded on
+arrival and update returns the byte aligned part of the stream encoded so far, so only the
+unaligned tail is held. such a stream is streamed: it starts with STREAMED_MAGIC_BYTE and ends in
+the flag byte that a file patches into header byte 1. like any stored stream, one that switched to
+stored can only be decoded knowing its size (read_stored), the other ones can be fed as they come.
+
+streamed=False holds the whole stream until flush and patches header byte 1 in place instead,
+giving the same bytes as BPRESS_COMPRESS
+"""
+class Compressor(BPRESS_ENCODER):
 
+    def __init__(
+            self,
+            delimiter_setting: str = "low",
+            delimiter_bit: Optional[int] = None,
+            sample_size: Optional[int] = 256 * 1024,
+            buffer: int = 64 * 1024,
+            digest_mode: str = "fixed",
+            symbol_bits: int = 1,
+            stored_threshold: Optional[int] = STORED_THRESHOLD,
+            streamed: bool = True
+    ):
+        BPRESS_ENCODER.__init__(self, delimiter_bit)
 
+        # compressor settings
+        self.delimiter_setting = delimiter_setting
+        self.sample_size = sample_size
+        self.buffer = buffer
+        self.digest_mode = digest_mode
+        self.symbol_bits = symbol_bits
+        self.stored_threshold = stored_threshold
+        self.streamed = streamed
+        if self.streamed:
+            self.magic_byte = STREAMED_MAGIC_BYTE
+
+        #internal state tracking
+        self.pending: List[bytes] = []
+        self.pending_size = 0
+        self.last_byte: Optional[int] = None
+        self.compressed = bytearray()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.flushed = False
+
+        #file data, stats_mode as in BPRESS_COMPRESS (None when the delimiter was given)
+        self.scanned_data = {
+            "bit_freqs" : {0: 0, 1: 0},
+            "transitions" : 0,
+            "flip_flops" : 0
+        }
+        self.stats_mode = None
+        if digest_mode not in ("fixed", "adaptive"):
+            raise ValueError(f"Unknown digest mode: {digest_mode}")
+        if digest_mode == "adaptive" and delimiter_bit is not None:
+            raise ValueError("Adaptive digests need the scan histogram, leave delimiter_bit unset")
+        if symbol_bits not in SYMBOL_MODE_BITS:
+            raise ValueError(f"Unsupported symbol width: {symbol_bits}")
+        if stored_threshold is not None and stored_threshold < 0:
+            raise ValueError("stored threshold must not be negative")
+        if symbol_bits > 1:
+            if delimiter_bit is not None or digest_mode == "adaptive":
+                raise ValueError("Symbol mode has no delimiter and uses its own symbol code")
+            self.symbol_profile = self.new_symbol_profile()
+        elif (delimiter_setting == "cost" or digest_mode == "adaptive") and delimiter_bit is None:
+            self.token_profiles = self.new_token_profiles()
+
+    #chunks are encoded on arrival once the delimiter (or the symbol code) is settled
+    @property
+    def ready(self) -> bool:
+        return self.delimiter_bit is not None or self.symbol_codebook is not None
+
+    def __repr__(self):
+        return_string = f"<BPRESS COMPRESSOR OBJECT>\n\nBytes in: {self.bytes_in}\nBytes out: {self.bytes_out}\nPending raw bytes: {self.pending_size}\nScan Statistics: {self.stats_mode}\nSelected Delimiter: {self.delimiter_bit}\nStreamed: {self.streamed}\nFlushed: {self.flushed}\n"
+        return return_string
+
+    def update(self, chunk: Union[bytes, bytearray, memoryview]) -> bytes:
+        if self.flushed:
+            raise ValueError("Compressor was already flushed")
+        view: memoryview = memoryview(chunk).cast("B")
+        if not len(view):
+            return b""
+        self.bytes_in += len(view)
+
+        if self.ready:
+            self.encode_chunk(view)
+            return self.take_output()
+
+        #scan on arrival, the chunk is copied since the caller may reuse its buffer
+        self.merge_scanned_data(self.scan_bytes(view, self.last_byte))
+        self.profile_buffer(view)
+        self.last_byte = view[-1]
+        self.pending.append(bytes(view))
+        self.pending_size += len(view)
+        if self.sample_size is not None and self.pending_size >= self.sample_size:
+            self.stats_mode = "sampled"
+            self.choose_delimiter()
+        return self.take_output()
+
+    def flush(self) -> bytes:
+        if self.flushed:
+            raise ValueError("Compressor was already flushed")
+        self.flushed = True
+        if not self.bytes_in:
+            return b""
+        if not self.ready:
+            self.stats_mode = "exact"
+            self.choose_delimiter()
+
+        #stuff and pad, then the flag byte goes after a streamed stream or is patched into header byte 1
+        self.finish_stream(self.collect)
+        if self.streamed:
+            self.collect(self.padding_flag().tobytes())
+        else:
+            self.compressed[1:2] = self.padding_flag().tobytes()
+        return self.take_output(final = True)
+
+    #the byte aligned stream encoded since the last call, nothing before flush unless streamed
+    def take_output(self, final: bool = False) -> bytes:
+        if not (self.streamed or final) or not self.compressed:
+            return b""
+        compressed: bytes = bytes(self.compressed)
+        self.compressed = bytearray()
+        self.bytes_out += len(compressed)
+        return compressed
+
+    #decide the delimiter (or symbol code) from everything scanned so far and encode the held chunks
+    def choose_delimiter(self):
+        if self.symbol_bits > 1:
+            self.select_symbol_codebook()
+        else:
+            self.estimate_sizes()
+            self.delimiter_bit = self.config_delimiter(self.scanned_data, mode = self.delimiter_setting)
+            if self.digest_mode == "adaptive":
+                self.select_codebook()
+        if self.stats_mode == "exact" and self.store_whole(self.bytes_in, self.predicted_size()):
+            self.store_stream(self.collect)
+        pending: List[bytes] = self.pending
+        self.pending = []
+        self.pending_size = 0
+        for chunk in pending:
+            self.encode_chunk(chunk)
+
+    #chunks are fed to the encoder in buffer sized slices so the tokenizer's working set stays small
+    def encode_chunk(self, chunk: Union[bytes, memoryview]):
+        view: memoryview = memoryview(chunk)
+        for offset in range(0, len(view), self.buffer):
+            self.compress_buffer(view[offset:offset + self.buffer], self.collect)
+
+    #write target of the encoder, held until update or flush hands it out
+    def collect(self, data: Union[bytes, memoryview]):
+        self.compressed += data
+
+
+"""
+one shot in-memory helpers: a block of raw bytes becomes a complete .press stream (header
+byte 1 patched in place) and back. compress scans the block once and encodes it in place,
+without the copy Compressor.update makes. the output matches BPRESS_COMPRESS on the same bytes
+"""
+def compress(
+        data: Union[bytes, bytearray, memoryview],
+        delimiter_setting: str = "low",
+        buffer: int = 64 * 1024,
+        digest_mode: str = "fixed",
+        symbol_bits: int = 1,
+        stored_threshold: Optional[int] = STORED_THRESHOLD
+) -> bytes:
+    compressor: Compressor = Compressor(delimiter_setting, buffer = buffer, digest_mode = digest_mode, symbol_bits = symbol_bits, stored_threshold = stored_threshold, streamed = False)
+    view: memoryview = memoryview(data).cast("B")
+    if len(view):
+        compressor.bytes_in = len(view)
+        compressor.merge_scanned_data(compressor.scan_bytes(view))
+        compressor.profile_buffer(view)
+        compressor.stats_mode = "exact"
+        compressor.choose_delimiter()
+        compressor.encode_chunk(view)
+    return compressor.flush()
+
+def compress_block(data: bytes, delimiter_setting: str = "low", buffer: int = 64 * 1024, symbol_bits: int = 1) -> bytes:
+    return compress(data, delimiter_setting, buffer, symbol_bits = symbol_bits)
+
+"""
+checkpoint index layout (all integers little endian), a sidecar file next to the .press stream:
+
+header:
+    b"BPRX" | version (1 byte) | 3 reserved bytes | checkpoint interval (4 bytes) | raw size (8 bytes) | stream size (8 bytes)
+entries:
+    compressed bit offset (8 bytes) | raw bit offset (8 bytes)
+
+every entry is a digest boundary: decoding the stream from its compressed bit offset with the
+stream's own header yields the input from its raw bit offset on. the stream size ties an index
+to the stream it was written for
+"""
+def write_checkpoints(index_path: str, interval: int, raw_size: int, stream_size: int, checkpoints: List[Tuple[int, int]]):
+    with open(index_path, "wb") as f:
+        f.write(struct.pack(CHECKPOINT_HEADER_FORMAT, CHECKPOINT_MAGIC, CHECKPOINT_VERSION, min(interval, 2**32 - 1), raw_size, stream_size))
+        for comp_bit, raw_bit in checkpoints:
+            f.write(struct.pack(CHECKPOINT_ENTRY_FORMAT, comp_bit, raw_bit))
+
+#returns raw size, stream size and the (compressed bit, raw bit) checkpoints
+def read_checkpoints(index_path: str) -> Tuple[int, int, List[Tuple[int, int]]]:
+    with open(index_path, "rb") as f:
+        index: bytes = f.read()
+    if len(index) < CHECKPOINT_HEADER_SIZE:
+        raise ValueError("checkpoint index is too short")
+    magic, version, _, raw_size, stream_size = struct.unpack_from(CHECKPOINT_HEADER_FORMAT, index)
+    if magic != CHECKPOINT_MAGIC:
+        raise ValueError("input is not a bpress checkpoint index")
+    if version != CHECKPOINT_VERSION:
+        raise ValueError(f"unsupported checkpoint index version: {version}")
+    entries: bytes = index[CHECKPOINT_HEADER_SIZE:]
+    if len(entries) % struct.calcsize(CHECKPOINT_ENTRY_FORMAT):
+        raise ValueError("checkpoint index is damaged")
+    return raw_size, stream_size, list(struct.iter_unpack(CHECKPOINT_ENTRY_FORMAT, entries))
+
+"""
+random access: up to length raw bytes from offset of a .press file, decoded from the nearest
+checkpoint of its index (index_path, by default the path plus CHECKPOINT_SUFFIX) instead of the
+start. bytes in the raw section of a stored stream are read straight from the file. without an
+index the stream is decoded from the start up to the range. reads past the end are cut short
+"""
+def read_range(path: str, offset: int, length: int, index_path: Optional[str] = None) -> bytes:
+    if offset < 0 or length < 0:
+        raise ValueError("offset and length must not be negative")
+    if index_path is None:
+        index_path = path + CHECKPOINT_SUFFIX
+    if not os.path.exists(index_path):
+        return read_range_from_start(path, offset, length)
+
+    raw_size, stream_size, checkpoints = read_checkpoints(index_path)
+    if os.path.getsize(path) != stream_size:
+        raise ValueError("checkpoint index does not match the stream")
+    end: int = min(offset + length, raw_size)
+    if end <= offset:
+        return b""
+
+    file_in: int = os.open(path, os.O_RDONLY)
+    try:
+        decoder: BPRESS_DECODER = BPRESS_DECODER()
+        decoder.read_stored(os.pread(file_in, 2, 0), os.pread(file_in, STREAMED_TRAILER_SIZE, max(stream_size - STREAMED_TRAILER_SIZE, 0)), stream_size)
+        encoded_end: int = stream_size
+        encoded_raw: int = raw_size
+        if decoder.stored_offset is not None:
+            encoded_end = decoder.stored_offset
+            encoded_raw = raw_size - (decoder.stored_end - decoder.stored_offset) #type: ignore
+
+        raw: bytes = b""
+        if offset < encoded_raw:
+            raw = decoder.decode_range(file_in, encoded_end, checkpoints, offset, min(end, encoded_raw))
+        if end > encoded_raw:
+            copy_start: int = max(offset, encoded_raw)
+            raw += os.pread(file_in, end - copy_start, encoded_end + copy_start - encoded_raw)
+        return raw
+    finally:
+        os.close(file_in)
+
+#read_range without an index: the stream is fed from the start and decoding stops once the range is covered
+def read_range_from_start(path: str, offset: int, length: int, buffer: int = 64 * 1024) -> bytes:
+    stream_size: int = os.path.getsize(path)
+    decoder: BPRESS_DECODER = BPRESS_DECODER()
+    raw: List[bytes] = []
+    position: int = 0
+    with open(path, "rb") as f:
+        if stream_size:
+            decoder.read_stored(f.read(2), os.pread(f.fileno(), STREAMED_TRAILER_SIZE, max(stream_size - STREAMED_TRAILER_SIZE, 0)), stream_size)
+            f.seek(0)
+        while position < offset + length:
+            data: bytes = f.read(buffer)
+            if not data:
+                break
+            decoded: bytes = decoder.feed(data, final = f.tell() >= stream_size)
+            raw.append(decoded[max(offset - position, 0):max(offset + length - position, 0)])
+            position += len(decoded)
+    return b"".join(raw)
+
+"""
+scan index records, one json file per input path under scan_cache_dir. json keys are strings, the
+histogram keys are turned back into ints on load. a record that is missing, damaged or of another
+SCAN_INDEX_VERSION loads as None and the input is simply scanned again
+"""
+def scan_record_path(scan_cache_dir: str, path: str) -> str:
+    return os.path.join(scan_cache_dir, hashlib.blake2b(os.path.realpath(path).encode(), digest_size = 16).hexdigest() + ".json")
+
+def load_scan_record(record_path: str) -> Optional[ScanRecord]:
+    try:
+        with open(record_path, "r") as f:
+            record = json.load(f)
+        if record["version"] != SCAN_INDEX_VERSION:
+            return None
+        record["scanned_data"]["bit_freqs"] = int_keys(record["scanned_data"]["bit_freqs"])
+        if record["token_profiles"] is not None:
+            record["token_profiles"] = {
+                int(delimiter): {"counts": int_keys(profile["counts"]), "first": profile["first"], "carry": profile["carry"]}
+                for delimiter, profile in record["token_profiles"].items()
+            }
+        if record["symbol_profile"] is not None:
+            for field in ("symbols", "runs"):
+                record["symbol_profile"][field] = int_keys(record["symbol_profile"][field])
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+    return record
+
+#written to a temporary file and renamed into place, so a concurrent reader never sees a partial record
+def save_scan_record(record_path: str, record: ScanRecord):
+    os.makedirs(os.path.dirname(record_path), exist_ok = True)
+    handle, temp_path = tempfile.mkstemp(dir = os.path.dirname(record_path), suffix = ".tmp")
+    try:
+        with os.fdopen(handle, "w") as f:
+            json.dump(record, f)
+        os.replace(temp_path, record_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+def int_keys(counts: Dict[str, int]) -> Dict[int, int]:
+    return {int(key): count for key, count in counts.items()}
+
+#blake2b of the first and last SCAN_EDGE_SIZE bytes of the first size bytes of an input
+def edge_hash(file_in: int, size: int) -> str:
+    digest = hashlib.blake2b(digest_size = 16)
+    digest.update(os.pread(file_in, min(size, SCAN_EDGE_SIZE), 0))
+    digest.update(os.pread(file_in, min(size, SCAN_EDGE_SIZE), max(size - SCAN_EDGE_SIZE, 0)))
+    return digest.hexdigest()
+
+#feeds the first size bytes of an input to digest in 1 MB reads and returns its hex digest
+def hash_range(file_in: int, size: int, digest: Any, block_size: int = 1024 * 1024) -> str:
+    for offset in range(0, size, block_size):
+        digest.update(os.pread(file_in, min(block_size, size - offset), offset))
+    return digest.hexdigest()
+
+def decompress_block(data: bytes, buffer: int = 64 * 1024) -> bytes:
+    if not data:
+        return b""
+    decoder: BPRESS_DECODER = BPRESS_DECODER()
+    raw: List[bytes] = []
+    view: memoryview = memoryview(data)
+    decoder.read_stored(view[:2], view[-STREAMED_TRAILER_SIZE:], len(view))
+    for offset in range(0, len(data), buffer):
+        raw.append(decoder.feed(view[offset:offset + buffer], final = offset + buffer >= len(data)))
+    if not decoder.decompression_complete:
+        raise RuntimeError("compressed stream ended before it was fully decoded")
+    return b"".join(raw)
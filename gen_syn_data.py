@@ -3,11 +3,18 @@ import os
 from bitarray import bitarray
 from typing import *
 
+import numpy as np
+
+from utilities import make_executor
+
 file_sizes = {
     "1MB": 1 * 1024 * 1024,
     "2MB": 2 * 1024 * 1024,
     "3MB": 3 * 1024 * 1024,
-    "5MB": 5 * 1024 * 1024
+    "5MB": 5 * 1024 * 1024,
+    "100MB": 100 * 1024 * 1024,
+    "500MB": 500 * 1024 * 1024,
+    "1GB": 1024 * 1024 * 1024
 }
 
 base_path = "./test_files/structured_high_entropy"
@@ -15,56 +22,145 @@ base_path = "./test_files/structured_high_entropy"
 
 #utilities
 
+"""
+stream bit i is bit 63 - i % 64 of word i // 64, so moving bits to later positions is a right
+shift with a carry from the previous word. both shifts write into out (never words itself),
+fresh arrays per step cost more in page faults than the shifts do
+"""
+def shift_later(words: np.ndarray, k: int, out: np.ndarray) -> np.ndarray:
+    offset, bits = divmod(k, 64)
+    out[:offset] = 0
+    if offset >= len(words):
+        return out
+    np.right_shift(words[:len(words) - offset], np.uint64(bits), out = out[offset:])
+    if bits:
+        out[offset + 1:] |= words[:len(words) - offset - 1] << np.uint64(64 - bits)
+    return out
+
+def shift_earlier(words: np.ndarray, k: int, out: np.ndarray) -> np.ndarray:
+    np.left_shift(words, np.uint64(k), out = out)
+    out[:-1] |= words[1:] >> np.uint64(64 - k)
+    return out
+
+EVEN_POSITIONS: np.uint64 = np.uint64(0xAAAAAAAAAAAAAAAA)
+
+"""
+flip-flop scrub on packed 64-bit words instead of a per-bit loop. a window i..i+2 holds a
+flip-flop when both of its transitions are set (010 or 101); the scrub walks left to right,
+flips the last bit of a match ("half" only takes matches at even i) and resumes at i + 3. the
+bits a flip touches are never read again, so every match can be found on the unscrubbed bits.
+
+matches closer than 3 apart form clusters with a constant gap (1 for "full", 2 for "half") and
+the walk keeps every step-th match of each cluster (every third, every second), counted from its
+first one. those are found by doubling: picked starts as the cluster heads and is shifted by
+gap * step * 2**n onto itself wherever the cluster runs unbroken over the shift, so the loop runs
+log2 of the longest cluster times
+"""
+def scrub_words(words: np.ndarray, bit_len: int, scrub_rate: str) -> np.ndarray:
+    scratch: np.ndarray = np.empty_like(words)
+    transitions: np.ndarray = np.bitwise_xor(words, shift_earlier(words, 1, scratch))
+    matches: np.ndarray = np.bitwise_and(transitions, shift_earlier(transitions, 1, scratch))
+
+    #windows must fit in the stream: no match starts in the last two bits (or the padding)
+    last_start: int = bit_len - 3
+    if last_start < 0:
+        return words
+    matches[last_start // 64 + 1:] = 0
+    matches[last_start // 64] &= ~np.uint64((1 << (63 - last_start % 64)) - 1)
+
+    gap, step = (1, 3) if scrub_rate == "full" else (2, 2)
+    if scrub_rate == "half":
+        matches &= EVEN_POSITIONS
+
+    #unbroken: matches preceded by step - 1 more matches, gap apart
+    picked: np.ndarray = np.invert(shift_later(matches, gap, scratch))
+    picked &= matches
+    unbroken: np.ndarray = transitions
+    np.copyto(unbroken, matches)
+    for back in range(1, step):
+        unbroken &= shift_later(matches, gap * back, scratch)
+    shift: int = gap * step
+    while unbroken.any():
+        shift_later(picked, shift, scratch)
+        scratch &= unbroken
+        picked |= scratch
+        unbroken &= shift_later(unbroken, shift, scratch)
+        shift *= 2
+    words ^= shift_later(picked, 2, scratch)
+    return words
+
+def random_bytes(size: int, rng: Optional[np.random.Generator] = None) -> bytes:
+    return os.urandom(size) if rng is None else rng.bytes(size)
+
 def generate_structured_stream(
     buffer_size: int = 4 * 1024,
     scrub_rate: str = "full",
-    trailing_bits: Optional[bitarray] = None
+    trailing_bits: Optional[bitarray] = None,
+    rng: Optional[np.random.Generator] = None
 ) -> Tuple[bytes, bitarray]:
     if scrub_rate not in {"half", "full"}:
         raise ValueError("Invalid scrub_rate — must be 'half' or 'full'")
 
-    bits_ran = bitarray()
-    bits_ran.frombytes(os.urandom(buffer_size))
+    raw: bytearray = bytearray(random_bytes(buffer_size, rng))
+    if not raw:
+        return b"", bitarray()
 
     # Handle cross-boundary flip-flops using last 2 + current first 2 bits
-    if trailing_bits and len(trailing_bits) == 2 and len(bits_ran) >= 2:
-        edge = trailing_bits + bits_ran[:2]  # 4 bits
+    if trailing_bits and len(trailing_bits) == 2:
+        edge = trailing_bits.tolist() + [raw[0] >> 7, (raw[0] >> 6) & 1]  # 4 bits
 
         # There are two 3-bit windows here: [0:3] and [1:4]
         for offset in [0, 1]:
             a, b, c = edge[offset], edge[offset + 1], edge[offset + 2]
             if a != b and a == c:
-                if scrub_rate == "full" or (scrub_rate == "half" and int.from_bytes(os.urandom(1), "big") % 2 == 0):
+                if scrub_rate == "full" or (scrub_rate == "half" and random_bytes(1, rng)[0] % 2 == 0):
                     # Flip middle bit in bits_ran to kill the flip-flop
                     index_to_flip = offset  # 0 or 1, which corresponds to bits_ran[0] or [1]
-                    bits_ran[index_to_flip] ^= 1
-
-    # Internal scrub
-    i = 0
-    while i < len(bits_ran) - 2:
-        a, b, c = bits_ran[i], bits_ran[i + 1], bits_ran[i + 2]
-        if a != b and a == c:
-            if scrub_rate == "full" or (scrub_rate == "half" and i % 2 == 0):
-                bits_ran[i + 2] ^= 1
-                i += 3
-                continue
-        i += 1
-
-    return bits_ran.tobytes(), bits_ran[-2:]
-
+                    raw[0] ^= 0x80 >> index_to_flip
+
+    # Internal scrub, on big endian words so stream order matches bit order
+    padded_len: int = -(-len(raw) // 8) * 8
+    words: np.ndarray = np.frombuffer(bytes(raw) + bytes(padded_len - len(raw)), dtype=">u8").astype(np.uint64)
+    stream: bytes = scrub_words(words, len(raw) * 8, scrub_rate).astype(">u8").tobytes()[:len(raw)]
+
+    return stream, bitarray([(stream[-1] >> 1) & 1, stream[-1] & 1])
+
+"""
+writes size bytes of structured data in chunk_size pieces, carrying the trailing bits across
+chunks. a seed (an int or a numpy SeedSequence) makes the file reproducible (for the same
+seed, size and chunk_size)
+"""
+def generate_structured_file(
+    file_path: str,
+    size: int,
+    scrub_rate: str = "full",
+    seed: Optional[Union[int, np.random.SeedSequence]] = None,
+    chunk_size: int = 1024 * 1024
+):
+    rng: Optional[np.random.Generator] = None if seed is None else np.random.default_rng(seed)
+    written: int = 0
+    trailing_bits: Optional[bitarray] = None
+    with open(file_path, "wb") as f:
+        while written < size:
+            stream, trailing_bits = generate_structured_stream(min(chunk_size, size - written), scrub_rate, trailing_bits, rng)
+            f.write(stream)
+            written += len(stream)
 
 
+#files are written on a process pool, every file of a seeded run gets its own child of SeedSequence(seed)
 def generate_files(
     path: str, 
     num_files: int, 
     sizes: List[str], 
     structure_level: str, 
-    buffer_size: int = 4 * 1024
+    buffer_size: int = 1024 * 1024,
+    seed: Optional[int] = None,
+    workers: Optional[int] = None
 ):
     if structure_level not in ["half", "full"]:
         raise ValueError("please enter a valid structure level")
     
-    path = path.strip("/")
+    path = path.rstrip("/")
     os.makedirs(path, exist_ok=True)
 
     output_sizes: Optional[List[Tuple[str,int]]] = []
@@ -72,18 +168,21 @@ def generate_files(
     for size in sizes:
         if size in file_sizes:
             output_sizes.append((size, file_sizes[size]))
-     
-    for file_size in output_sizes:
-        for i in range(num_files):
-            file_path: str = f"{path}/{structure_level}_struc_high_ent_{file_size[0]}_{i+1}.bin"
-
-            with open(file_path, "wb") as f:
-                num_of_calls = round(file_size[1] / buffer_size)
-                trailing_bits = None
-
-                for _ in range(num_of_calls):
-                    stream, trailing_bits = generate_structured_stream(buffer_size, structure_level, trailing_bits)
-                    f.write(stream)
+
+    #spawned children are independent streams, unlike seed + i which repeats across sizes and neighbouring seeds
+    file_seeds: List[Optional[np.random.SeedSequence]] = [None] * (len(output_sizes) * num_files)
+    if seed is not None:
+        file_seeds = np.random.SeedSequence(seed).spawn(len(file_seeds)) #type: ignore
+
+    with make_executor(workers) as pool:
+        jobs = []
+        for size_index, file_size in enumerate(output_sizes):
+            for i in range(num_files):
+                file_path: str = f"{path}/{structure_level}_struc_high_ent_{file_size[0]}_{i+1}.bin"
+                file_seed: Optional[np.random.SeedSequence] = file_seeds[size_index * num_files + i]
+                jobs.append(pool.submit(generate_structured_file, file_path, file_size[1], structure_level, file_seed, buffer_size))
+        for job in jobs:
+            job.result()
 
     print("files created")
 
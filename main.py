@@ -1,40 +1,32 @@
 import bpress_v1_0_0 as bp
+from bpress_batch import batch_compress
 
 def main():
 
     """
     First we access and then compress and write our gernerated structured entropy data
-    Next we access the BPRESS DATA tool to report data on both the original, and compressed files
+    Next we access the BPRESS DATA tool to report data on the compressed files, the scan of
+    each original was already gathered during compression and is reused from the batch results.
+    the scans are kept in a scan index, so rerunning on unchanged inputs skips the scan pass
     """
 
     #step 1 compress target files
-    for i in range(1, 11):
-        file_num = i
-        in_path = f"./test_files/structured_high_entropy/full_struc_high_ent_1MB_{file_num}.bin"
-        out_path = f"./test_outputs/structured_high_entropy/full_struc_high_ent_1MB_{file_num}.press"
-        with bp.BPRESS_COMPRESS(in_path, out_path, 2 * 1024) as f:
-            print(f)
-            print("compression complete\n")
+    in_glob = "./test_files/structured_high_entropy/full_struc_high_ent_1MB_*.bin"
+    out_dir = "./test_outputs/structured_high_entropy"
+    scan_cache_dir = "./test_outputs/scan_index"
+    results = batch_compress(in_glob, out_dir, buffer = "auto", scan_cache_dir = scan_cache_dir)
+    print("compression complete\n")
 
     #step 2 analyze
-    for i in range(1,11):
-        file_num = i
-        original_path = f"./test_files/structured_high_entropy/full_struc_high_ent_1MB_{file_num}.bin"
-        compressed_path = f"./test_outputs/structured_high_entropy/full_struc_high_ent_1MB_{file_num}.press"
-        file_group = [original_path, compressed_path]
-        for file in file_group:
-            with bp.BPRESS_DATA(file) as scan:
-                print(f"file: {file.strip("_path")} num: {file_num}")
-                print(scan)
+    for result in results:
+        if result["error"] is not None:
+            print(f"file: {result['imp_path']} failed: {result['error']}")
+            continue
+        print(f"file: {result['imp_path']}")
+        print(f"<Scanned Data>\nInternal Scan: {result['scanned_data']}\nFile Size: {result['imp_size']}\nRatio: {result['ratio']:.4f}\n")
+        with bp.BPRESS_DATA(result["exp_path"]) as scan:
+            print(f"file: {result['exp_path']}")
+            print(scan)
 
 if __name__ == "__main__":
     main()
-
-    
-
-
-
-
-
-
-
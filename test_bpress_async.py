@@ -0,0 +1,64 @@
+import asyncio
+import random
+from concurrent.futures import ThreadPoolExecutor
+from bpress_async import AsyncBPressCompressor
+from bpress_v1_0_0 import compress, decompress_block
+
+rng = random.Random(41)
+test_data = bytes(rng.getrandbits(8) for _ in range(30000)) + b"ABC123XYZ" * 300 + b"\x00" * 9
+
+
+async def chunked(data, size):
+    for offset in range(0, len(data), size):
+        await asyncio.sleep(0)
+        yield data[offset:offset + size]
+
+def test_async_iterator_round_trip():
+    async def run():
+        compressor = AsyncBPressCompressor(chunked(test_data, 1000), sample_size = None, chunk_size = 512)
+        chunks = [chunk async for chunk in compressor]
+        assert all(len(chunk) <= 512 for chunk in chunks)
+        assert compressor.bytes_read == len(test_data) and compressor.exp_size == sum(map(len, chunks))
+        return b"".join(chunks)
+    #an exact scan picks what compress picks: the same stream with the flag byte moved to the end
+    compressed, expected = asyncio.run(run()), compress(test_data)
+    assert decompress_block(compressed) == test_data
+    assert compressed[2:-1] == expected[2:] and compressed[-1] == expected[1]
+
+def test_async_yields_before_end_of_stream():
+    async def run():
+        more = asyncio.Event()
+        async def source():
+            for offset in range(0, len(test_data), 1000):
+                yield test_data[offset:offset + 1000]
+            await more.wait()
+            yield b"ABC123XYZ" * 100
+
+        #the source stays open until a compressed chunk is out, buffering to the end would hang here
+        compressor = AsyncBPressCompressor(source(), sample_size = 4096, chunk_size = 512)
+        chunks = compressor.stream()
+        first = await asyncio.wait_for(chunks.__anext__(), 5)
+        assert first and not compressor.compression_complete
+        more.set()
+        return first + b"".join([chunk async for chunk in chunks])
+    assert decompress_block(asyncio.run(run())) == test_data + b"ABC123XYZ" * 100
+
+def test_async_stream_reader_round_trip():
+    async def run():
+        reader = asyncio.StreamReader()
+        async def feed():
+            for offset in range(0, len(test_data), 777):
+                reader.feed_data(test_data[offset:offset + 777])
+                await asyncio.sleep(0)
+            reader.feed_eof()
+        with ThreadPoolExecutor(1) as executor:
+            feeding = asyncio.ensure_future(feed())
+            compressed = await AsyncBPressCompressor(reader, sample_size = 4096, read_size = 1000, executor = executor).compress()
+            await feeding
+        return compressed
+    assert decompress_block(asyncio.run(run())) == test_data
+
+def test_async_empty_stream():
+    async def run():
+        return await AsyncBPressCompressor(chunked(b"", 10)).compress()
+    assert asyncio.run(run()) == b""
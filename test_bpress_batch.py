@@ -0,0 +1,62 @@
+import random
+import pytest
+from bpress_batch import batch_compress, collect_inputs, compress_file, main, output_paths
+from bpress_v1_0_0 import BPRESS_DATA
+
+rng = random.Random(23)
+
+
+def make_inputs(tmp_path):
+    in_dir = tmp_path / "in"
+    in_dir.mkdir()
+    for i, size in enumerate((300, 5000, 1200)):
+        (in_dir / f"file_{i}.bin").write_bytes(bytes(rng.getrandbits(8) for _ in range(size)))
+    (in_dir / "notes.txt").write_bytes(b"ABC123XYZ" * 50)
+    return in_dir
+
+def test_collect_inputs(tmp_path):
+    in_dir = make_inputs(tmp_path)
+    assert len(collect_inputs(str(in_dir))) == 4
+    assert [p.rsplit("/", 1)[-1] for p in collect_inputs(str(in_dir / "*.bin"))] == ["file_0.bin", "file_1.bin", "file_2.bin"]
+
+def test_batch_compress(tmp_path):
+    in_dir = make_inputs(tmp_path)
+    for workers in (1, 2):
+        results = batch_compress(str(in_dir / "*.bin"), str(tmp_path / f"out_{workers}"), workers, 512)
+        assert [r["imp_size"] for r in results] == [300, 5000, 1200]
+        for result in results:
+            assert result["error"] is None
+            assert result["exp_size"] == (tmp_path / f"out_{workers}" / result["exp_path"].rsplit("/", 1)[-1]).stat().st_size
+            assert result["ratio"] == result["exp_size"] / result["imp_size"]
+            with BPRESS_DATA(result["imp_path"]) as scan:
+                assert scan.scanned_data == result["scanned_data"]
+
+def test_batch_cli(tmp_path, capsys):
+    in_dir = make_inputs(tmp_path)
+    main([str(in_dir), str(tmp_path / "out"), "-w", "1", "--json"])
+    assert '"ratio"' in capsys.readouterr().out
+    assert len(list((tmp_path / "out").iterdir())) == 4
+
+def test_batch_scan_index(tmp_path):
+    in_dir = make_inputs(tmp_path)
+    first = batch_compress(str(in_dir), str(tmp_path / "out"), 1, 512, scan_cache_dir = str(tmp_path / "scans"))
+    assert len(list((tmp_path / "scans").iterdir())) == 4
+    again = batch_compress(str(in_dir), str(tmp_path / "out_again"), 1, 512, scan_cache_dir = str(tmp_path / "scans"))
+    assert [(r["scanned_data"], r["exp_size"]) for r in again] == [(r["scanned_data"], r["exp_size"]) for r in first]
+
+def test_output_names_never_collide(tmp_path):
+    #a shared stem keeps the whole name, a shared name from another directory is refused before writing
+    assert output_paths(["in/a.bin", "in/a.txt", "in/b.bin"], "out") == {"in/a.bin": "out/a.bin.press", "in/a.txt": "out/a.txt.press", "in/b.bin": "out/b.press"}
+    for name in ("one", "two"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "data.bin").write_bytes(name.encode() * 100)
+    with pytest.raises(ValueError):
+        batch_compress(str(tmp_path / "*" / "data.bin"), str(tmp_path / "out"), 1)
+    assert not (tmp_path / "out").exists()
+    with pytest.raises(SystemExit):
+        main([str(tmp_path / "*" / "data.bin"), str(tmp_path / "out"), "-w", "1"])
+
+def test_missing_input_is_an_error_result(tmp_path):
+    result = compress_file(str(tmp_path / "gone.bin"), str(tmp_path / "gone.press"))
+    assert result["imp_size"] is None and result["exp_size"] is None
+    assert result["error"].startswith("FileNotFoundError")
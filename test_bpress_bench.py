@@ -0,0 +1,33 @@
+import copy
+import json
+from bpress_bench import compare, main, run_benchmarks
+
+
+def test_run_benchmarks(tmp_path):
+    run = run_benchmarks(str(tmp_path), ["random", "full_structured", "semi_structured"], [3000], [512, 4096], 1)
+    assert [(r["corpus"], r["buffer"]) for r in run["results"]] == [
+        ("random", 512), ("random", 4096), ("full_structured", 512), ("full_structured", 4096), ("semi_structured", 512), ("semi_structured", 4096)
+    ]
+    for result in run["results"]:
+        assert result["round_trip"] and result["size"] == 3000
+        assert set(result["phases"]) == {"scan", "compress", "decompress"}
+        assert all(phase["mbps"] > 0 and phase["peak_bytes"] > 0 for phase in result["phases"].values())
+    assert (tmp_path / "random_3000.bin").stat().st_size == 3000
+
+def test_compare_flags_regressions(tmp_path):
+    baseline = run_benchmarks(str(tmp_path), ["semi_structured"], [2000], [256], 1)
+    assert compare(baseline, baseline) == []
+    slower = copy.deepcopy(baseline)
+    slower["results"][0]["phases"]["compress"]["mbps"] *= 0.5
+    slower["results"][0]["ratio"] += 0.01
+    regressions = compare(baseline, slower)
+    assert len(regressions) == 2 and "compress slowed" in regressions[0]
+
+def test_bench_cli(tmp_path, capsys):
+    baseline = run_benchmarks(str(tmp_path), ["semi_structured"], [2000], [256], 1)
+    baseline["results"][0]["phases"]["scan"]["mbps"] = 1e9
+    (tmp_path / "base.json").write_text(json.dumps(baseline))
+    args = ["-w", str(tmp_path), "-c", "semi_structured", "-s", "2000", "-b", "256", "-r", "1", "-o", str(tmp_path / "run.json")]
+    assert main(args + ["--baseline", str(tmp_path / "base.json")]) == 1
+    assert "REGRESSION" in capsys.readouterr().out
+    assert json.loads((tmp_path / "run.json").read_text())["meta"]["python"]
@@ -0,0 +1,89 @@
+import os
+import random
+import pytest
+import bpress_cache
+from bpress_cache import CompressionCache, format_fingerprint
+from bpress_v1_0_0 import BPRESS, compress
+
+rng = random.Random(71)
+structured_data = bytes(rng.choice((0, 0, 0, 255)) for _ in range(30000))
+
+
+def fail_compress(*args, **kwargs):
+    raise AssertionError("a cache hit must not compress")
+
+def test_cache_hits_skip_compression(tmp_path, monkeypatch):
+    (tmp_path / "in.bin").write_bytes(structured_data)
+    (tmp_path / "copy.bin").write_bytes(structured_data)
+    cache = CompressionCache(str(tmp_path / "cache"))
+    first = cache.compress(str(tmp_path / "in.bin"), str(tmp_path / "a.press"), 512)
+    assert first["hit"] is None and cache.misses == 1
+    expected = compress(structured_data)
+    assert (tmp_path / "a.press").read_bytes() == expected and first["exp_size"] == len(expected)
+
+    #same content under another name and buffer size, then a fresh process with only the disk tier
+    monkeypatch.setattr(bpress_cache, "BPRESS_COMPRESS", fail_compress)
+    assert cache.compress(str(tmp_path / "copy.bin"), str(tmp_path / "b.press"), 4096)["hit"] == "memory"
+    fresh = CompressionCache(str(tmp_path / "cache"), hardlink = True)
+    assert fresh.compress(str(tmp_path / "in.bin"), str(tmp_path / "c.press"))["hit"] == "disk"
+    assert (tmp_path / "b.press").read_bytes() == (tmp_path / "c.press").read_bytes() == expected
+    assert os.stat(tmp_path / "c.press").st_ino == os.stat(fresh.entry_path(first["key"])).st_ino #type: ignore
+
+    #settings that change the output miss
+    with pytest.raises(AssertionError):
+        cache.compress(str(tmp_path / "in.bin"), str(tmp_path / "d.press"), delimiter_setting = "high")
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = CompressionCache(str(tmp_path / "cache"), memory_bytes = 0)
+    keys = []
+    for i in range(3):
+        (tmp_path / f"in_{i}.bin").write_bytes(structured_data[i * 10000:(i + 1) * 10000])
+        keys.append(cache.compress(str(tmp_path / f"in_{i}.bin"), str(tmp_path / f"out_{i}.press"))["key"])
+        os.utime(cache.entry_path(keys[-1]), ns = (i * 10**9, i * 10**9))
+    sizes = [os.path.getsize(cache.entry_path(key)) for key in keys]
+
+    #a hit refreshes the oldest entry, the next insert pushes the store one entry past max_bytes
+    assert cache.compress(str(tmp_path / "in_0.bin"), str(tmp_path / "again.press"))["hit"] == "disk"
+    (tmp_path / "in_3.bin").write_bytes(b"ABC123XYZ" * 1000)
+    cache.max_bytes = sizes[0] + sizes[2] + len(compress(b"ABC123XYZ" * 1000))
+    cache.compress(str(tmp_path / "in_3.bin"), str(tmp_path / "out_3.press"))
+    assert [os.path.exists(cache.entry_path(key)) for key in keys] == [True, False, True]
+
+def test_cache_invalidated_by_format_changes(tmp_path, monkeypatch):
+    (tmp_path / "in.bin").write_bytes(structured_data)
+    cache = CompressionCache(str(tmp_path / "cache"))
+    cache.compress(str(tmp_path / "in.bin"), str(tmp_path / "a.press"))
+
+    #other data sharing cache_dir survives, whatever its directory is called
+    for name in ("abcdefghijklmnop", "bpress-0123456789abcdef"):
+        (tmp_path / "cache" / name).mkdir()
+        (tmp_path / "cache" / name / "keep.txt").write_bytes(b"keep")
+
+    monkeypatch.setitem(BPRESS.token_digest_table, 1, "1")
+    assert format_fingerprint() != cache.fingerprint
+    changed = CompressionCache(str(tmp_path / "cache"))
+    assert not os.path.exists(cache.store_dir)
+    assert (tmp_path / "cache" / "abcdefghijklmnop" / "keep.txt").exists()
+    assert (tmp_path / "cache" / "bpress-0123456789abcdef" / "keep.txt").exists()
+    monkeypatch.setattr(bpress_cache, "BPRESS_COMPRESS", fail_compress)
+    with pytest.raises(AssertionError):
+        changed.compress(str(tmp_path / "in.bin"), str(tmp_path / "b.press"))
+
+def test_cache_never_writes_through_a_hardlinked_output(tmp_path):
+    other = b"ABC123XYZ" * 3000
+    (tmp_path / "a.bin").write_bytes(structured_data)
+    (tmp_path / "b.bin").write_bytes(other)
+    linked = CompressionCache(str(tmp_path / "cache"), memory_bytes = 0, hardlink = True)
+    key = linked.compress(str(tmp_path / "a.bin"), str(tmp_path / "out.press"))["key"]
+    assert linked.compress(str(tmp_path / "a.bin"), str(tmp_path / "out.press"))["hit"] == "disk"
+    assert os.stat(tmp_path / "out.press").st_ino == os.stat(linked.entry_path(key)).st_ino #type: ignore
+
+    #out.press is now a link to the entry for a.bin, a copying cache writing b.bin there must not change it
+    for memory_bytes in (0, 64 * 1024 * 1024):
+        copying = CompressionCache(str(tmp_path / "cache"), memory_bytes = memory_bytes)
+        copying.compress(str(tmp_path / "b.bin"), str(tmp_path / "out.press"))
+        copying.compress(str(tmp_path / "b.bin"), str(tmp_path / "out.press"))
+        assert (tmp_path / "out.press").read_bytes() == compress(other)
+        assert copying.compress(str(tmp_path / "a.bin"), str(tmp_path / "a.press"))["hit"] is not None
+        assert (tmp_path / "a.press").read_bytes() == compress(structured_data)
+        assert linked.compress(str(tmp_path / "a.bin"), str(tmp_path / "out.press"))["hit"] == "disk"
@@ -0,0 +1,61 @@
+import random
+import pytest
+from bpress_container import BLOCK_PRESS, BLOCK_STORED, BPRESS_CONTAINER_COMPRESS, BPRESS_CONTAINER_DECOMPRESS, read_block, read_index
+from bpress_v1_0_0 import compress_block, decompress_block
+
+rng = random.Random(17)
+test_data = bytes(rng.getrandbits(8) for _ in range(20000)) + b"ABC123XYZ" * 1000 + b"\x00" * 3000
+
+
+def test_block_round_trip():
+    for data in (test_data[:1], test_data[:777], test_data):
+        assert decompress_block(compress_block(data)) == data
+    assert compress_block(b"") == b""
+
+def test_container_round_trip(tmp_path):
+    (tmp_path / "in.bin").write_bytes(test_data)
+    for workers in (1, 2):
+        with BPRESS_CONTAINER_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "out.bprc"), 4096, workers) as comp:
+            assert len(comp.index) == -(-len(test_data) // 4096)
+        with BPRESS_CONTAINER_DECOMPRESS(str(tmp_path / "out.bprc"), str(tmp_path / "back.bin"), workers):
+            pass
+        assert (tmp_path / "back.bin").read_bytes() == test_data
+
+def test_container_seek_block(tmp_path):
+    (tmp_path / "in.bin").write_bytes(test_data)
+    with BPRESS_CONTAINER_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "out.bprc"), 5000, 1):
+        pass
+    index = read_index(str(tmp_path / "out.bprc"))
+    assert read_block(str(tmp_path / "out.bprc"), index[3]) == test_data[15000:20000]
+    assert read_block(str(tmp_path / "out.bprc"), index[-1]) == test_data[len(index) * 5000 - 5000:]
+
+def test_container_empty_and_foreign(tmp_path):
+    (tmp_path / "empty.bin").write_bytes(b"")
+    with BPRESS_CONTAINER_COMPRESS(str(tmp_path / "empty.bin"), str(tmp_path / "empty.bprc"), workers = 1):
+        pass
+    assert read_index(str(tmp_path / "empty.bprc")) == []
+    with pytest.raises(ValueError):
+        read_index(str(tmp_path / "empty.bin"))
+
+def test_container_symbol_blocks(tmp_path):
+    (tmp_path / "in.bin").write_bytes(test_data)
+    with BPRESS_CONTAINER_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "out.bprc"), 8192, 1, symbol_bits = 8):
+        pass
+    with BPRESS_CONTAINER_DECOMPRESS(str(tmp_path / "out.bprc"), str(tmp_path / "back.bin"), 1):
+        pass
+    assert (tmp_path / "back.bin").read_bytes() == test_data
+
+def test_container_stores_incompressible_blocks(tmp_path):
+    (tmp_path / "in.bin").write_bytes(test_data)
+    with BPRESS_CONTAINER_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "out.bprc"), 5000, 1) as comp:
+        pass
+    types = [entry["block_type"] for entry in read_index(str(tmp_path / "out.bprc"))]
+    assert types[:4] == [BLOCK_STORED] * 4 and BLOCK_PRESS in types
+    assert all(entry["comp_size"] <= entry["raw_size"] for entry in comp.index)
+    with BPRESS_CONTAINER_DECOMPRESS(str(tmp_path / "out.bprc"), str(tmp_path / "back.bin"), 1):
+        pass
+    assert (tmp_path / "back.bin").read_bytes() == test_data
+
+    with BPRESS_CONTAINER_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "all.bprc"), 5000, 1, store_raw = False):
+        pass
+    assert all(entry["block_type"] == BLOCK_PRESS for entry in read_index(str(tmp_path / "all.bprc")))
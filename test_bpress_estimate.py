@@ -0,0 +1,39 @@
+import os
+import random
+import pytest
+from bpress_estimate import estimate, estimate_bytes
+from bpress_v1_0_0 import compress
+
+rng = random.Random(23)
+random_data = bytes(rng.getrandbits(8) for _ in range(200000))
+structured_data = bytes(rng.choice((0, 0, 0, 255)) for _ in range(150000))
+
+
+def test_estimate_small_input_is_exact(tmp_path):
+    data = random_data[:5000] + structured_data[:5000]
+    (tmp_path / "in.bin").write_bytes(data)
+    for delimiter_setting in ("low", "high", "cost"):
+        result = estimate(str(tmp_path / "in.bin"), delimiter_setting = delimiter_setting)
+        assert result["exact"] and result["sampled_bytes"] == len(data)
+        assert result["estimated_size"] == len(compress(data, delimiter_setting, stored_threshold = None))
+    assert estimate_bytes(b"")["estimated_size"] == 0
+
+def test_estimate_sampled_bounds():
+    result = estimate_bytes(random_data, sample_bytes = 32 * 1024)
+    assert not result["exact"] and result["blocks"] == 16
+    actual = len(compress(random_data, stored_threshold = None)) / len(random_data)
+    assert result["ratio_low"] <= actual <= result["ratio_high"]
+    assert result["store_raw"]
+
+    result = estimate_bytes(structured_data, sample_bytes = 32 * 1024)
+    actual = len(compress(structured_data, stored_threshold = None)) / len(structured_data)
+    assert result["ratio_low"] <= actual <= result["ratio_high"] < 1.0
+    assert not result["store_raw"]
+
+def test_estimate_refuses_non_regular_input(tmp_path):
+    os.mkfifo(tmp_path / "pipe")
+    for path in (str(tmp_path / "pipe"), os.devnull):
+        with pytest.raises(ValueError):
+            estimate(path)
+    (tmp_path / "empty.bin").write_bytes(b"")
+    assert estimate(str(tmp_path / "empty.bin"))["estimated_size"] == 0
@@ -0,0 +1,48 @@
+import random
+import numpy as np
+import pytest
+from bitarray import bitarray
+from bpress_tables import (
+    BYTE_FLIP_FLOPS, BYTE_LEADING_RUN, BYTE_LONGEST_RUN, BYTE_TRAILING_RUN, BYTE_TRANSITIONS, FLIP_FLOP_BUCKETS,
+    PAIR_FLIP_FLOPS, PAIR_LONGEST_RUN, PAIR_TRANSITIONS, TRANSITION_BUCKETS, byte_pairs, profile_bytes
+)
+from bpress_v1_0_0 import BPRESS
+
+def bit_counts(bits: str):
+    transitions = sum(1 for i in range(len(bits) - 1) if bits[i] != bits[i + 1])
+    flip_flops = sum(1 for i in range(len(bits) - 2) if bits[i] != bits[i + 1] and bits[i] == bits[i + 2])
+    runs = [len(run) for run in bits.replace("01", "0 1").replace("10", "1 0").split()]
+    return transitions, flip_flops, runs
+
+
+def test_tables_match_bit_walk():
+    for value in range(256):
+        transitions, flip_flops, runs = bit_counts(format(value, "08b"))
+        assert (BYTE_TRANSITIONS[value], BYTE_FLIP_FLOPS[value]) == (transitions, flip_flops)
+        assert (BYTE_LEADING_RUN[value], BYTE_TRAILING_RUN[value], BYTE_LONGEST_RUN[value]) == (runs[0], runs[-1], max(runs))
+    for value in random.Random(9).sample(range(65536), 2000) + [0x0000, 0xFFFF, 0x5555, 0x0FF0, 0x00FF]:
+        transitions, flip_flops, runs = bit_counts(format(value, "016b"))
+        assert (PAIR_TRANSITIONS[value], PAIR_FLIP_FLOPS[value], PAIR_LONGEST_RUN[value]) == (transitions, flip_flops, max(runs))
+
+    assert sorted(sum(FLIP_FLOP_BUCKETS.values(), ())) == sorted(sum(TRANSITION_BUCKETS.values(), ())) == list(range(256))
+    assert FLIP_FLOP_BUCKETS[6] == (0x55, 0xAA)
+    with pytest.raises(ValueError):
+        BYTE_TRANSITIONS[0] = 1
+    assert byte_pairs(np.frombuffer(b"\x01\x02\x03", dtype=np.uint8)).tolist() == [0x0102, 0x0203]
+
+def test_profile_matches_scan():
+    rng = random.Random(4)
+    data = bytes(rng.getrandbits(8) for _ in range(3000))
+    bits = bitarray()
+    bits.frombytes(bytes([0xA5]) + data)
+    scan = BPRESS().scan_bits(bits)
+    profile = profile_bytes(data, prev_byte = 0xA5)
+    assert profile["transitions"] + BYTE_TRANSITIONS[0xA5] == scan["transitions"]
+    assert profile["flip_flops"] + BYTE_FLIP_FLOPS[0xA5] == scan["flip_flops"]
+    assert profile["bit_freqs"][1] == scan["bit_freqs"][1] - 4
+    assert sum(profile["flip_flop_buckets"]) == len(data)
+
+    assert profile_bytes(bytes(range(256)))["byte_entropy"] == pytest.approx(8.0)
+    assert profile_bytes(b"\x00" * 100)["byte_entropy"] == 0.0
+    assert profile_bytes(b"\x55" * 100)["flip_flop_density"] == 1.0
+    assert profile_bytes(b"")["bytes"] == 0
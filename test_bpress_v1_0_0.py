@@ -1,5 +1,12 @@
-from bpress_v1_0_0 import BPRESS
+import io
+import os
+import random
+import threading
+import tracemalloc
+import pytest
+from bpress_v1_0_0 import AUTO_BUFFER_MAX, AUTO_BUFFER_MIN, CHECKPOINT_SUFFIX, SLICE_SIZE, STORED_THRESHOLD, STORED_TRAILER_SIZE, STREAMED_MAGIC_BYTE, AdaptiveCodebook, BitAccumulator, BPRESS, BPRESS_COMPRESS, BPRESS_DATA, BPRESS_DECODER, BPRESS_DECOMPRESS, CompressionMetrics, Compressor, DigestCodebook, auto_buffer_size, compress, decompress_block, digest_stem, huffman_code_lengths, load_scan_record, read_checkpoints, read_range, scan_record_path
 from bitarray import bitarray # type: ignore 
+import numpy as np
 
 bp = BPRESS()
 
@@ -9,6 +16,14 @@ test_data_2 ={"zero_lead": 5, "one_lead": 10}
 def alt_delim(data):
     return 0
 
+#bit by bit reference statistics for the vectorized scan engine
+def naive_scan(bits):
+    return {
+        "bit_freqs": {0: bits.count(0), 1: bits.count(1)},
+        "transitions": sum(1 for i in range(len(bits) - 1) if bits[i] != bits[i+1]),
+        "flip_flops": sum(1 for i in range(len(bits) - 2) if bits[i] != bits[i+1] and bits[i] == bits[i+2]),
+    }
+
 
 
 # unit tests for statistics gathering functions in BPRESS parent class:
@@ -31,6 +46,25 @@ def test_count_flip_flops():
     assert bp.count_flip_flops(test_data[2]) == 0
     assert bp.count_flip_flops(test_data[0]) == 0
 
+def test_scan_bits_matches_naive():
+    rng = random.Random(3)
+    for length in list(range(0, 40)) + [257, 1000]:
+        bits = bitarray([rng.getrandbits(1) for _ in range(length)])
+        assert bp.scan_bits(bits) == naive_scan(bits)
+
+def test_scan_stream_across_buffers(tmp_path):
+    rng = random.Random(5)
+    data = bytes(rng.getrandbits(8) for _ in range(1001)) + b"\x55" * 20
+    path = tmp_path / "scan.bin"
+    path.write_bytes(data)
+    bits = bitarray()
+    bits.frombytes(data)
+    for buffer in (1, 3, 64, 4 * 1024):
+        scan = BPRESS_DATA(str(path))
+        scan.buffer = buffer
+        with scan:
+            assert scan.scanned_data == naive_scan(bits)
+
 def test_delimiter():
     assert bp.config_delimiter({"bit_freqs" : {0: 17, 1:20}}) == 0
     assert bp.config_delimiter({"bit_freqs" : {0: 1, 1: 0}}) == 1
@@ -38,3 +72,546 @@ def test_delimiter():
     assert bp.config_delimiter({"bit_freqs" : {0: 10, 1:20}}, mode = "high") == 1
     assert bp.config_delimiter(None, mode = "custom", behaviour = alt_delim) == 0
 
+
+def test_tokenize():
+    assert bp.tokenize(bitarray("0010001"), 1).tolist() == [3, 4]
+    assert bp.tokenize(bitarray("10000000"), 1).tolist() == [1]
+    assert bp.tokenize(bitarray("10000000"), 0).tolist() == [2, 1, 1, 1, 1, 1, 1]
+    assert bp.tokenize(bitarray("0"), 1).tolist() == []
+    assert bp.tokenize(bitarray(), 0).tolist() == []
+
+def test_tokenize_matches_pull_token():
+    stream = test_data[1] + bitarray("0011101")
+    expected = []
+    while stream:
+        token_length, stream = bp.pull_token(stream, 1)
+        expected.append(token_length)
+    assert bp.tokenize(test_data[1] + bitarray("0011101"), 1).tolist() == expected
+
+def test_digest_stem():
+    assert digest_stem(18) == "1111100000"
+    assert digest_stem(33) == "1111101111"
+    assert digest_stem(34) == "111111000000"
+    assert digest_stem(1026) == "1" * 11 + "0" + "0" * 10
+
+def test_codebook_encode():
+    codebook = DigestCodebook(max_len=40)
+    for token_len, digest in BPRESS.token_digest_table.items():
+        assert codebook.encode(token_len).to01() == digest
+    assert codebook.encode(18).to01() == digest_stem(18)
+    assert codebook.encode(100).to01() == digest_stem(100)
+    assert codebook.code_length(6) == 6
+
+def test_codebook_encode_batch():
+    codebook = DigestCodebook(max_len=16)
+    token_lens = np.array([1, 2, 17, 5, 300, 1])
+    expected = bitarray()
+    for token_len in token_lens.tolist():
+        expected.extend(codebook.encode(token_len))
+    assert codebook.encode_batch(token_lens) == expected
+    assert codebook.encode_batch(np.array([], dtype=np.int64)) == bitarray()
+
+def test_single_pass_sample_mode(tmp_path):
+    rng = random.Random(11)
+    data = bytes(rng.getrandbits(8) for _ in range(5000))
+    in_path = tmp_path / "in.bin"
+    in_path.write_bytes(data)
+    with BPRESS_COMPRESS(str(in_path), str(tmp_path / "full.press"), 256) as full:
+        assert full.stats_mode == "exact"
+    with BPRESS_COMPRESS(str(in_path), str(tmp_path / "exact.press"), 256, scan_mode = "sample", sample_size = 8000) as exact:
+        assert exact.stats_mode == "exact"
+        assert exact.scanned_data == full.scanned_data
+    with BPRESS_COMPRESS(str(in_path), str(tmp_path / "sampled.press"), 256, scan_mode = "sample", sample_size = 1000) as sampled:
+        assert sampled.stats_mode == "sampled"
+        assert sampled.scanned_data["bit_freqs"][0] + sampled.scanned_data["bit_freqs"][1] == 8000
+    assert (tmp_path / "exact.press").read_bytes() == (tmp_path / "full.press").read_bytes()
+    if sampled.delimiter_bit == full.delimiter_bit:
+        assert (tmp_path / "sampled.press").read_bytes() == (tmp_path / "full.press").read_bytes()
+
+def test_single_pass_from_pipe(tmp_path):
+    data = b"ABC123XYZ" * 300
+    (tmp_path / "in.bin").write_bytes(data)
+    fifo = tmp_path / "in.fifo"
+    os.mkfifo(fifo)
+    def feed():
+        with open(fifo, "wb") as f:
+            for i in range(0, len(data), 100):
+                f.write(data[i:i + 100])
+                f.flush()
+    writer = threading.Thread(target = feed)
+    writer.start()
+    with BPRESS_COMPRESS(str(fifo), str(tmp_path / "pipe.press"), 512, scan_mode = "sample") as piped:
+        assert piped.bytes_compressed == len(data)
+    writer.join()
+    with BPRESS_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "file.press"), 512):
+        pass
+    assert (tmp_path / "pipe.press").read_bytes() == (tmp_path / "file.press").read_bytes()
+
+#compress then decompress through the file based endpoints
+def round_trip(tmp_path, data, buffer = 4 * 1024, decode_buffer = 4 * 1024, **settings):
+    in_path, press_path, out_path = tmp_path / "rt.bin", tmp_path / "rt.press", tmp_path / "rt.out"
+    in_path.write_bytes(data)
+    with BPRESS_COMPRESS(str(in_path), str(press_path), buffer, **settings):
+        pass
+    with BPRESS_DECOMPRESS(str(press_path), str(out_path), decode_buffer) as decompressed:
+        assert decompressed.decode_mbps >= 0
+    return out_path.read_bytes()
+
+def test_decompress_round_trip(tmp_path):
+    rng = random.Random(13)
+    samples = [
+        bytes([0x5a]),
+        bytes(rng.getrandbits(8) for _ in range(3000)),
+        b"ABC123XYZ" * 200,
+        b"\x01" + b"\x00" * 300 + b"\x01" + b"\xff",
+        b"\x00" * 64,
+    ]
+    for data in samples:
+        for mode in ("low", "high"):
+            assert round_trip(tmp_path, data, 64, 7, delimiter_setting = mode) == data
+            assert round_trip(tmp_path, data, delimiter_setting = mode) == data
+
+def test_decompress_rejects_foreign_input(tmp_path):
+    (tmp_path / "foreign.press").write_bytes(b"\x00" * 16)
+    with pytest.raises(ValueError):
+        with BPRESS_DECOMPRESS(str(tmp_path / "foreign.press"), str(tmp_path / "foreign.out")):
+            pass
+
+def test_mmap_input_matches_read_path(tmp_path):
+    rng = random.Random(29)
+    data = bytes(rng.getrandbits(8) for _ in range(20000)) + b"ABC123XYZ" * 100
+    (tmp_path / "in.bin").write_bytes(data)
+    outputs = []
+    for use_mmap in (False, True):
+        for scan_mode in ("full", "sample"):
+            with BPRESS_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "out.press"), 1000, scan_mode = scan_mode, sample_size = 50000, use_mmap = use_mmap) as compressor:
+                assert (compressor.mapping is not None) == use_mmap
+                mapped = compressor.mapping.obj if use_mmap else None
+            assert compressor.mapping is None
+            if mapped is not None:
+                assert mapped.closed
+            outputs.append((tmp_path / "out.press").read_bytes())
+        with BPRESS_DATA(str(tmp_path / "in.bin"), use_mmap = use_mmap) as scan:
+            assert scan.scanned_data == compressor.scanned_data
+    assert all(output == outputs[0] for output in outputs)
+
+class UnseekableSink(io.RawIOBase):
+    def __init__(self):
+        self.chunks = []
+    def writable(self):
+        return True
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+def test_buffered_output_targets_match(tmp_path):
+    rng = random.Random(31)
+    data = bytes(rng.getrandbits(8) for _ in range(30000)) + b"\x00" * 5
+    (tmp_path / "in.bin").write_bytes(data)
+    with BPRESS_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "ref.press"), 512) as reference:
+        pass
+    expected = (tmp_path / "ref.press").read_bytes()
+    assert reference.exp_size == len(expected)
+    assert reference.output.writes == 1
+
+    #small flush size: the header is patched after it left the buffer
+    with BPRESS_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "small.press"), 512, flush_size = 64) as compressor:
+        assert compressor.output.writes > 1
+    assert (tmp_path / "small.press").read_bytes() == expected
+
+    stream = io.BytesIO(b"lead")
+    stream.seek(4)
+    with BPRESS_COMPRESS(str(tmp_path / "in.bin"), stream, 512, flush_size = 64) as compressor:
+        assert compressor.exp_size == len(expected)
+    assert stream.getvalue() == b"lead" + expected
+
+    sink = UnseekableSink()
+    with BPRESS_COMPRESS(str(tmp_path / "in.bin"), sink, 512, flush_size = 64):
+        pass
+    assert b"".join(sink.chunks) == expected
+
+    restored = io.BytesIO()
+    with BPRESS_DECOMPRESS(str(tmp_path / "ref.press"), restored, 512, flush_size = 100):
+        pass
+    assert restored.getvalue() == data
+
+def test_bit_accumulator_carries_tail_in_place():
+    accumulator = BitAccumulator()
+    carried = accumulator.bits
+    out = bytearray()
+    accumulator.bits.extend(bitarray("1010101111"))
+    assert accumulator.drain(out.extend) == 1 and out == b"\xab"
+    assert accumulator.bits is carried and accumulator.bits == bitarray("11")
+
+    #appending bytes onto an unaligned tail shifts them through, hold keeps the last bits back
+    accumulator.frombytes(b"\x00\xff")
+    assert accumulator.take(hold = 2) == b"\xc0\x3f"
+    assert accumulator.bits == bitarray("11")
+    assert accumulator.align(0) == bitarray("000000") and accumulator.take() == b"\xc0"
+    assert len(accumulator) == 0 and accumulator.drain(out.extend) == 0
+
+    accumulator.frombytes(b"\x0f")
+    accumulator.consume(4)
+    assert accumulator.bits == bitarray("1111")
+
+def test_in_memory_compress_matches_file(tmp_path):
+    rng = random.Random(37)
+    data = bytes(rng.getrandbits(8) for _ in range(20000)) + b"\xff" * 40 + b"ABC123XYZ" * 50
+    (tmp_path / "in.bin").write_bytes(data)
+    for mode in ("low", "high"):
+        with BPRESS_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "out.press"), 777, delimiter_setting = mode) as compressor:
+            pass
+        expected = (tmp_path / "out.press").read_bytes()
+        assert compress(data, mode) == expected
+        assert compress(memoryview(bytearray(data)), mode, buffer = 100) == expected
+
+        incremental = Compressor(mode, sample_size = None, streamed = False)
+        pieces = [incremental.update(data[offset:offset + 333]) for offset in range(0, len(data), 333)]
+        assert not any(pieces) and incremental.flush() == expected
+        assert incremental.scanned_data == compressor.scanned_data
+        assert incremental.stats_mode == "exact"
+        with pytest.raises(ValueError):
+            incremental.update(b"late")
+
+    #sampled and fixed delimiters encode on arrival and still decode
+    sampled = Compressor(sample_size = 1000)
+    pieces = [sampled.update(data[offset:offset + 500]) for offset in range(0, len(data), 500)]
+    assert sampled.stats_mode == "sampled" and not sampled.pending
+    assert decompress_block(b"".join(pieces) + sampled.flush()) == data
+    fixed = Compressor(delimiter_bit = 0)
+    assert decompress_block(fixed.update(data) + fixed.flush()) == data
+    assert compress(b"") == b"" and Compressor().flush() == b"" and decompress_block(Compressor(sample_size = None).flush()) == b""
+
+@pytest.mark.parametrize("settings", [{}, {"delimiter_bit": 1}, {"symbol_bits": 4, "sample_size": 5000}, {"stored_threshold": 0}])
+def test_streamed_compressor_emits_from_update(tmp_path, settings):
+    rng = random.Random(83)
+    data = bytes(rng.choice((0, 0, 0, 255)) for _ in range(400000)) + bytes(rng.getrandbits(8) for _ in range(50000)) + b"\x01" * 3
+    compressor = Compressor(buffer = 4096, **settings)
+    pieces = [compressor.update(data[offset:offset + 10000]) for offset in range(0, len(data), 10000)]
+    tail = compressor.flush()
+    stream = b"".join(pieces) + tail
+
+    #output comes out of update as it is encoded, only the unaligned tail and the flag byte wait for flush
+    assert sum(map(len, pieces)) > 0.9 * len(stream) and len(tail) < 16 + STORED_TRAILER_SIZE
+    assert stream[0] == STREAMED_MAGIC_BYTE and compressor.bytes_out == len(stream)
+    assert decompress_block(stream) == data
+    (tmp_path / "out.press").write_bytes(stream)
+    with BPRESS_DECOMPRESS(str(tmp_path / "out.press"), str(tmp_path / "back.bin"), 777):
+        pass
+    assert (tmp_path / "back.bin").read_bytes() == data
+    assert read_range(str(tmp_path / "out.press"), 399990, 30) == data[399990:400020]
+
+    #without the size, a stream that was not stored decodes fed chunk by chunk up to an empty final feed
+    assert (compressor.stored_offset is not None) == ("stored_threshold" in settings)
+    if compressor.stored_offset is None:
+        decoder = BPRESS_DECODER()
+        raw = b"".join(decoder.feed(stream[offset:offset + 1000]) for offset in range(0, len(stream), 1000)) + decoder.feed(b"", final = True)
+        assert raw == data
+
+def test_cost_delimiter_estimates_exact_size(tmp_path):
+    rng = random.Random(43)
+    samples = [
+        bytes(rng.getrandbits(8) & rng.getrandbits(8) for _ in range(5000)),
+        bytes(rng.getrandbits(8) for _ in range(5000)) + b"\xff" * 30,
+        b"\x80" + b"\x00" * 500,
+        b"\x00",
+    ]
+    for data in samples:
+        (tmp_path / "in.bin").write_bytes(data)
+        sizes = {}
+        for delimiter in (0, 1):
+            with BPRESS_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "out.press"), 100, "custom", delimiter_fn = lambda scan, mode: delimiter) as compressor:
+                pass
+            sizes[delimiter] = compressor.exp_size
+        with BPRESS_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "out.press"), 100, "cost") as compressor:
+            assert compressor.scanned_data["estimated_sizes"] == sizes
+            assert compressor.estimated_size == compressor.exp_size == min(sizes.values())
+        assert compress(data, "cost") == (tmp_path / "out.press").read_bytes()
+        incremental = Compressor("cost", sample_size = None, streamed = False)
+        for offset in range(0, len(data), 64):
+            incremental.update(data[offset:offset + 64])
+        assert incremental.flush() == (tmp_path / "out.press").read_bytes()
+    with pytest.raises(ValueError):
+        bp.config_delimiter({"bit_freqs": {0: 1, 1: 2}, "transitions": 0, "flip_flops": 0}, mode = "cost")
+
+def test_huffman_code_lengths_are_limited():
+    counts = {symbol: 2**symbol for symbol in range(30)}
+    lengths = huffman_code_lengths(counts, 16)
+    assert max(lengths.values()) == 16
+    assert sum(2.0 ** -length for length in lengths.values()) <= 1
+    assert lengths[29] == 1
+    assert huffman_code_lengths({0: 5}) == {0: 1}
+
+def test_adaptive_codebook_description_round_trip():
+    codebook = AdaptiveCodebook.from_counts({1: 500, 2: 250, 3: 120, 9: 3, 400: 2})
+    restored = AdaptiveCodebook.from_description(codebook.describe())
+    assert restored.lengths == codebook.lengths
+    assert len(codebook.describe()) == AdaptiveCodebook.description_length(9)
+    assert codebook.code_length(1) == 1
+    #unseen and long lengths are escaped onto the fixed digest
+    assert codebook.encode(400) == codebook.escape + bp.codebook.encode(400)
+    assert codebook.encode(5) == codebook.escape + bp.codebook.encode(5)
+
+def test_adaptive_digests_round_trip_and_shrink(tmp_path):
+    rng = random.Random(47)
+    data = bytes(rng.getrandbits(8) for _ in range(20000)) + b"\x00" * 300 + b"ABC123XYZ" * 40
+    (tmp_path / "in.bin").write_bytes(data)
+    with BPRESS_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "fixed.press"), 999) as fixed:
+        pass
+    with BPRESS_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "adaptive.press"), 999, digest_mode = "adaptive") as adaptive:
+        assert adaptive.adaptive_codebook is not None
+        assert adaptive.estimated_size == adaptive.exp_size
+    compressed = (tmp_path / "adaptive.press").read_bytes()
+    assert adaptive.exp_size < fixed.exp_size * 0.95
+    assert compressed[1] & 0x40
+    assert compress(data, digest_mode = "adaptive") == compressed
+    for decode_buffer in (3, 4096):
+        assert decompress_block(compressed, decode_buffer) == data
+    assert round_trip(tmp_path, data, 64, 5, digest_mode = "adaptive", scan_mode = "sample", sample_size = 2000) == data
+
+    #tiny inputs keep the fixed code, the description would cost more than it saves
+    assert compress(b"\x5a", digest_mode = "adaptive") == compress(b"\x5a")
+
+def test_symbol_mode_round_trip(tmp_path):
+    rng = random.Random(53)
+    data = b"ABC123XYZ" * 300 + bytes(rng.getrandbits(8) for _ in range(3000)) + b"\x00" * 700 + b"\x0f\xf0"
+    (tmp_path / "in.bin").write_bytes(data)
+    with BPRESS_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "bits.press"), 500) as bits:
+        pass
+    for symbol_bits in (4, 8):
+        with BPRESS_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "sym.press"), 500, symbol_bits = symbol_bits) as symbols:
+            assert symbols.estimated_size == symbols.exp_size
+        compressed = (tmp_path / "sym.press").read_bytes()
+        assert (compressed[1] >> 4) & 0x03 == {4: 1, 8: 2}[symbol_bits]
+        assert symbols.tokens_compressed * symbol_bits < bits.tokens_compressed * 4
+        assert compress(data, symbol_bits = symbol_bits) == compressed
+        for decode_buffer in (3, 4096):
+            assert decompress_block(compressed, decode_buffer) == data
+        assert round_trip(tmp_path, data, 64, 5, symbol_bits = symbol_bits, scan_mode = "sample", sample_size = 100) == data
+
+    #byte structured input compresses better as byte runs
+    pattern = b"ABC123XYZ" * 500
+    assert len(compress(pattern, symbol_bits = 8)) < 0.6 * len(compress(pattern))
+    incremental = Compressor(symbol_bits = 8, sample_size = 64)
+    pieces = [incremental.update(pattern[offset:offset + 50]) for offset in range(0, len(pattern), 50)]
+    assert decompress_block(b"".join(pieces) + incremental.flush()) == pattern
+    with pytest.raises(ValueError):
+        Compressor(symbol_bits = 3)
+
+def test_stored_stream_caps_expansion(tmp_path):
+    rng = random.Random(59)
+    data = bytes(rng.choice((0, 0, 0, 255)) for _ in range(3000)) + bytes(rng.getrandbits(8) for _ in range(40000))
+    (tmp_path / "in.bin").write_bytes(data)
+    encoded = compress(data, stored_threshold = None)
+    assert len(encoded) > len(data) + 2 * STORED_THRESHOLD
+
+    #the switch point depends on the data only, not on how it was buffered
+    compressed = compress(data)
+    for buffer in (7, 4096):
+        with BPRESS_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "out.press"), buffer) as stored:
+            assert 2 < stored.stored_offset < len(data)
+        assert (tmp_path / "out.press").read_bytes() == compressed
+    assert compressed[1] & 0x08
+    assert len(compressed) <= len(data) + STORED_THRESHOLD + 16
+    for decode_buffer in (3, 4096):
+        assert decompress_block(compressed, decode_buffer) == data
+    assert round_trip(tmp_path, data, 64, 5) == data
+    assert round_trip(tmp_path, data, 64, 5, symbol_bits = 4, stored_threshold = 0) == data
+
+    #an exact estimate past the threshold stores the input whole
+    whole = compress(data[3000:], symbol_bits = 8)
+    assert whole[2:-8] == data[3000:]
+    assert decompress_block(whole) == data[3000:]
+
+@pytest.mark.parametrize("settings", [{}, {"symbol_bits": 4}, {"stored_threshold": None}])
+def test_read_range_from_checkpoints(tmp_path, settings):
+    rng = random.Random(67)
+    data = bytes(rng.choice((0, 0, 0, 255)) for _ in range(150000)) + bytes(rng.getrandbits(8) for _ in range(20000)) + b"ABC123XYZ" * 3000
+    (tmp_path / "in.bin").write_bytes(data)
+    press = str(tmp_path / "out.press")
+    with BPRESS_COMPRESS(str(tmp_path / "in.bin"), press, 5000, checkpoint_interval = 16 * 1024, **settings) as compressor:
+        pass
+    raw_size, stream_size, checkpoints = read_checkpoints(press + CHECKPOINT_SUFFIX)
+    assert (raw_size, stream_size) == (len(data), compressor.exp_size)
+    assert len(checkpoints) > 5 and checkpoints == sorted(checkpoints)
+    assert (tmp_path / "out.press").read_bytes() == compress(data, buffer = 5000, **settings)
+
+    ranges = [(0, 1), (0, 4096), (len(data) - 100, 4096), (len(data), 10), (150000 - 7, 20), (160000, 50000)]
+    ranges += [(rng.randrange(len(data)), rng.choice((1, 13, 4096))) for _ in range(40)]
+    for offset, length in ranges:
+        assert read_range(press, offset, length) == data[offset:offset + length]
+    #without the index the stream is decoded from the start
+    assert read_range(press, 123456, 999, index_path = str(tmp_path / "missing.idx")) == data[123456:123456 + 999]
+
+    (tmp_path / "out.press").write_bytes(b"\x62")
+    with pytest.raises(ValueError):
+        read_range(press, 0, 1)
+
+def fail_scan(*args, **kwargs):
+    raise AssertionError("a covered range must not be scanned again")
+
+@pytest.mark.parametrize("settings", [{"delimiter_setting": "cost"}, {"digest_mode": "adaptive", "use_mmap": True}, {"symbol_bits": 8}])
+def test_scan_index_skips_unchanged_and_resumes_appended(tmp_path, monkeypatch, settings):
+    rng = random.Random(73)
+    data = bytes(rng.choice((0, 0, 0, 255, 7)) for _ in range(90000)) + b"ABC123XYZ" * 2000 + bytes(rng.getrandbits(8) for _ in range(9000))
+    path, scans = str(tmp_path / "in.bin"), str(tmp_path / "scans")
+    (tmp_path / "in.bin").write_bytes(data[:70001])
+    with BPRESS_COMPRESS(path, str(tmp_path / "a.press"), 5000, scan_cache_dir = scans, **settings) as compressor:
+        pass
+    assert compressor.scan_resumed == 0 and load_scan_record(scan_record_path(scans, path))["size"] == 70001 #type: ignore
+
+    #unchanged: the statistics and histograms come from the record
+    with monkeypatch.context() as patched:
+        patched.setattr(BPRESS, "scan_bytes", fail_scan)
+        with BPRESS_COMPRESS(path, str(tmp_path / "b.press"), 3000, scan_cache_dir = scans, **settings) as compressor:
+            pass
+        with BPRESS_DATA(path, scan_cache_dir = scans) as scan:
+            assert scan.scan_resumed == 70001
+    assert scan.scanned_data == bp.scan_bytes(data[:70001]) and compressor.scanned_data["bit_freqs"] == scan.scanned_data["bit_freqs"]
+    assert (tmp_path / "b.press").read_bytes() == (tmp_path / "a.press").read_bytes()
+
+    #appended: only the tail is scanned, carrying the edge byte and the open runs of the record
+    with open(path, "ab") as f:
+        f.write(data[70001:])
+    with BPRESS_COMPRESS(path, str(tmp_path / "c.press"), 4096, scan_cache_dir = scans, **settings) as compressor:
+        pass
+    with BPRESS_COMPRESS(path, str(tmp_path / "d.press"), 4096, **settings) as fresh:
+        pass
+    assert compressor.scan_resumed == 70001 and compressor.bytes_read_pass_one == len(data)
+    assert (compressor.scanned_data, compressor.token_profiles, compressor.symbol_profile) == (fresh.scanned_data, fresh.token_profiles, fresh.symbol_profile)
+    assert (tmp_path / "c.press").read_bytes() == (tmp_path / "d.press").read_bytes()
+    assert load_scan_record(scan_record_path(scans, path))["size"] == len(data) #type: ignore
+
+def test_scan_index_rejects_changed_inputs(tmp_path):
+    rng = random.Random(79)
+    data = bytes(rng.choice((0, 0, 255)) for _ in range(60000))
+    path, scans = tmp_path / "in.bin", str(tmp_path / "scans")
+    path.write_bytes(data)
+    with BPRESS_DATA(str(path), scan_cache_dir = scans, scan_hash = True):
+        pass
+
+    #rewritten in the middle with the mtime put back: only the content hash notices
+    original = os.stat(path)
+    changed = data[:30000] + bytes(255 - byte for byte in data[30000:31000]) + data[31000:]
+    path.write_bytes(changed)
+    os.utime(path, ns = (original.st_atime_ns, original.st_mtime_ns))
+    with BPRESS_DATA(str(path), scan_cache_dir = scans) as scan:
+        assert scan.scan_resumed == len(data)
+    with BPRESS_DATA(str(path), scan_cache_dir = scans, scan_hash = True) as scan:
+        assert scan.scan_resumed == 0 and scan.scanned_data == bp.scan_bytes(changed)
+
+    #a new mtime, a shrunk input and a damaged record all scan from the start
+    path.write_bytes(data)
+    with BPRESS_DATA(str(path), scan_cache_dir = scans) as scan:
+        assert scan.scan_resumed == 0
+    path.write_bytes(data[:50000])
+    with BPRESS_DATA(str(path), scan_cache_dir = scans) as scan:
+        assert scan.scan_resumed == 0 and scan.scanned_data == bp.scan_bytes(data[:50000])
+    with open(scan_record_path(scans, str(path)), "w") as f:
+        f.write("{")
+    with BPRESS_DATA(str(path), scan_cache_dir = scans) as scan:
+        assert scan.scan_resumed == 0 and scan.scan_complete
+
+def test_compression_metrics(tmp_path):
+    rng = random.Random(61)
+    data = bytes(rng.choice((0, 0, 0, 255)) for _ in range(9000)) + b"\x00" * 2000
+    (tmp_path / "in.bin").write_bytes(data)
+    with BPRESS_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "plain.press"), 1000):
+        pass
+    phases = []
+    metrics = CompressionMetrics(callback = lambda phase, ns: phases.append(phase))
+    with BPRESS_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "out.press"), 1000, metrics = metrics) as compressor:
+        pass
+    assert (tmp_path / "out.press").read_bytes() == (tmp_path / "plain.press").read_bytes()
+    assert phases == ["open", "scan", "select", "compress", "finish", "write", "check"]
+
+    report = metrics.report()
+    assert report["buffers"] == 11 and sum(report["buffer_bytes"]) == len(data)
+    assert report["tokens"] == compressor.tokens_compressed
+    assert sum(report["buffer_tokens"]) == report["tokens"] - 1 #the last token is closed by finish_stream
+    assert sum(report["token_bit_lengths"].values()) == report["tokens"]
+    assert report["max_token_len"] == 2000 * 8 + 1
+    assert report["token_tail"]["p50"] <= report["token_tail"]["p999"] <= report["max_token_len"]
+    assert report["bytes_read"] == 2 * len(data) and report["reads"] >= 2 * 11
+    assert report["bytes_written"] == compressor.exp_size and report["writes"] >= 1
+    assert not report["mapped"] and all(ns >= 0 for ns in report["phase_ns"].values())
+
+def test_large_buffers_are_sliced(tmp_path):
+    rng = random.Random(67)
+    data = bytes(rng.choice((0, 0, 0, 255, rng.getrandbits(8))) for _ in range(2 * SLICE_SIZE + 333))
+    (tmp_path / "in.bin").write_bytes(data)
+    for delimiter_setting in ("low", "cost"):
+        outputs = []
+        for buffer in (4096, SLICE_SIZE + 1, 1 << 20, "auto"):
+            with BPRESS_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "out.press"), buffer, delimiter_setting, use_mmap = True):
+                pass
+            outputs.append((tmp_path / "out.press").read_bytes())
+        assert outputs == [outputs[0]] * 4
+
+    #one buffer holds the whole input, the per bit temporaries are still bounded by the slice
+    #(unsliced they run past 150 bytes per buffer byte)
+    tracemalloc.start()
+    try:
+        with BPRESS_COMPRESS(str(tmp_path / "in.bin"), str(tmp_path / "out.press"), 1 << 20, "cost", use_mmap = True):
+            pass
+        compress_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        with BPRESS_DECOMPRESS(str(tmp_path / "out.press"), str(tmp_path / "back.bin"), 1 << 20):
+            pass
+        decompress_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert (tmp_path / "back.bin").read_bytes() == data
+    assert compress_peak < 200 * SLICE_SIZE and decompress_peak < 200 * SLICE_SIZE
+
+def test_auto_buffer_size():
+    assert auto_buffer_size(0) == AUTO_BUFFER_MIN
+    assert auto_buffer_size(256 * 1024 * 1024, available_memory = 1 << 40) == 1024 * 1024
+    assert auto_buffer_size(1 << 40, available_memory = 1 << 40) == AUTO_BUFFER_MAX
+    assert auto_buffer_size(1 << 40, available_memory = 128 * 1024 * 1024) == 2 * 1024 * 1024
+    assert auto_buffer_size(10**9, available_memory = 1) == AUTO_BUFFER_MIN
+    assert all(auto_buffer_size(size) % SLICE_SIZE == 0 for size in (1, 10**6, 10**9, 10**12))
+
+"""
+opt-in: compresses and restores 1 GB inputs with buffer="auto" in child processes
+and checks their peak resident set size stays flat (BPRESS_LARGE_TESTS=1, takes a while)
+"""
+@pytest.mark.skipif(not os.environ.get("BPRESS_LARGE_TESTS"), reason = "set BPRESS_LARGE_TESTS=1 to run the 1 GB test")
+@pytest.mark.parametrize("corpus", ["half_structured", "sparse"])
+def test_one_gigabyte_input_has_bounded_memory(tmp_path, corpus):
+    import filecmp
+    import subprocess
+    import sys
+    from gen_syn_data import generate_structured_file
+
+    size = 1024 * 1024 * 1024
+    if corpus == "half_structured":
+        #does not shrink, so this covers the stored pass-through
+        generate_structured_file(str(tmp_path / "in.bin"), size, "half", seed = 1)
+    else:
+        #mostly zero bytes with scattered set bits, compresses well and runs through the encoder and decoder
+        rng = np.random.default_rng(1)
+        with open(tmp_path / "in.bin", "wb") as f:
+            for _ in range(size // (16 * 1024 * 1024)):
+                chunk = np.zeros(16 * 1024 * 1024, dtype = np.uint8)
+                chunk[rng.integers(0, len(chunk), size = len(chunk) // 64)] = np.uint8(1) << rng.integers(0, 8, size = len(chunk) // 64).astype(np.uint8)
+                f.write(chunk.tobytes())
+    script = (
+        "import resource, sys\n"
+        "from bpress_v1_0_0 import BPRESS_COMPRESS, BPRESS_DECOMPRESS\n"
+        "engine = BPRESS_COMPRESS if sys.argv[1] == 'compress' else BPRESS_DECOMPRESS\n"
+        "with engine(sys.argv[2], sys.argv[3], 'auto'):\n"
+        "    pass\n"
+        "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n"
+    )
+    runs = (("compress", "in.bin", "out.press"), ("decompress", "out.press", "back.bin"))
+    for mode, source, target in runs:
+        result = subprocess.run(
+            [sys.executable, "-c", script, mode, str(tmp_path / source), str(tmp_path / target)],
+            capture_output = True, text = True, check = True, cwd = os.path.dirname(os.path.abspath(__file__))
+        )
+        max_rss = int(result.stdout.split()[-1]) * (1 if sys.platform == "darwin" else 1024)
+        #consumed mapped pages are released as the passes go, so the peak stays a few buffers deep (about 50-65 MB);
+        #holding even an eighth of the input would break the bound
+        assert max_rss < 128 * 1024 * 1024, f"{mode} peaked at {max_rss} bytes"
+    assert filecmp.cmp(tmp_path / "in.bin", tmp_path / "back.bin", shallow = False)
@@ -0,0 +1,61 @@
+import random
+import numpy as np
+from bitarray import bitarray
+from gen_syn_data import generate_files, generate_structured_file, generate_structured_stream, scrub_words
+
+#the per-bit walk the word scrub replaces
+def scrub_reference(data: bytes, scrub_rate: str) -> bytes:
+    bits = bitarray()
+    bits.frombytes(data)
+    i = 0
+    while i < len(bits) - 2:
+        a, b, c = bits[i], bits[i + 1], bits[i + 2]
+        if a != b and a == c and (scrub_rate == "full" or i % 2 == 0):
+            bits[i + 2] ^= 1
+            i += 3
+            continue
+        i += 1
+    return bits.tobytes()
+
+def scrub(data: bytes, scrub_rate: str) -> bytes:
+    padded = data + bytes(-len(data) % 8)
+    words = np.frombuffer(padded, dtype=">u8").astype(np.uint64)
+    return scrub_words(words, len(data) * 8, scrub_rate).astype(">u8").tobytes()[:len(data)]
+
+
+def test_scrub_matches_reference():
+    rng = random.Random(5)
+    for _ in range(300):
+        size = rng.choice((1, 2, 7, 8, 9, 31, 200))
+        #alternating bytes build long flip-flop clusters, across word boundaries too
+        data = bytes(rng.choice((0x55, 0xAA, 0x5A, 0x00, rng.getrandbits(8))) for _ in range(size))
+        for scrub_rate in ("half", "full"):
+            assert scrub(data, scrub_rate) == scrub_reference(data, scrub_rate)
+    assert scrub(b"\x55" * 4096, "full") == scrub_reference(b"\x55" * 4096, "full")
+
+def test_structured_stream_is_scrubbed_random_data():
+    raw = np.random.default_rng(3).bytes(4096)
+    for scrub_rate in ("half", "full"):
+        stream, trailing_bits = generate_structured_stream(4096, scrub_rate, rng = np.random.default_rng(3))
+        assert stream == scrub_reference(raw, scrub_rate)
+        assert trailing_bits == bitarray([(stream[-1] >> 1) & 1, stream[-1] & 1])
+
+def test_seeded_files_are_reproducible(tmp_path):
+    generate_structured_file(str(tmp_path / "a.bin"), 300000, "half", seed = 11, chunk_size = 64 * 1024)
+    generate_structured_file(str(tmp_path / "b.bin"), 300000, "half", seed = 11, chunk_size = 64 * 1024)
+    generate_structured_file(str(tmp_path / "c.bin"), 300000, "half", seed = 12, chunk_size = 64 * 1024)
+    assert (tmp_path / "a.bin").read_bytes() == (tmp_path / "b.bin").read_bytes()
+    assert (tmp_path / "a.bin").read_bytes() != (tmp_path / "c.bin").read_bytes()
+    assert len((tmp_path / "a.bin").read_bytes()) == 300000
+
+    generate_files(str(tmp_path / "set"), 2, ["1MB"], "full", seed = 4, workers = 1)
+    files = sorted((tmp_path / "set").iterdir())
+    assert [path.stat().st_size for path in files] == [1024 * 1024] * 2
+    assert files[0].read_bytes() != files[1].read_bytes()
+
+    #no file repeats another across sizes or across neighbouring seeds
+    generate_files(str(tmp_path / "sizes"), 2, ["1MB", "2MB"], "full", seed = 4, workers = 1)
+    generate_files(str(tmp_path / "next"), 1, ["1MB"], "full", seed = 5, workers = 1)
+    heads = [path.read_bytes()[:4096] for path in sorted((tmp_path / "sizes").iterdir()) + sorted((tmp_path / "next").iterdir())]
+    assert len(set(heads)) == len(heads) == 5
+    assert (tmp_path / "sizes" / "full_struc_high_ent_1MB_1.bin").read_bytes() == files[0].read_bytes()
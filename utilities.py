@@ -1,5 +1,7 @@
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
 from functools import wraps
 from time import time
+from typing import Optional
 
 # simple function process timer
 def timer(func):
@@ -22,4 +24,18 @@ def test_status(status: str):
         return wrapper
     return decorator
 
+# inline stand in for a process pool when a single worker is requested
+class InlineExecutor(Executor):
+    def submit(self, fn, *args, **kwargs) -> Future:
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as exc:
+            future.set_exception(exc)
+        return future
+
+def make_executor(workers: Optional[int]) -> Executor:
+    if workers == 1:
+        return InlineExecutor()
+    return ProcessPoolExecutor(max_workers = workers)
 